@@ -0,0 +1,71 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+from gi.repository import Gtk, Gdk
+
+from terra.ConfigManager import ConfigManager
+
+# Modifiers taken into account when matching shortcuts.
+MODIFIER_MASK = (
+    Gdk.ModifierType.CONTROL_MASK |
+    Gdk.ModifierType.MOD1_MASK |
+    Gdk.ModifierType.SHIFT_MASK |
+    Gdk.ModifierType.SUPER_MASK
+)
+
+
+class AcceleratorTable(object):
+    """
+    Maps (keyval, modifiers) pairs to shortcut names, parsed once from the
+    'shortcuts' config section.
+    """
+
+    def __init__(self, names):
+        """
+        :param names: Shortcut names, by decreasing priority when two
+            shortcuts share the same accelerator.
+        :type names: list
+        """
+        self.names = names
+        self.table = {}
+        self.rebuild()
+
+    def rebuild(self):
+        shortcuts = ConfigManager.get_snapshot().shortcuts
+        table = {}
+        for name in self.names:
+            key_string = getattr(shortcuts, name, None)
+            if not key_string:
+                continue
+            keyval, modifiers = Gtk.accelerator_parse(key_string)
+            if not keyval:
+                print('[DEBUG] Invalid shortcut {}: {}'.format(name, key_string))
+                continue
+            table.setdefault((Gdk.keyval_to_lower(keyval), int(modifiers & MODIFIER_MASK)), name)
+        self.table = table
+
+    def lookup(self, event):
+        """
+        Return the name of the shortcut matching the key event, or None.
+
+        :type event: Gdk.EventKey
+        :rtype: str
+        """
+        return self.table.get((Gdk.keyval_to_lower(event.keyval), int(event.state & MODIFIER_MASK)))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import re
+
+# Escape sequences: CSI, OSC/DCS/APC/PM strings, and two byte sequences.
+# The literal prefix lets the regex engine skip to the next escape quickly.
+ANSI_REGEX = re.compile(
+    br'\x1b(?:\[[0-?]*[ -/]*[@-~]'
+    br'|[\]P^_X][^\x07\x1b]*(?:\x07|\x1b\\)'
+    br'|[ -/]*[0-OQ-WYZ\\`-~])')
+# Control characters but tab, line feed, carriage return, escape and bell,
+# which ends OSC strings and is deleted after the sequences.
+CONTROL_CHARS = b''.join(chr(i) for i in range(32) if i not in (7, 9, 10, 13, 27)) + b'\x7f'
+# An unterminated sequence is carried over to the next chunk if it is shorter.
+MAX_SEQUENCE_SIZE = 4096
+
+
+class AnsiStripper(object):
+    """
+    Removes escape sequences and control characters from a stream, including
+    sequences split between two chunks.
+    """
+
+    def __init__(self):
+        self.carry = b''
+
+    def strip(self, data):
+        if self.carry:
+            data = self.carry + data
+            self.carry = b''
+
+        # Carry the first sequence of the end of the chunk which is incomplete,
+        # or reaches the end of the chunk and may be truncated.
+        start = data.find(b'\x1b', max(0, len(data) - MAX_SEQUENCE_SIZE))
+        while start != -1:
+            match = ANSI_REGEX.match(data, start)
+            if not match or match.end() == len(data):
+                self.carry = data[start:]
+                data = data[:start]
+                break
+            start = data.find(b'\x1b', match.end())
+        data = data.translate(None, CONTROL_CHARS)
+        if b'\x1b' in data:
+            data = ANSI_REGEX.sub(b'', data)
+        return data.translate(None, b'\x07')
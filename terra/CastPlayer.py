@@ -0,0 +1,123 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import time
+
+from gi.repository import GLib
+
+from terra.CastRecorder import read_cast
+
+# Milliseconds of output fed per main loop iteration when replaying as fast
+# as possible, so the terminal still gets redrawn.
+FAST_BATCH_TIME = 16
+
+
+class CastPlayer(object):
+    """
+    Replays an asciicast recording into a terminal, through the same path as
+    the output of its program, at the recorded speed or as fast as possible.
+    Used to measure terra with real workloads.
+    """
+
+    def __init__(self, terminal, path, speed=1.0, on_done=None):
+        """
+        :param speed: Multiplier of the recorded speed, 0 to replay as fast as
+            possible.
+        :param on_done: Called with the stats once the recording was fed.
+        """
+        self.terminal = terminal
+        self.path = path
+        self.header, self.events = read_cast(path)
+        self.speed = speed
+        self.on_done = on_done
+        self.position = 0
+        self.source_id = None
+        self.start_time = 0
+        self.bytes_fed = 0
+        # Highest delay behind the recorded timing, in seconds.
+        self.max_lag = 0
+
+    def start(self):
+        self.start_time = time.time()
+        if self.speed > 0:
+            self.schedule()
+        else:
+            self.source_id = GLib.idle_add(self.feed_batch)
+
+    def stop(self):
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+
+    def feed(self, data):
+        self.terminal.on_output(data)
+        self.bytes_fed += len(data)
+
+    def schedule(self):
+        if self.position >= len(self.events):
+            self.finish()
+            return
+        due = self.start_time + self.events[self.position][0] / self.speed
+        self.source_id = GLib.timeout_add(max(0, int((due - time.time()) * 1000)), self.feed_due)
+
+    def feed_due(self):
+        # Feed everything which is due, the timer may fire late.
+        now = time.time()
+        while self.position < len(self.events):
+            elapsed, data = self.events[self.position]
+            due = self.start_time + elapsed / self.speed
+            if due > now:
+                break
+            self.max_lag = max(self.max_lag, now - due)
+            self.feed(data)
+            self.position += 1
+        self.schedule()
+        return False
+
+    def feed_batch(self):
+        deadline = time.time() + FAST_BATCH_TIME / 1000.0
+        while self.position < len(self.events) and time.time() < deadline:
+            self.feed(self.events[self.position][1])
+            self.position += 1
+        if self.position < len(self.events):
+            return True
+        self.source_id = None
+        self.finish()
+        return False
+
+    def finish(self):
+        self.source_id = None
+        stats = self.get_stats()
+        print('[DEBUG] Replayed {path}: {events} events, {bytes} bytes in {seconds:.3f}s '
+              '({rate:.1f} MB/s, max lag {lag:.1f} ms)'.format(**stats))
+        if self.on_done is not None:
+            self.on_done(stats)
+
+    def get_stats(self):
+        seconds = time.time() - self.start_time
+        return {
+            'path': self.path,
+            'events': self.position,
+            'bytes': self.bytes_fed,
+            'seconds': seconds,
+            'rate': self.bytes_fed / 1048576.0 / seconds if seconds else 0.0,
+            'lag': self.max_lag * 1000,
+        }
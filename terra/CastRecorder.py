@@ -0,0 +1,147 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import codecs
+import json
+import os
+import time
+
+from terra.ConfigManager import ConfigManager
+from terra.OutputLogger import OutputLogger, WRITE_BUFFER_SIZE
+
+CAST_VERSION = 2
+
+
+class CastFile(object):
+    """
+    Asciicast v2 file: a JSON header line, then one [time, code, data] line
+    per event. Only the writer thread touches the file.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        # Chunks may end in the middle of an UTF-8 character.
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.file = None
+
+    def write(self, event):
+        elapsed, code, data = event
+        if code == 'o':
+            data = self.decoder.decode(data)
+            if not data:
+                return 0
+        if self.file is None:
+            self.open()
+        # Escaping non-ASCII characters uses the much faster C encoder.
+        line = json.dumps([round(elapsed, 6), code, data]) + b'\n'
+        self.file.write(line)
+        return len(line)
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, 'wb', WRITE_BUFFER_SIZE)
+        self.file.write(json.dumps(self.header, sort_keys=True).encode('utf-8') + b'\n')
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CastRecorder(object):
+    """
+    Records the output of a terminal with its timing. The main loop only
+    timestamps the chunks, they are encoded and written by the log writer
+    thread.
+    """
+
+    counter = 0
+
+    def __init__(self, rows, columns, path=None, title=None, command=None):
+        if path is None:
+            CastRecorder.counter += 1
+            file_name = 'terra-%s-%d-%d.cast' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), CastRecorder.counter)
+            path = os.path.join(os.path.expanduser(ConfigManager.get_conf('logging', 'directory')), file_name)
+
+        self.start_time = time.time()
+        self.size = (rows, columns)
+        header = {
+            'version': CAST_VERSION,
+            'width': columns,
+            'height': rows,
+            'timestamp': int(self.start_time),
+            'env': {'TERM': 'xterm-256color', 'SHELL': os.environ.get('SHELL', '')},
+        }
+        if title:
+            header['title'] = title
+        if command:
+            header['command'] = command
+        self.cast_file = CastFile(path, header)
+        self.writer = OutputLogger.get_writer()
+
+    @staticmethod
+    def is_enabled():
+        return bool(ConfigManager.get_conf('logging', 'record'))
+
+    @property
+    def path(self):
+        return self.cast_file.path
+
+    def write(self, data):
+        self.writer.put(self.cast_file, (time.time() - self.start_time, 'o', data))
+
+    def resize(self, rows, columns):
+        if (rows, columns) == self.size:
+            return
+        self.size = (rows, columns)
+        self.writer.put(self.cast_file, (time.time() - self.start_time, 'r', '%dx%d' % (columns, rows)))
+
+    def close(self):
+        self.writer.put(self.cast_file, None)
+
+
+def read_cast(path):
+    """
+    Read an asciicast v2 file.
+
+    :return: The header, and the list of (time, data) output events, data
+        being UTF-8 encoded.
+    :rtype: (dict, list)
+    """
+    events = []
+    with open(path, 'rb') as cast:
+        header = json.loads(cast.readline().decode('utf-8'))
+        if header.get('version') != CAST_VERSION:
+            raise ValueError('Unsupported asciicast version: {}'.format(header.get('version')))
+        for line in cast:
+            if not line.strip():
+                continue
+            elapsed, code, data = json.loads(line.decode('utf-8'))
+            if code == 'o':
+                events.append((elapsed, data.encode('utf-8')))
+    return header, events
@@ -0,0 +1,149 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import time
+
+from collections import deque
+
+from gi.repository import GLib
+
+from terra.ConfigManager import ConfigManager
+
+# Rough memory used by a terminal cell, to estimate the scrollback size.
+CELL_SIZE = 8
+
+
+class StashEntry(object):
+    __slots__ = ('window', 'container', 'terminals', 'name', 'closed_at', 'size')
+
+    def __init__(self, window, container, terminals, name=None):
+        """
+        :param container: The tab the terminal was closed from, or the closed
+            tab itself if name is set.
+        """
+        self.window = window
+        self.container = container
+        self.terminals = terminals
+        self.name = name
+        self.closed_at = time.time()
+        self.size = sum(get_terminal_size(terminal) for terminal in terminals)
+
+    def is_page(self):
+        return self.name is not None
+
+
+def get_terminal_size(terminal):
+    """
+    Estimate the memory used by the content of a terminal, in bytes.
+    """
+    vte = terminal.vte
+    lines = vte.get_cursor_position()[1] + 1
+    max_lines = ConfigManager.get_snapshot().terminal.scrollback_lines + vte.get_row_count()
+    return min(lines, max_lines) * vte.get_column_count() * CELL_SIZE
+
+
+class CloseStash(object):
+    """
+    Keeps closed terminals and tabs, detached but running, for
+    general.close_grace_period seconds so the close can be undone. The oldest
+    entries are dropped first when the stash exceeds general.close_stash_size
+    megabytes.
+    """
+
+    def __init__(self):
+        self.entries = deque()
+        self.size = 0
+        self.source_id = None
+
+    @staticmethod
+    def is_enabled():
+        return ConfigManager.get_conf('general', 'close_grace_period') > 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add_terminal(self, terminal, window, container):
+        self.add(StashEntry(window, container, [terminal]))
+
+    def add_page(self, container, window, name):
+        self.add(StashEntry(window, container, container.vte_list, name))
+
+    def add(self, entry):
+        for terminal in entry.terminals:
+            terminal.stashed = True
+        self.entries.append(entry)
+        self.size += entry.size
+        self.evict()
+
+    def pop(self):
+        """
+        Return the last closed entry, or None.
+
+        :rtype: StashEntry
+        """
+        if not self.entries:
+            return None
+        entry = self.entries.pop()
+        self.size -= entry.size
+        for terminal in entry.terminals:
+            terminal.stashed = False
+        self.schedule()
+        return entry
+
+    def evict(self):
+        """
+        Drop the expired entries, then the oldest ones while the stash is too
+        big.
+        """
+        general = ConfigManager.get_snapshot().general
+        max_size = general.close_stash_size * 1024 * 1024
+        deadline = time.time() - general.close_grace_period
+        while self.entries and (self.entries[0].closed_at <= deadline or self.size > max_size):
+            self.drop(self.entries.popleft())
+        self.schedule()
+
+    def drop(self, entry):
+        self.size -= entry.size
+        for terminal in entry.terminals:
+            terminal.stashed = False
+            terminal.unregister()
+            terminal.destroy()
+        if entry.is_page():
+            entry.container.destroy()
+
+    def schedule(self):
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        if self.entries:
+            # Wake up when the oldest entry expires.
+            delay = self.entries[0].closed_at + ConfigManager.get_conf('general', 'close_grace_period') - time.time()
+            self.source_id = GLib.timeout_add(max(0, int(delay * 1000)) + 1, self.on_timeout)
+
+    def on_timeout(self):
+        self.source_id = None
+        self.evict()
+        return False
+
+    def clear(self):
+        while self.entries:
+            self.drop(self.entries.popleft())
+        self.schedule()
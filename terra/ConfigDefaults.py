@@ -25,6 +25,26 @@ ConfigDefaults = {
         # General
         # 'run_on_startup': False,
         'remember_session': False,
+        # Number of background tabs restored per main loop iteration.
+        'restore_batch_size': 1,
+        # Number of shells started in advance for new terminals, 0 to disable.
+        'shell_pool_size': 0,
+        # What to do when the program of a terminal exits: respawn, close or hold.
+        'respawn_policy': 'respawn',
+        # Run the terminals in a session daemon, so they survive terra.
+        'use_session_daemon': False,
+        # Bytes of output replayed when reattaching to a terminal.
+        'session_replay_size': 262144,
+        # Seconds closed terminals and tabs can be restored, 0 to disable.
+        'close_grace_period': 30,
+        # Megabytes of terminal content kept for closed terminals and tabs.
+        'close_stash_size': 64,
+        # Megabytes per second of output from which a terminal is in flood mode, 0 to disable.
+        # Terminals read by libvte itself are measured by the lines they scroll,
+        # so a program redrawing the screen in place is not detected.
+        'flood_threshold': 4,
+        # Triggers are matched in a separate process past this number, 0 to disable.
+        'trigger_worker_threshold': 32,
         'prompt_on_quit': True,
         'spawn_term_on_last_close': False,
 
@@ -68,6 +88,35 @@ ConfigDefaults = {
         'scroll_on_output': False,
         'scroll_on_keystroke': True,
 
+        # Terminal - Title
+        'title_refresh_rate': 4,
+    },
+
+    'logging': {
+        # Write the output of new terminals to log files. Terminals opt in or out
+        # from their menu, those already running are logged from their next start.
+        'enabled': False,
+        'directory': '~/.local/share/terra/logs',
+        'strip_ansi': True,
+        # Megabytes per log file, 0 to disable.
+        'rotate_size': 64,
+        # Seconds per log file, 0 to disable.
+        'rotate_interval': 86400,
+        # Gzip rotated log files.
+        'compress': True,
+        # Record the output of new terminals with its timing, as asciicast files.
+        'record': False,
+    },
+
+    # Filters run on the output of new terminals, in this order. Terminals
+    # without filters keep the faster libvte PTY.
+    'filters': {
+        # Prefix lines with the time, a strftime format, e.g. '[%H:%M:%S] '.
+        'timestamp_format': '',
+        # Replace the matches with ***, e.g. github: 'ghp_[A-Za-z0-9]{36}'
+        'redact': {},
+        # Color the matches, e.g. error: {pattern: 'ERROR', color: '1;31'}
+        'colorize': {},
     },
 
     'shortcuts': {
@@ -99,8 +148,24 @@ ConfigDefaults = {
         'move_right_key': '<Control><Shift>Right',
         'move_left_screen_key': '<Super><Shift>Left',
         'move_right_screen_key': '<Super><Shift>Right',
+        'move_terminal_new_page_key': '<Control><Shift>T',
+        'move_terminal_next_page_key': '<Control><Alt>Page_Down',
+        'move_terminal_prev_page_key': '<Control><Alt>Page_Up',
+        'move_terminal_next_window_key': '',
+        'undo_close_key': '<Control><Shift>Z',
+        'toggle_broadcast_key': '<Control><Shift>B',
     },
 
+    # Additional link matchers, e.g.
+    # ticket: {pattern: 'TICKET-[0-9]+', uri: 'https://tracker/browse/{0}', ignore_case: true}
+    'matchers': {},
+
+    # Actions run when the output of a terminal matches, e.g.
+    # failed: {pattern: 'ERROR|FATAL', action: notify}
+    # Actions: highlight (default), bell, notify, focus and command, which
+    # runs the 'command' option with $TERRA_TRIGGER and $TERRA_MATCH set.
+    'triggers': {},
+
     'layout': {
         # Layout default settings.
         'disabled': False,
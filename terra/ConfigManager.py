@@ -19,10 +19,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 """
 
 from terra.handlers import TerraHandler
+from terra.ConfigSnapshot import ConfigSnapshot, LAYOUT_SECTION, SCREEN_NAME_PREFIX
 
 # Define strings and regular expressions for handling section names.
 # TODO: Use nested values, instead of special section names.
-SCREEN_NAME_PREFIX = 'layout-screen-'
 SCREEN_NAME_REGEX = '^layout-screen-(\d+)$'
 
 
@@ -41,6 +41,10 @@ class ConfigManager:
     handler = None
     """:type: terra.handlers.ConfigHandler"""
 
+    # Snapshot of the config, updated when the config revision changes.
+    snapshot = None
+    """:type: terra.ConfigSnapshot.ConfigSnapshot"""
+
     def __init__(self):
         pass
 
@@ -49,31 +53,41 @@ class ConfigManager:
         return sorted(TerraHandler.config.keys())
 
     @staticmethod
-    def get_conf(section, option):
-        # TODO: Fix!
-        if section.find(SCREEN_NAME_PREFIX) == 0 and section not in TerraHandler.config:
-            TerraHandler.config[section] = TerraHandler.config['layout'].copy()
-            return TerraHandler.config['layout'][option]
-
-        # TODO: Cleanup layout config.
-        if section not in TerraHandler.config:
-            return None
-        if option not in TerraHandler.config[section]:
-            return None
-
-        return TerraHandler.config[section][option]
+    def get_snapshot():
+        """
+        Return a read-only snapshot of the config, for hot paths:
+        ConfigManager.get_snapshot().terminal.show_scrollbar
+
+        Its values have the types of the defaults, unlike get_conf(), which
+        returns them as they are in the config. Only the sections changed
+        since the last snapshot are built again.
+
+        :rtype: terra.ConfigSnapshot.ConfigSnapshot
+        """
+        snapshot = ConfigManager.snapshot
+        config = TerraHandler.config
+        if snapshot is None or snapshot.revision != config.revision:
+            snapshot = ConfigSnapshot(config, config.defaults, config.revision, snapshot)
+            ConfigManager.snapshot = snapshot
+        return snapshot
 
     @staticmethod
-    def set_conf(section, option, value):
-        if section not in TerraHandler.config:
-            TerraHandler.config[section] = {}
+    def get_conf(section, option):
+        config = TerraHandler.config
+        if section not in config:
+            # Screens without a section of their own use the layout section.
+            if not section.startswith(SCREEN_NAME_PREFIX):
+                return None
+            section = LAYOUT_SECTION
+        return config[section].get(option)
 
-        TerraHandler.config[section][option] = value
+    @staticmethod
+    def set_conf(section, option, value, notify=True):
+        return TerraHandler.config.set_option(section, option, value, notify)
 
     @staticmethod
     def del_conf(section):
-        if section in TerraHandler.config:
-            del TerraHandler.config[section]
+        TerraHandler.config.del_section(section)
 
     @staticmethod
     def save_config():
@@ -0,0 +1,182 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+SCREEN_NAME_PREFIX = 'layout-screen-'
+LAYOUT_SECTION = 'layout'
+
+
+class ConfigSection(object):
+    """
+    Immutable view of a config section. Options are attributes, with dashes
+    replaced by underscores, e.g. section.hide_tab_bar for 'hide-tab-bar'.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Config snapshots are read-only.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Config snapshots are read-only.')
+
+
+def option_to_attribute(option):
+    return str(option).replace('-', '_')
+
+
+def coerce_value(value, default):
+    """
+    Convert value to the type of the default value. Invalid values fall back
+    to the default.
+    """
+    if default is None:
+        return value
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        if isinstance(value, basestring):
+            # Quoted in the config file, e.g. 'False'.
+            value = value.strip().lower()
+            if value in ('true', 'yes', 'on', '1'):
+                return True
+            if value in ('false', 'no', 'off', '0', ''):
+                return False
+            return default
+        return bool(value)
+    if isinstance(default, (int, long)):
+        if isinstance(value, float):
+            # Fractions are valid too, e.g. for thresholds.
+            return value
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+    if isinstance(default, basestring):
+        if isinstance(value, basestring):
+            return value
+        return str(value)
+    return value
+
+
+class ConfigSnapshot(object):
+    """
+    Validated, read-only copy of the configuration. Build a new one whenever
+    the configuration changes, see ConfigManager.get_snapshot().
+    """
+    __slots__ = (
+        'revision',
+        'section_revisions',
+        'values',
+        'sections',
+        'general',
+        'window',
+        'terminal',
+        'shortcuts',
+        'layout',
+    )
+
+    # Section classes, keyed by their sorted option names.
+    _section_classes = {}
+
+    def __init__(self, config, defaults, revision=0, previous=None):
+        """
+        :type config: dict
+        :type defaults: dict
+        :type revision: int
+        :param previous: Snapshot whose sections are reused, if they did
+            not change since, see ConfigHandler.section_revisions.
+        :type previous: ConfigSnapshot
+        """
+        self.revision = revision
+        self.section_revisions = dict(getattr(config, 'section_revisions', {}))
+
+        def is_unchanged(section_name):
+            return (previous is not None and section_name in previous.values and
+                    previous.section_revisions.get(section_name) == self.section_revisions.get(section_name))
+
+        # Maps section names to plain dictionaries of validated values.
+        self.values = {}
+        self.sections = {}
+        layout_unchanged = is_unchanged(LAYOUT_SECTION)
+        if layout_unchanged:
+            layout = previous.values[LAYOUT_SECTION]
+        else:
+            layout = self.validate(config.get(LAYOUT_SECTION, {}), defaults.get(LAYOUT_SECTION, {}))
+        for section_name, options in config.iteritems():
+            is_screen = section_name.startswith(SCREEN_NAME_PREFIX)
+            if is_unchanged(section_name) and (layout_unchanged or not is_screen):
+                self.values[section_name] = previous.values[section_name]
+                self.sections[section_name] = previous.sections[section_name]
+                continue
+            if is_screen:
+                # Screen sections inherit missing options from 'layout'.
+                values = layout.copy()
+                values.update(self.validate(options, defaults.get(LAYOUT_SECTION, {})))
+            elif section_name == LAYOUT_SECTION:
+                values = layout
+            else:
+                values = self.validate(options, defaults.get(section_name, {}))
+            self.values[section_name] = values
+            self.sections[section_name] = self.build_section(values)
+
+        empty = self.build_section({})
+        for section_name in ('general', 'window', 'terminal', 'shortcuts', 'layout'):
+            setattr(self, section_name, self.sections.get(section_name, empty))
+
+    @staticmethod
+    def validate(options, defaults):
+        values = {}
+        for option, value in options.iteritems():
+            values[option] = coerce_value(value, defaults.get(option))
+        return values
+
+    @classmethod
+    def build_section(cls, values):
+        attributes = dict((option_to_attribute(option), value) for option, value in values.iteritems())
+        slots = tuple(sorted(attributes))
+        section_class = cls._section_classes.get(slots)
+        if section_class is None:
+            section_class = type('ConfigSection', (ConfigSection,), {'__slots__': slots})
+            cls._section_classes[slots] = section_class
+
+        section = section_class()
+        for name, value in attributes.iteritems():
+            object.__setattr__(section, name, value)
+        return section
+
+    def section(self, section_name):
+        """
+        Return the section object. Unknown screen sections resolve to the
+        'layout' section, other unknown sections to None.
+
+        :type section_name: str
+        :rtype: ConfigSection
+        """
+        section = self.sections.get(section_name)
+        if section is None and section_name.startswith(SCREEN_NAME_PREFIX):
+            return self.layout
+        return section
+
+    def get(self, section_name, option):
+        values = self.values.get(section_name)
+        if values is None:
+            if not section_name.startswith(SCREEN_NAME_PREFIX):
+                return None
+            values = self.values.get(LAYOUT_SECTION, {})
+        return values.get(option)
@@ -35,3 +35,11 @@ class DbusService(dbus.service.Object):
     @dbus.service.method(DBUS_NAME)
     def show_hide(self):
         self.app.show_hide()
+
+    @dbus.service.method(DBUS_NAME, in_signature='sd')
+    def replay(self, path, speed):
+        """
+        Replay an asciicast recording in the active terminal, as fast as
+        possible if speed is 0.
+        """
+        self.app.get_active_terminal().replay(path, speed)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import time
+
+# Seconds per rate measurement.
+INTERVAL = 0.25
+# Seconds above the threshold before entering flood mode.
+ENTER_TIME = 0.5
+# Seconds below threshold / RELEASE_RATIO before leaving it.
+LEAVE_TIME = 1.0
+RELEASE_RATIO = 4
+
+
+class FloodDetector(object):
+    """
+    Measures the output rate of a terminal and tells when it starts or
+    stops flooding, with some hysteresis so a bursty program does not
+    switch modes back and forth.
+    """
+
+    def __init__(self, threshold):
+        """
+        :param threshold: Bytes per second.
+        """
+        self.threshold = threshold
+        self.flooding = False
+        # Smoothed bytes per second.
+        self.rate = 0.0
+        self.bucket_start = time.time()
+        self.bucket_bytes = 0
+        self.changed_at = None
+
+    def add(self, size, now=None):
+        """
+        Count output. Returns True if the flood mode changed.
+        """
+        self.bucket_bytes += size
+        return self.tick(now)
+
+    def tick(self, now=None):
+        """
+        Returns True if the flood mode changed. Call it regularly while
+        flooding, as a quiet terminal does not call add().
+        """
+        if now is None:
+            now = time.time()
+        elapsed = now - self.bucket_start
+        if elapsed < INTERVAL:
+            return False
+        # The rate is halved towards the new one per interval, a bucket over
+        # an idle gap spans several of them.
+        intervals = int(elapsed / INTERVAL)
+        bucket_rate = self.bucket_bytes / elapsed
+        self.rate = bucket_rate + (self.rate - bucket_rate) / 2 ** min(intervals, 64)
+        self.bucket_start = now
+        self.bucket_bytes = 0
+        if intervals > 1:
+            # The rate was not above or below the threshold all along.
+            self.changed_at = None
+
+        if self.flooding:
+            crossed = self.rate < self.threshold / RELEASE_RATIO
+            delay = LEAVE_TIME
+        else:
+            crossed = self.rate >= self.threshold
+            delay = ENTER_TIME
+        if not crossed:
+            self.changed_at = None
+            return False
+        if self.changed_at is None:
+            self.changed_at = now
+        if now - self.changed_at < delay:
+            return False
+        self.flooding = not self.flooding
+        self.changed_at = None
+        return True
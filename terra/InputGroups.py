@@ -0,0 +1,82 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+
+class InputGroup(object):
+    __slots__ = ('name', 'members', 'broadcasting')
+
+    def __init__(self, name):
+        self.name = name
+        self.members = []
+        self.broadcasting = False
+
+
+class InputGroups(object):
+    """
+    Groups of terminals, in any tab or window. When a group broadcasts, the
+    input committed in one of its terminals is written to all the others.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        # Set while writing to the members, whose libvte emits 'commit' too.
+        self.sending = False
+
+    def get(self, name):
+        """
+        :rtype: InputGroup
+        """
+        return self.groups.get(name)
+
+    def join(self, terminal, name):
+        self.leave(terminal)
+        group = self.groups.get(name)
+        if group is None:
+            group = self.groups[name] = InputGroup(name)
+        group.members.append(terminal)
+        terminal.input_group = group
+        return group
+
+    def leave(self, terminal):
+        group = terminal.input_group
+        if group is None:
+            return
+        terminal.input_group = None
+        if terminal in group.members:
+            group.members.remove(terminal)
+        if not group.members:
+            del self.groups[group.name]
+
+    def broadcast(self, source, data):
+        """
+        Write the input of source to the other members of its group. The
+        input is encoded once, each member costs a single write call.
+        """
+        group = source.input_group
+        if self.sending or group is None or not group.broadcasting:
+            return
+        self.sending = True
+        try:
+            for member in group.members:
+                if member is not source and member.input_writer is not None and not member.stashed:
+                    member.input_writer(data)
+        finally:
+            self.sending = False
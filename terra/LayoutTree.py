@@ -0,0 +1,304 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+class PaneNode(object):
+    """
+    Leaf of the layout tree: a single terminal.
+    """
+    __slots__ = ('id', 'parent', 'pane')
+
+    def __init__(self, pane_id, pane=None, parent=None):
+        self.id = pane_id
+        self.pane = pane
+        self.parent = parent
+
+
+class SplitNode(object):
+    """
+    Inner node of the layout tree. 'h' splits put first at the left of
+    second, 'v' splits put first above second. The position is the size of
+    first in 1/10000 of the split size, or -1 for an even split.
+    """
+    __slots__ = ('axis', 'first', 'second', 'parent', 'position', 'widget')
+
+    def __init__(self, axis, first, second, parent=None, position=-1, widget=None):
+        self.axis = axis
+        self.first = first
+        self.second = second
+        self.parent = parent
+        self.position = position
+        self.widget = widget
+
+    def replace_child(self, old_child, new_child):
+        if self.first is old_child:
+            self.first = new_child
+        else:
+            self.second = new_child
+        new_child.parent = self
+
+    def get_sibling(self, child):
+        if self.first is child:
+            return self.second
+        return self.first
+
+
+class LayoutTree(object):
+    """
+    Split layout of the terminals of a tab, independent of the widgets which
+    display it. Terminals are looked up by id in constant time.
+    """
+
+    def __init__(self):
+        self.root = None
+        # Maps terminal ids to PaneNode instances.
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, pane_id):
+        return pane_id in self.index
+
+    def get(self, pane_id):
+        """
+        :rtype: PaneNode
+        """
+        return self.index.get(pane_id)
+
+    def get_pane(self, pane_id):
+        node = self.index.get(pane_id)
+        if node is None:
+            return None
+        return node.pane
+
+    def panes(self):
+        return [node.pane for node in self.leaves()]
+
+    def add_root(self, pane_id, pane=None):
+        if self.root is not None:
+            raise ValueError('The layout already has a root terminal.')
+        node = PaneNode(pane_id, pane)
+        self.root = node
+        self.index[pane_id] = node
+        return node
+
+    def split(self, pane_id, new_id, axis, position=-1, pane=None, widget=None):
+        """
+        Split the terminal pane_id in two, the new terminal new_id taking the
+        right or bottom part.
+
+        :rtype: PaneNode
+        """
+        if new_id in self.index:
+            raise ValueError('Duplicate terminal id: {}'.format(new_id))
+        node = self.index[pane_id]
+        new_node = PaneNode(new_id, pane)
+        self.index[new_id] = new_node
+        self.replace(node, SplitNode(axis, node, new_node, position=position, widget=widget))
+        return new_node
+
+    def replace(self, node, new_node):
+        """
+        Put new_node at the place of node. The caller is responsible for the
+        parent of node.
+        """
+        parent = node.parent
+        if parent is None:
+            self.root = new_node
+            new_node.parent = None
+        else:
+            parent.replace_child(node, new_node)
+
+        if isinstance(new_node, SplitNode):
+            new_node.first.parent = new_node
+            new_node.second.parent = new_node
+
+    def remove(self, pane_id):
+        """
+        Remove a terminal. Its sibling takes the place of their split, and is
+        returned. Returns None if the terminal was the last one.
+
+        :rtype: PaneNode | SplitNode
+        """
+        node = self.index.pop(pane_id)
+        split = node.parent
+        node.parent = None
+        if split is None:
+            self.root = None
+            return None
+
+        sibling = split.get_sibling(node)
+        self.replace(split, sibling)
+        split.first = split.second = split.parent = None
+        return sibling
+
+    @staticmethod
+    def first_leaf(node):
+        while isinstance(node, SplitNode):
+            node = node.first
+        return node
+
+    def leaves(self):
+        """
+        Iterate over the terminal nodes, left to right and top to bottom.
+        """
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if isinstance(node, SplitNode):
+                stack.append(node.second)
+                stack.append(node.first)
+            else:
+                yield node
+
+    def get_depth(self, pane_id):
+        depth = 0
+        node = self.index[pane_id].parent
+        while node is not None:
+            depth += 1
+            node = node.parent
+        return depth
+
+    def serialize(self, get_position=None):
+        """
+        Return the layout as a list of split operations. The first entry is
+        the root terminal, each other entry splits the terminal 'parent' and
+        comes after the entry which created that terminal.
+
+        :param get_position: Optional callable returning the current position
+            of a SplitNode.
+        :rtype: list
+        """
+        if self.root is None:
+            return []
+
+        # The first leaf of each split, computed bottom-up in linear time.
+        first_leaves = {}
+        stack = [(self.root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not isinstance(node, SplitNode):
+                continue
+            if visited:
+                first = node.first
+                first_leaves[id(node)] = first_leaves[id(first)] if isinstance(first, SplitNode) else first
+            else:
+                stack.append((node, True))
+                stack.append((node.second, False))
+                stack.append((node.first, False))
+
+        def first_leaf(node):
+            if isinstance(node, SplitNode):
+                return first_leaves[id(node)]
+            return node
+
+        root = first_leaf(self.root)
+        entries = [{'id': root.id, 'parent': 0, 'axis': 'v', 'pos': -1, 'pane': root.pane}]
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, SplitNode):
+                continue
+            new_node = first_leaf(node.second)
+            entries.append({
+                'id': new_node.id,
+                'parent': first_leaf(node.first).id,
+                'axis': node.axis,
+                'pos': get_position(node) if get_position else node.position,
+                'pane': new_node.pane,
+            })
+            stack.append(node.second)
+            stack.append(node.first)
+        return entries
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Build a layout from the output of serialize(), without panes.
+
+        :rtype: LayoutTree
+        """
+        tree = cls()
+        if not entries:
+            return tree
+        tree.add_root(entries[0]['id'])
+        for entry in entries[1:]:
+            tree.split(entry['parent'], entry['id'], entry['axis'][0], entry['pos'])
+        return tree
+
+    def to_dict(self, get_position=None, get_pane_data=None):
+        """
+        Return the layout as nested dictionaries. Terminals are dictionaries
+        with an 'id' and the data returned by get_pane_data(pane), splits
+        have an 'axis', a 'pos' and 'first' and 'second' children.
+
+        :rtype: dict
+        """
+        def convert(node):
+            if isinstance(node, SplitNode):
+                return {
+                    'axis': node.axis,
+                    'pos': get_position(node) if get_position else node.position,
+                    'first': convert(node.first),
+                    'second': convert(node.second),
+                }
+            data = {'id': node.id}
+            if get_pane_data:
+                data.update(get_pane_data(node.pane))
+            elif isinstance(node.pane, dict):
+                data.update(node.pane)
+            return data
+
+        if self.root is None:
+            return None
+        return convert(self.root)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a layout from the output of to_dict(). The pane of each terminal
+        is its dictionary, without the 'id'.
+
+        :rtype: LayoutTree
+        """
+        tree = cls()
+
+        def convert(data):
+            if 'first' in data and 'second' in data:
+                return SplitNode(data.get('axis', 'h')[0], convert(data['first']), convert(data['second']), position=data.get('pos', -1))
+            pane_id = int(data.get('id') or 0)
+            if pane_id in tree.index:
+                raise ValueError('Duplicate terminal id: {}'.format(pane_id))
+            node = PaneNode(pane_id, dict((key, value) for key, value in data.iteritems() if key != 'id'))
+            tree.index[pane_id] = node
+            return node
+
+        if data:
+            tree.root = convert(data)
+            # Link the children to their parents.
+            stack = [tree.root]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, SplitNode):
+                    node.first.parent = node.second.parent = node
+                    stack.append(node.first)
+                    stack.append(node.second)
+        return tree
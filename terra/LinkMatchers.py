@@ -0,0 +1,214 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+import time
+
+from gi.repository import Vte, GLib, Gdk
+
+from terra.ConfigManager import ConfigManager
+from terra.handlers import TerraHandler
+
+# this regex strings taken from pantheon-terminal
+# thanks munchor and voldyman
+USERCHARS = "-[:alnum:]"
+USERCHARS_CLASS = "[" + USERCHARS + "]"
+PASSCHARS_CLASS = "[-[:alnum:]\\Q,?;.:/!%$^*&~\"#'\\E]"
+HOSTCHARS_CLASS = "[-[:alnum:]]"
+HOST = HOSTCHARS_CLASS + "+(\\." + HOSTCHARS_CLASS + "+)*"
+PORT = "(?:\\:[[:digit:]]{1,5})?"
+PATHCHARS_CLASS = "[-[:alnum:]\\Q_$.+!*,;@&=?/~#%\\E]"
+PATHTERM_CLASS = "[^\\Q]'.}>) \t\r\n,\"\\E]"
+SCHEME = """(?:news:|telnet:|nntp:|file:\/|https?:|ftps?:|sftp:|webcal:|irc:|sftp:|ldaps?:|nfs:|smb:|rsync:|ssh:|rlogin:|telnet:|git:|git\+ssh:|bzr:|bzr\+ssh:|svn:|svn\+ssh:|hg:|mailto:|magnet:)"""
+USERPASS = USERCHARS_CLASS + "+(?:" + PASSCHARS_CLASS + "+)?"
+URLPATH =  "(?:(/" + PATHCHARS_CLASS + "+(?:[(]" + PATHCHARS_CLASS + "*[)])*" + PATHCHARS_CLASS + "*)*" + PATHTERM_CLASS + ")?"
+
+BUILTIN_MATCHERS = [
+    ('url', SCHEME + "//(?:" + USERPASS + "\\@)?" + HOST + PORT + URLPATH),
+    ('www', "(?:www|ftp)" + HOSTCHARS_CLASS + "*\\." + HOST + PORT + URLPATH),
+    ('voip', "(?:callto:|h323:|sip:)" + USERCHARS_CLASS + "[" + USERCHARS + ".]*(?:" + PORT + "/[a-z0-9]+)?\\@" + HOST),
+    ('email', "(?:mailto:)?" + USERCHARS_CLASS + "[" + USERCHARS+ ".]*\\@" + HOSTCHARS_CLASS + "+\\." + HOST),
+    ('news', "(?:news:|man:|info:)[[:alnum:]\\Q^_{|}~!\"#$%&'()*+,./;:=?`\\E]+"),
+]
+
+# PCRE2 flags, see pcre2.h.
+PCRE2_CASELESS = 0x00000008
+PCRE2_MULTILINE = 0x00000400
+PCRE2_UTF = 0x00080000
+PCRE2_NO_UTF_CHECK = 0x40000000
+PCRE2_JIT_COMPLETE = 0x00000001
+
+
+class LinkMatcher(object):
+    __slots__ = ('name', 'pattern', 'uri_template', 'ignore_case', 'regex', 'is_pcre2',
+                 'compile_time', 'match_count', 'hit_check_time')
+
+    def __init__(self, name, pattern, uri_template=None, ignore_case=False):
+        self.name = name
+        self.pattern = pattern
+        self.uri_template = uri_template
+        self.ignore_case = ignore_case
+        self.regex = None
+        self.is_pcre2 = False
+        self.compile_time = 0.0
+        self.match_count = 0
+        # Time of the match_check() calls which found this matcher. Vte runs
+        # all the matchers in one call, so it is not the cost of this one.
+        self.hit_check_time = 0.0
+
+    def compile(self):
+        start = time.time()
+        if hasattr(Vte, 'Regex') and hasattr(Vte.Terminal, 'match_add_regex'):
+            flags = PCRE2_UTF | PCRE2_NO_UTF_CHECK | PCRE2_MULTILINE
+            if self.ignore_case:
+                flags |= PCRE2_CASELESS
+            self.regex = Vte.Regex.new_for_match(self.pattern, -1, flags)
+            self.is_pcre2 = True
+            try:
+                self.regex.jit(PCRE2_JIT_COMPLETE)
+            except GLib.Error:
+                # JIT is not available on every platform.
+                pass
+        else:
+            flags = GLib.RegexCompileFlags.OPTIMIZE
+            if self.ignore_case:
+                flags |= GLib.RegexCompileFlags.CASELESS
+            self.regex = GLib.Regex.new(self.pattern, flags, 0)
+        self.compile_time = time.time() - start
+
+    def attach(self, vte):
+        """
+        Add the compiled regex to the terminal and return its match tag.
+
+        :type vte: Vte.Terminal
+        :rtype: int
+        """
+        if self.is_pcre2:
+            tag = vte.match_add_regex(self.regex, 0)
+        else:
+            tag = vte.match_add_gregex(self.regex, 0)
+        vte.match_set_cursor_type(tag, Gdk.CursorType.HAND2)
+        return tag
+
+    def get_uri(self, value):
+        if self.uri_template:
+            return self.uri_template.format(value)
+        return value
+
+
+class LinkMatchers(object):
+    """
+    Compiles the link matchers once for the whole application and attaches
+    the compiled regexes to each terminal.
+    """
+
+    matchers = None
+    """:type: list"""
+
+    # Total time spent in Vte.Terminal.match_check().
+    check_count = 0
+    check_time = 0.0
+
+    @classmethod
+    def get_matchers(cls):
+        if cls.matchers is None:
+            cls.matchers = cls.compile_matchers()
+        return cls.matchers
+
+    @classmethod
+    def compile_matchers(cls):
+        definitions = [LinkMatcher(name, pattern) for name, pattern in BUILTIN_MATCHERS]
+
+        # User defined matchers: either a pattern, or a dict with a pattern,
+        # an uri, where {0} is replaced with the matched text, and ignore_case.
+        user_matchers = ConfigManager.get_snapshot().values.get('matchers', {})
+        for name in sorted(user_matchers):
+            value = user_matchers[name]
+            if isinstance(value, dict):
+                definitions.append(LinkMatcher(name, value.get('pattern'), value.get('uri'), bool(value.get('ignore_case'))))
+            elif value:
+                definitions.append(LinkMatcher(name, value))
+
+        matchers = []
+        for matcher in definitions:
+            try:
+                matcher.compile()
+            except GLib.Error as e:
+                print('[DEBUG] Invalid link matcher {}: {}'.format(matcher.name, e))
+                continue
+            matchers.append(matcher)
+        return matchers
+
+    @classmethod
+    def reset(cls):
+        cls.matchers = None
+
+    @classmethod
+    def attach(cls, vte):
+        """
+        Attach all the matchers to the terminal.
+
+        :type vte: Vte.Terminal
+        :return: The matchers, keyed by match tag.
+        :rtype: dict
+        """
+        vte.match_remove_all()
+        tags = {}
+        for matcher in cls.get_matchers():
+            tags[matcher.attach(vte)] = matcher
+        return tags
+
+    @classmethod
+    def check(cls, vte, tags, column, row):
+        """
+        Return the (uri, matcher) under the cell, or (None, None).
+        """
+        start = time.time()
+        value, tag = vte.match_check(column, row)
+        elapsed = time.time() - start
+
+        cls.check_count += 1
+        cls.check_time += elapsed
+
+        matcher = tags.get(tag) if value else None
+        if matcher is None:
+            return None, None
+        matcher.match_count += 1
+        matcher.hit_check_time += elapsed
+        return matcher.get_uri(value), matcher
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Return the compile time of each matcher, and the time of the
+        match_check() calls which found it, in seconds.
+
+        :rtype: list
+        """
+        return [{
+            'name': matcher.name,
+            'pcre2': matcher.is_pcre2,
+            'compile_time': matcher.compile_time,
+            'match_count': matcher.match_count,
+            'hit_check_time': matcher.hit_check_time,
+        } for matcher in cls.get_matchers()]
+
+
+# Recompile before the terminals re-attach the matchers.
+TerraHandler.add_ui_event_handler(LinkMatchers.reset, 'matchers.*')
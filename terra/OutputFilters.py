@@ -0,0 +1,282 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import re
+import time
+
+from terra.ConfigManager import ConfigManager
+
+# Longest match of a filter pattern. Matches are not split between chunks:
+# the end of a chunk, from where a match could still start, is held back
+# until the next chunk or flush().
+MAX_CARRY_SIZE = 256
+# A stage slower than this on one chunk is reported, in seconds.
+SLOW_STAGE_TIME = 0.01
+DEFAULT_COLOR = '1;31'
+
+
+class OutputFilter(object):
+    """
+    Streaming transformation of the output of a terminal, see FilterPipeline.
+    """
+
+    name = 'filter'
+
+    def feed(self, data):
+        """
+        Return the transformed data. Filters may hold back the end of the
+        data, it is then returned by flush().
+        """
+        return data
+
+    def flush(self):
+        return b''
+
+    def has_pending(self):
+        return False
+
+
+class TimestampFilter(OutputFilter):
+    """
+    Prefixes lines with the time their output started.
+    """
+
+    name = 'timestamp'
+
+    def __init__(self, time_format):
+        if isinstance(time_format, unicode):
+            time_format = time_format.encode('utf-8')
+        self.format = time_format
+        self.at_line_start = True
+
+    def feed(self, data):
+        if not data:
+            return data
+        stamp = time.strftime(self.format)
+        data = data.replace(b'\n', b'\n' + stamp)
+        if self.at_line_start:
+            data = stamp + data
+        # Stamp the next line when its output starts.
+        self.at_line_start = data.endswith(b'\n' + stamp)
+        if self.at_line_start:
+            data = data[:-len(stamp)]
+        return data
+
+
+class RegexFilter(OutputFilter):
+    """
+    Replaces the matches of a regex. Matches longer than MAX_CARRY_SIZE may
+    be missed when split between chunks.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: Byte string patterns, combined in one alternation.
+            Without groups around them, the regex engine can skip to the
+            possible first characters.
+        """
+        for pattern in patterns:
+            # Joined patterns would hide the invalid one.
+            re.compile(pattern)
+        self.regex = re.compile(b'|'.join(patterns))
+        self.carry = b''
+
+    def replace(self, match):
+        raise NotImplementedError
+
+    def feed(self, data):
+        if self.carry:
+            data = self.carry + data
+            self.carry = b''
+        # The last MAX_CARRY_SIZE bytes, from where a match may continue in
+        # the next chunk, are held back, along with a match across the cut.
+        cut = len(data) - MAX_CARRY_SIZE
+        if cut <= 0:
+            self.carry = data
+            return b''
+        for match in self.regex.finditer(data, max(0, cut - MAX_CARRY_SIZE)):
+            if match.start() >= cut:
+                break
+            if match.end() > cut:
+                cut = match.start()
+                break
+        self.carry = data[cut:]
+        return self.regex.sub(self.replace, data[:cut])
+
+    def flush(self):
+        data, self.carry = self.carry, b''
+        return self.regex.sub(self.replace, data)
+
+    def has_pending(self):
+        return bool(self.carry)
+
+
+class RedactFilter(RegexFilter):
+    name = 'redact'
+
+    def replace(self, match):
+        return b'***'
+
+
+class ColorizeFilter(RegexFilter):
+    name = 'colorize'
+
+    def __init__(self, rules):
+        """
+        :param rules: List of (pattern, SGR color) pairs, e.g. '1;31'.
+        """
+        super(ColorizeFilter, self).__init__([pattern for pattern, color in rules])
+        # Tells which rule matched, with a group around each pattern.
+        self.match_regex = re.compile(b'|'.join(b'(%s)' % pattern for pattern, color in rules))
+        # Maps the number of the group around each pattern to its color.
+        self.colors = {}
+        group = 1
+        for pattern, color in rules:
+            self.colors[group] = b'\x1b[%sm' % color
+            group += re.compile(pattern).groups + 1
+
+    def replace(self, match):
+        group = self.match_regex.match(match.string, match.start()).lastindex
+        return b'%s%s\x1b[0m' % (self.colors[group], match.group())
+
+
+class FilterStage(object):
+    __slots__ = ('filter', 'time', 'bytes', 'calls', 'slow')
+
+    def __init__(self, output_filter):
+        self.filter = output_filter
+        self.time = 0.0
+        self.bytes = 0
+        self.calls = 0
+        self.slow = False
+
+
+class FilterPipeline(object):
+    """
+    Chain of filters run on the output of a terminal before it is fed to
+    the widget, timing each stage.
+    """
+
+    # Time and bytes of all the pipelines, keyed by filter name.
+    totals = {}
+
+    def __init__(self, filters):
+        self.stages = [FilterStage(output_filter) for output_filter in filters]
+
+    def __len__(self):
+        return len(self.stages)
+
+    def feed(self, data):
+        for stage in self.stages:
+            size = len(data)
+            start = time.time()
+            data = stage.filter.feed(data)
+            elapsed = time.time() - start
+            stage.time += elapsed
+            stage.bytes += size
+            stage.calls += 1
+            if elapsed > SLOW_STAGE_TIME and not stage.slow:
+                stage.slow = True
+                print('[DEBUG] Slow output filter {}: {:.1f} ms for {} bytes'.format(
+                    stage.filter.name, elapsed * 1000, size))
+        return data
+
+    def flush(self):
+        data = b''
+        for stage in self.stages:
+            if data:
+                data = stage.filter.feed(data)
+            data += stage.filter.flush()
+        return data
+
+    def has_pending(self):
+        for stage in self.stages:
+            if stage.filter.has_pending():
+                return True
+        return False
+
+    def close(self):
+        for stage in self.stages:
+            total = FilterPipeline.totals.setdefault(stage.filter.name, [0.0, 0])
+            total[0] += stage.time
+            total[1] += stage.bytes
+
+    def get_stats(self):
+        return [{
+            'name': stage.filter.name,
+            'time': stage.time,
+            'bytes': stage.bytes,
+            'calls': stage.calls,
+        } for stage in self.stages]
+
+    @classmethod
+    def report(cls):
+        for name, (seconds, size) in sorted(cls.totals.iteritems()):
+            rate = size / 1048576.0 / seconds if seconds else 0.0
+            print('[DEBUG] Output filter {}: {} bytes in {:.3f}s ({:.1f} MB/s)'.format(name, size, seconds, rate))
+
+
+def to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def create_pipeline():
+    """
+    Build the filters of the 'filters' config section, or return None if
+    there are none and terminals can use the libvte PTY.
+
+    :rtype: FilterPipeline
+    """
+    filters_conf = ConfigManager.get_snapshot().section('filters')
+    if filters_conf is None:
+        return None
+
+    filters = []
+    if filters_conf.timestamp_format:
+        filters.append(TimestampFilter(filters_conf.timestamp_format))
+
+    try:
+        redact = filters_conf.redact or {}
+        patterns = [to_bytes(redact[name]) for name in sorted(redact) if redact[name]]
+        if patterns:
+            filters.append(RedactFilter(patterns))
+    except re.error as e:
+        print('[DEBUG] Invalid redact filter: {}'.format(e))
+
+    try:
+        colorize = filters_conf.colorize or {}
+        rules = []
+        for name in sorted(colorize):
+            value = colorize[name]
+            if isinstance(value, dict):
+                rules.append((to_bytes(value.get('pattern')), to_bytes(value.get('color', DEFAULT_COLOR))))
+            elif value:
+                rules.append((to_bytes(value), DEFAULT_COLOR))
+        if rules:
+            filters.append(ColorizeFilter(rules))
+    except re.error as e:
+        print('[DEBUG] Invalid colorize filter: {}'.format(e))
+
+    if not filters:
+        return None
+    return FilterPipeline(filters)
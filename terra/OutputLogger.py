@@ -0,0 +1,211 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import gzip
+import os
+import shutil
+import threading
+import time
+
+from collections import deque
+
+from terra.AnsiStripper import AnsiStripper
+from terra.ConfigManager import ConfigManager
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class LogFile(object):
+    """
+    Log of one terminal. Only the writer thread touches the file.
+    """
+
+    def __init__(self, path, strip_ansi, rotate_size, rotate_interval, compress):
+        self.path = path
+        self.stripper = AnsiStripper() if strip_ansi else None
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.file = None
+        self.size = 0
+        self.opened_at = 0
+        self.closed = False
+
+    def write(self, data):
+        """
+        :return: The number of bytes written.
+        """
+        if self.stripper is not None:
+            data = self.stripper.strip(data)
+        if not data:
+            return 0
+        if self.file is None:
+            self.open()
+        elif (self.rotate_size and self.size >= self.rotate_size) or \
+             (self.rotate_interval and time.time() - self.opened_at >= self.rotate_interval):
+            self.rotate()
+        self.file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, 'ab', WRITE_BUFFER_SIZE)
+        self.size = self.file.tell()
+        self.opened_at = time.time()
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        rotated_path = '%s.%s' % (self.path, time.strftime('%Y%m%d-%H%M%S'))
+        suffix = 1
+        while os.path.exists(rotated_path) or os.path.exists(rotated_path + '.gz'):
+            rotated_path = '%s.%s-%d' % (self.path, time.strftime('%Y%m%d-%H%M%S'), suffix)
+            suffix += 1
+        os.rename(self.path, rotated_path)
+        if self.compress:
+            # Compressing takes a while, don't hold the other logs.
+            threading.Thread(target=compress_file, args=(rotated_path,)).start()
+        self.open()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def compress_file(path):
+    with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+        shutil.copyfileobj(source, target, WRITE_BUFFER_SIZE)
+    os.unlink(path)
+
+
+class LogWriter(threading.Thread):
+    """
+    Background thread writing the logs of all terminals. The main loop only
+    appends chunks to a queue, it never waits on the disk. Files need write(),
+    flush() and close() methods and a path.
+    """
+
+    def __init__(self):
+        super(LogWriter, self).__init__(name='terra-log-writer')
+        self.daemon = True
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.bytes_written = 0
+
+    def put(self, log_file, data):
+        # deque.append() is atomic, only wake the thread up when it waits.
+        self.queue.append((log_file, data))
+        if len(self.queue) == 1:
+            with self.condition:
+                self.condition.notify()
+
+    def run(self):
+        dirty = set()
+        while True:
+            with self.condition:
+                while not self.queue:
+                    for log_file in dirty:
+                        log_file.flush()
+                    dirty.clear()
+                    self.condition.wait(1.0)
+
+            while self.queue:
+                log_file, data = self.queue.popleft()
+                if log_file is None:
+                    # Stop, see OutputLogger.shutdown().
+                    for log_file in dirty:
+                        log_file.close()
+                    return
+                if data is None:
+                    log_file.close()
+                    dirty.discard(log_file)
+                    continue
+                try:
+                    self.bytes_written += log_file.write(data)
+                except (IOError, OSError) as e:
+                    print('[DEBUG] Could not write {}: {}'.format(log_file.path, e))
+                    continue
+                dirty.add(log_file)
+
+
+class OutputLogger(object):
+    """
+    Writes the output of a terminal to a log file, see the 'logging' config
+    section.
+    """
+
+    writer = None
+    """:type: LogWriter"""
+
+    counter = 0
+
+    def __init__(self, path=None, strip_ansi=None, rotate_size=None, rotate_interval=None, compress=None):
+        logging_conf = ConfigManager.get_snapshot().section('logging')
+        if path is None:
+            OutputLogger.counter += 1
+            file_name = 'terra-%s-%d-%d.log' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), OutputLogger.counter)
+            path = os.path.join(os.path.expanduser(logging_conf.directory), file_name)
+        if strip_ansi is None:
+            strip_ansi = logging_conf.strip_ansi
+        if rotate_size is None:
+            rotate_size = logging_conf.rotate_size * 1024 * 1024
+        if rotate_interval is None:
+            rotate_interval = logging_conf.rotate_interval
+        if compress is None:
+            compress = logging_conf.compress
+
+        self.log_file = LogFile(path, strip_ansi, rotate_size, rotate_interval, compress)
+        self.get_writer()
+
+    @classmethod
+    def get_writer(cls):
+        if cls.writer is None:
+            cls.writer = LogWriter()
+            cls.writer.start()
+        return cls.writer
+
+    @classmethod
+    def shutdown(cls, timeout=5.0):
+        """
+        Write the queued output and close the log files.
+        """
+        if cls.writer is not None:
+            cls.writer.put(None, None)
+            cls.writer.join(timeout)
+            cls.writer = None
+
+    @staticmethod
+    def is_enabled():
+        return bool(ConfigManager.get_conf('logging', 'enabled'))
+
+    def write(self, data):
+        self.writer.put(self.log_file, data)
+
+    def close(self):
+        self.writer.put(self.log_file, None)
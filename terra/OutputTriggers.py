@@ -0,0 +1,285 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import errno
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+
+from gi.repository import GLib
+
+from terra.ConfigManager import ConfigManager
+from terra.handlers import TerraHandler
+from terra.SessionDaemon import READ_SIZE, pack, unpack
+from terra.TriggerEngine import (MSG_RULES, MSG_OUTPUT, MSG_CLOSE, MSG_STATS, MSG_HITS, MSG_STATS_REPLY,
+                                 Trigger, TriggerScanner, TriggerSet, compile_triggers)
+
+# Output for the worker is dropped past this backlog, rather than growing.
+MAX_WORKER_BACKLOG = 8 * 1024 * 1024
+
+
+class TriggerWorker(object):
+    """
+    Process matching the output for rule sets too heavy for the main loop,
+    see TriggerEngine.serve(). Terra only writes the output to its pipe.
+    """
+
+    def __init__(self, triggers):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'terra.TriggerEngine'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.input_fd = self.process.stdin.fileno()
+        self.output_fd = self.process.stdout.fileno()
+        for fd in (self.input_fd, self.output_fd):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.outbuf = bytearray()
+        self.inbuf = bytearray()
+        self.dropped_bytes = 0
+        self.stats = None
+        self.write_source = None
+        self.read_source = GLib.io_add_watch(self.output_fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_readable)
+        self.send(MSG_RULES, 0, json.dumps([trigger.to_dict() for trigger in triggers]))
+
+    def send(self, msg_type, pane_id=0, payload=b''):
+        if self.read_source is None:
+            return
+        if msg_type == MSG_OUTPUT and len(self.outbuf) > MAX_WORKER_BACKLOG:
+            self.dropped_bytes += len(payload)
+            return
+        self.outbuf += pack(msg_type, pane_id, payload)
+        if self.write_source is None:
+            self.flush()
+
+    def flush(self, fd=None, condition=None):
+        try:
+            written = os.write(self.input_fd, self.outbuf)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                print('[DEBUG] Lost the trigger worker: {}'.format(e))
+                # The watch is removed by returning False.
+                self.write_source = None
+                self.stop()
+                return False
+            written = 0
+        del self.outbuf[:written]
+        if not self.outbuf:
+            self.write_source = None
+            return False
+        if self.write_source is None:
+            self.write_source = GLib.io_add_watch(self.input_fd, GLib.PRIORITY_DEFAULT, GLib.IO_OUT, self.flush)
+        return True
+
+    def on_readable(self, fd, condition):
+        try:
+            data = os.read(self.output_fd, READ_SIZE)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return True
+            data = b''
+        if not data:
+            # The watch is removed by returning False.
+            self.read_source = None
+            self.stop()
+            return False
+
+        self.inbuf += data
+        for msg_type, pane_id, payload in unpack(self.inbuf):
+            if msg_type == MSG_HITS:
+                OutputTriggers.dispatch(pane_id, [(index, text.encode('utf-8')) for index, text in json.loads(payload)])
+            elif msg_type == MSG_STATS_REPLY:
+                self.stats = json.loads(payload)
+        return True
+
+    def stop(self):
+        for source_id in (self.read_source, self.write_source):
+            if source_id is not None:
+                GLib.source_remove(source_id)
+        self.read_source = self.write_source = None
+        # Closing the pipes ends the worker, even if it is writing hits.
+        self.process.stdout.close()
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class PaneTriggers(object):
+    """
+    Output tap of a terminal, calling terminal.on_trigger(trigger, text) for
+    the matches, at most once per cooldown for each trigger.
+    """
+
+    def __init__(self, terminal, pane_id, trigger_set, worker=None):
+        self.terminal = terminal
+        self.pane_id = pane_id
+        self.trigger_set = trigger_set
+        self.worker = worker
+        self.scanner = TriggerScanner(trigger_set) if worker is None else None
+        # Maps trigger indexes to the time they last fired.
+        self.fired_at = {}
+
+    def write(self, data):
+        if self.worker is not None:
+            self.worker.send(MSG_OUTPUT, self.pane_id, data)
+            return
+        hits = self.scanner.feed(data)
+        if hits:
+            self.on_hits(hits)
+
+    def on_hits(self, hits):
+        now = time.time()
+        for index, text in hits:
+            trigger = self.trigger_set.triggers[index]
+            if self.worker is not None:
+                trigger.hit_count += 1
+            if now - self.fired_at.get(index, 0) < trigger.cooldown:
+                continue
+            self.fired_at[index] = now
+            self.terminal.on_trigger(trigger, text)
+
+    def close(self):
+        OutputTriggers.panes.pop(self.pane_id, None)
+        if self.worker is not None:
+            self.worker.send(MSG_CLOSE, self.pane_id)
+
+
+class OutputTriggers(object):
+    """
+    Compiles the triggers of the 'triggers' config section once for the
+    whole application. Rule sets bigger than general.trigger_worker_threshold
+    are matched in a TriggerWorker process.
+    """
+
+    trigger_set = None
+    """:type: TriggerSet"""
+
+    worker = None
+    """:type: TriggerWorker"""
+
+    # Maps pane ids to PaneTriggers instances.
+    panes = {}
+    next_pane_id = 1
+
+    @classmethod
+    def get_trigger_set(cls):
+        if cls.trigger_set is None:
+            cls.trigger_set = TriggerSet(cls.compile_triggers())
+            threshold = ConfigManager.get_conf('general', 'trigger_worker_threshold')
+            if threshold and len(cls.trigger_set) > threshold:
+                try:
+                    cls.worker = TriggerWorker(cls.trigger_set.triggers)
+                except OSError as e:
+                    print('[DEBUG] Could not start the trigger worker: {}'.format(e))
+        return cls.trigger_set
+
+    @classmethod
+    def compile_triggers(cls):
+        # Either a pattern, highlighting the terminal, or a dict with a
+        # pattern, an action and its options.
+        definitions = []
+        user_triggers = ConfigManager.get_snapshot().values.get('triggers', {})
+        for name in sorted(user_triggers):
+            value = user_triggers[name]
+            if isinstance(value, dict):
+                definitions.append(Trigger(
+                    name, value.get('pattern'), value.get('action', 'highlight'), value.get('command'),
+                    value.get('ignore_case', False), value.get('cooldown', 1.0)))
+            elif value:
+                definitions.append(Trigger(name, value))
+        return compile_triggers(definitions)
+
+    @classmethod
+    def create(cls, terminal):
+        """
+        Return the output tap of a terminal, or None without triggers.
+
+        :rtype: PaneTriggers
+        """
+        trigger_set = cls.get_trigger_set()
+        if not len(trigger_set):
+            return None
+        pane_id = cls.next_pane_id
+        cls.next_pane_id += 1
+        pane = PaneTriggers(terminal, pane_id, trigger_set, cls.worker)
+        cls.panes[pane_id] = pane
+        return pane
+
+    @classmethod
+    def dispatch(cls, pane_id, hits):
+        pane = cls.panes.get(pane_id)
+        if pane is not None:
+            pane.on_hits(hits)
+
+    @classmethod
+    def reset(cls):
+        cls.stop()
+        cls.trigger_set = None
+
+    @classmethod
+    def stop(cls):
+        if cls.worker is not None:
+            cls.worker.stop()
+            cls.worker = None
+
+    @classmethod
+    def request_stats(cls):
+        """
+        Ask the worker for its match times, get_stats() returns them once
+        they arrived.
+        """
+        if cls.worker is not None:
+            cls.worker.send(MSG_STATS)
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Return the hit count and the estimated match time, in seconds, of
+        each trigger.
+
+        :rtype: dict
+        """
+        if cls.trigger_set is None:
+            return None
+        stats = cls.trigger_set.get_stats()
+        if cls.worker is not None:
+            # The hits are counted here, the matching is timed by the worker.
+            worker_stats = cls.worker.stats or {'triggers': [{'match_time': 0.0} for trigger in stats['triggers']]}
+            for key in ('scan_count', 'scan_time', 'scanned_bytes'):
+                stats[key] = worker_stats.get(key, 0)
+            for trigger_stats, worker_trigger_stats in zip(stats['triggers'], worker_stats['triggers']):
+                trigger_stats['match_time'] = worker_trigger_stats['match_time']
+            stats['dropped_bytes'] = cls.worker.dropped_bytes
+        return stats
+
+    @classmethod
+    def report(cls):
+        stats = cls.get_stats()
+        if stats is None:
+            return
+        print('[DEBUG] Triggers scanned {} bytes in {:.3f}s'.format(stats['scanned_bytes'], stats['scan_time']))
+        for trigger_stats in stats['triggers']:
+            print('[DEBUG] Trigger {name}: {hit_count} hits, ~{match_time:.3f}s'.format(**trigger_stats))
+
+
+# Recompile before the terminals re-create their triggers.
+TerraHandler.add_ui_event_handler(OutputTriggers.reset, 'triggers.*')
@@ -0,0 +1,209 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import errno
+import fcntl
+import io
+import os
+import signal
+
+from gi.repository import GLib, Vte
+
+# Output read at most per main loop iteration, in a buffer reused across reads.
+BUFFER_SIZE = 262144
+
+
+class OwnedPty(object):
+    """
+    A PTY read by terra instead of Vte.Terminal, so the output of the
+    program goes through on_output(data) before being fed to the widget.
+    Terminals use it only when something taps their output.
+    """
+
+    def __init__(self, on_output, on_exit):
+        """
+        :param on_output: Called with each chunk of output.
+        :param on_exit: Called with the wait status once the program exited
+            and its output was read.
+        """
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.pty = None
+        self.fd = -1
+        self.pid = 0
+        self.read_source = None
+        self.write_source = None
+        self.child_source = None
+        self.closed = False
+        self.pending_input = b''
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.reader = None
+
+    @staticmethod
+    def is_supported():
+        return hasattr(Vte, 'Pty') and hasattr(Vte.Pty, 'new_sync')
+
+    @staticmethod
+    def get_envp():
+        """
+        Environment of the programs terra spawns itself, with the TERM the
+        libvte spawn sets.
+        """
+        env = dict(os.environ)
+        env['TERM'] = 'xterm-256color'
+        return ['%s=%s' % item for item in env.iteritems()]
+
+    def spawn(self, argv, cwd, rows, columns):
+        """
+        Start the program, raises GLib.GError on failure.
+
+        :rtype: int
+        """
+        self.pty = Vte.Pty.new_sync(Vte.PtyFlags.DEFAULT, None)
+        self.pty.set_size(rows, columns)
+
+        self.pid = int(GLib.spawn_async(
+            argv=argv,
+            envp=self.get_envp(),
+            working_directory=cwd,
+            flags=GLib.SpawnFlags.DO_NOT_REAP_CHILD | GLib.SpawnFlags.SEARCH_PATH,
+            child_setup=self.pty.child_setup,
+            user_data=None)[0])
+
+        self.fd = self.pty.get_fd()
+        fcntl.fcntl(self.fd, fcntl.F_SETFL, fcntl.fcntl(self.fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.reader = io.FileIO(self.fd, 'rb', closefd=False)
+        self.read_source = GLib.io_add_watch(self.fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_readable)
+        self.child_source = GLib.child_watch_add(GLib.PRIORITY_DEFAULT, self.pid, self.on_child_exited)
+        return self.pid
+
+    def read(self):
+        """
+        Read the available output, at most BUFFER_SIZE bytes, so fast programs
+        are passed on in few large chunks. Returns None when nothing is
+        available, and an empty string at the end of the output.
+        """
+        filled = 0
+        while filled < BUFFER_SIZE:
+            try:
+                # None when the read would block.
+                size = self.reader.readinto(self.view[filled:])
+            except (IOError, OSError) as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.EAGAIN:
+                    break
+                # EIO once the program and its children closed the terminal.
+                size = 0
+            if not size:
+                if size == 0 and not filled:
+                    return b''
+                break
+            filled += size
+        if not filled:
+            return None
+        return self.view[:filled].tobytes()
+
+    def set_priority(self, priority):
+        """
+        Change the priority of the output, e.g. lower it for a flooding
+        program so the input of the other terminals goes first.
+        """
+        if self.read_source is None:
+            return
+        GLib.source_remove(self.read_source)
+        self.read_source = GLib.io_add_watch(self.fd, priority, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_readable)
+
+    def on_readable(self, fd, condition):
+        data = self.read()
+        if data is None:
+            return True
+        if not data:
+            self.read_source = None
+            return False
+        self.on_output(data)
+        return True
+
+    def on_child_exited(self, pid, status):
+        self.child_source = None
+        if self.closed:
+            # Closed while the program was running, the watch only reaped it.
+            return
+        # Pass on the output written right before the exit.
+        if self.read_source is not None:
+            while True:
+                data = self.read()
+                if not data:
+                    break
+                self.on_output(data)
+        self.close()
+        self.on_exit(status)
+
+    def write(self, data):
+        if self.fd < 0:
+            return
+        self.pending_input += data
+        self.flush_input()
+
+    def flush_input(self, *args):
+        try:
+            written = os.write(self.fd, self.pending_input)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EINTR):
+                self.pending_input = b''
+                self.write_source = None
+                return False
+            written = 0
+        self.pending_input = self.pending_input[written:]
+
+        if not self.pending_input:
+            self.write_source = None
+            return False
+        if self.write_source is None:
+            # The program does not read fast enough, e.g. on a large paste.
+            self.write_source = GLib.io_add_watch(self.fd, GLib.PRIORITY_DEFAULT, GLib.IO_OUT, self.flush_input)
+        return True
+
+    def resize(self, rows, columns):
+        if self.pty is not None:
+            self.pty.set_size(rows, columns)
+
+    def close(self, hangup=False):
+        """
+        Stop reading the output. The child watch stays until the program
+        exited, as it was spawned with DO_NOT_REAP_CHILD and would be left
+        a zombie otherwise, but on_exit is no longer called.
+        """
+        self.closed = True
+        for source_id in (self.read_source, self.write_source):
+            if source_id is not None:
+                GLib.source_remove(source_id)
+        self.read_source = self.write_source = None
+        if hangup and self.pid:
+            try:
+                os.killpg(os.getpgid(self.pid), signal.SIGHUP)
+            except OSError:
+                pass
+        # The Vte.Pty closes the master side.
+        self.pty = None
+        self.reader = None
+        self.fd = -1
@@ -0,0 +1,94 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+MOVE_UP = 1
+MOVE_DOWN = 2
+MOVE_LEFT = 3
+MOVE_RIGHT = 4
+
+# Pixels two panes may overlap or be apart and still be adjacent, for the
+# Gtk.Paned handles between them.
+EDGE_TOLERANCE = 16
+
+
+class PaneRectIndex(object):
+    """
+    Allocations of the terminals of a tab, relative to the tab, to find the
+    neighbor of a terminal in a direction without walking the widget tree.
+    """
+
+    def __init__(self):
+        # Maps terminal ids to (x, y, width, height) tuples.
+        self.rects = {}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def update(self, pane_id, x, y, width, height):
+        self.rects[pane_id] = (x, y, width, height)
+
+    def discard(self, pane_id):
+        self.rects.pop(pane_id, None)
+
+    def get_neighbor(self, pane_id, direction):
+        """
+        Return the id of the closest terminal in direction which overlaps the
+        terminal pane_id on the other axis, or None.
+
+        :type pane_id: int
+        :type direction: int
+        """
+        rect = self.rects.get(pane_id)
+        if rect is None:
+            return None
+        x, y, width, height = rect
+
+        best = None
+        best_key = None
+        for other_id, (other_x, other_y, other_width, other_height) in self.rects.iteritems():
+            if other_id == pane_id:
+                continue
+
+            if direction in (MOVE_UP, MOVE_DOWN):
+                if direction == MOVE_UP:
+                    distance = y - (other_y + other_height)
+                else:
+                    distance = other_y - (y + height)
+                overlap = min(x + width, other_x + other_width) - max(x, other_x)
+                offset = abs(other_x - x)
+            else:
+                if direction == MOVE_LEFT:
+                    distance = x - (other_x + other_width)
+                else:
+                    distance = other_x - (x + width)
+                overlap = min(y + height, other_y + other_height) - max(y, other_y)
+                offset = abs(other_y - y)
+
+            if distance < -EDGE_TOLERANCE or overlap <= 0:
+                continue
+
+            # Closest first, then the largest shared edge, then the most
+            # aligned one.
+            key = (max(distance, 0) // EDGE_TOLERANCE, -overlap, offset)
+            if best_key is None or key < best_key:
+                best = other_id
+                best_key = key
+        return best
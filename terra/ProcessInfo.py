@@ -0,0 +1,166 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+import os
+import pwd
+
+PROC_PATH = '/proc'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# Entries are keyed by (pid, start time), so a recycled pid never hits.
+CACHE_MAX_SIZE = 512
+
+
+class ProcessInfo(object):
+    __slots__ = ('pid', 'start_time', 'user', 'cmdline')
+
+    # Maps (pid, start_time) to ProcessInfo instances.
+    _cache = {}
+
+    def __init__(self, pid, start_time, user, cmdline):
+        self.pid = pid
+        self.start_time = start_time
+        self.user = user
+        self.cmdline = cmdline
+
+    def get_elapsed_time(self):
+        """
+        Return the number of seconds since the process started.
+        """
+        try:
+            with open(os.path.join(PROC_PATH, 'uptime'), 'r') as uptime_file:
+                uptime = float(uptime_file.read().split()[0])
+        except (IOError, ValueError, IndexError):
+            return 0
+        return max(0, int(uptime - float(self.start_time) / CLOCK_TICKS))
+
+    @staticmethod
+    def read_stat(pid):
+        """
+        Return the fields of /proc/<pid>/stat following the command name, or
+        None if the process does not exist.
+
+        :type pid: int
+        :rtype: list
+        """
+        try:
+            with open(os.path.join(PROC_PATH, str(pid), 'stat'), 'r') as stat_file:
+                data = stat_file.read()
+        except (IOError, OSError):
+            return None
+
+        # The command name may contain spaces and parenthesis.
+        return data[data.rfind(')') + 2:].split()
+
+    @staticmethod
+    def get_start_time(pid):
+        fields = ProcessInfo.read_stat(pid)
+        if not fields or len(fields) < 20:
+            return None
+        return int(fields[19])
+
+    @staticmethod
+    def get_cwd(pid):
+        if not pid:
+            return None
+        try:
+            return os.readlink(os.path.join(PROC_PATH, str(pid), 'cwd'))
+        except OSError:
+            return None
+
+    @staticmethod
+    def get_foreground_pid(pty_fd, default=None):
+        """
+        Return the process group leader in the foreground of the PTY, which
+        is the running job, or the shell itself when it sits at the prompt.
+
+        :type pty_fd: int
+        :type default: int
+        """
+        if pty_fd is None or pty_fd < 0:
+            return default
+        try:
+            pgid = os.tcgetpgrp(pty_fd)
+        except OSError:
+            return default
+        if pgid <= 0:
+            return default
+        return pgid
+
+    @classmethod
+    def get(cls, pid):
+        """
+        Return the cached process information for pid, or None if the process
+        does not exist.
+
+        :type pid: int
+        :rtype: ProcessInfo
+        """
+        if not pid:
+            return None
+
+        start_time = cls.get_start_time(pid)
+        if start_time is None:
+            return None
+
+        key = (pid, start_time)
+        info = cls._cache.get(key)
+        if info is not None:
+            return info
+
+        proc_dir = os.path.join(PROC_PATH, str(pid))
+        try:
+            uid = os.stat(proc_dir).st_uid
+            with open(os.path.join(proc_dir, 'cmdline'), 'r') as cmdline_file:
+                cmdline = ' '.join(arg for arg in cmdline_file.read().split('\0') if arg)
+            if not cmdline:
+                with open(os.path.join(proc_dir, 'comm'), 'r') as comm_file:
+                    cmdline = comm_file.read().strip()
+        except (IOError, OSError):
+            return None
+
+        try:
+            user = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            user = str(uid)
+
+        if len(cls._cache) >= CACHE_MAX_SIZE:
+            cls._cache.clear()
+
+        info = cls(pid, start_time, user, cmdline)
+        cls._cache[key] = info
+        return info
+
+
+def format_elapsed_time(seconds):
+    """
+    Format a duration the way `ps -o etime` does: [[dd-]hh:]mm:ss
+
+    :type seconds: int
+    :rtype: str
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return '%d-%02d:%02d:%02d' % (days, hours, minutes, seconds)
+    if hours:
+        return '%02d:%02d:%02d' % (hours, minutes, seconds)
+    return '%02d:%02d' % (minutes, seconds)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import os
+import time
+
+from collections import deque
+
+from terra.ConfigManager import ConfigManager
+
+RESPAWN = 'respawn'
+CLOSE = 'close'
+HOLD = 'hold'
+POLICIES = (RESPAWN, CLOSE, HOLD)
+
+# Processes exiting sooner than this after their start count as failures.
+MIN_UPTIME = 2.0
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# Consecutive failures of a terminal before it is held.
+MAX_FAILURES = 6
+# Failures of all terminals within CRASH_LOOP_WINDOW seconds before every
+# failing terminal is held.
+CRASH_LOOP_FAILURES = 20
+CRASH_LOOP_WINDOW = 10.0
+
+
+def format_exit_status(status):
+    """
+    :type status: int
+    :rtype: str
+    """
+    if status is None:
+        return ''
+    if os.WIFSIGNALED(status):
+        return 'killed by signal %d' % os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return 'exited with status %d' % os.WEXITSTATUS(status)
+    return 'exited with status %d' % status
+
+
+class RespawnPolicy(object):
+    """
+    Decides what happens when the process of a terminal exits. Processes
+    which keep failing right after their start are respawned with an
+    exponential backoff, then held, so they can't fork in a tight loop.
+    """
+
+    # Times of the recent failures, all terminals included.
+    failures = deque()
+
+    counters = {
+        RESPAWN: 0,
+        CLOSE: 0,
+        HOLD: 0,
+        'failures': 0,
+        'crash_loops': 0,
+    }
+
+    @staticmethod
+    def get_policy(terminal):
+        policy = terminal.respawn_policy or ConfigManager.get_conf('general', 'respawn_policy')
+        if policy not in POLICIES:
+            return RESPAWN
+        return policy
+
+    @classmethod
+    def decide(cls, terminal, now=None):
+        """
+        Return the action for the terminal whose process just exited, and the
+        delay in seconds before respawning it.
+
+        :rtype: (str, float)
+        """
+        if now is None:
+            now = time.time()
+
+        if now - terminal.spawn_start_time < MIN_UPTIME:
+            terminal.respawn_failures += 1
+            cls.counters['failures'] += 1
+            cls.failures.append(now)
+        else:
+            terminal.respawn_failures = 0
+
+        while cls.failures and now - cls.failures[0] > CRASH_LOOP_WINDOW:
+            cls.failures.popleft()
+
+        policy = cls.get_policy(terminal)
+        delay = 0.0
+        if policy == RESPAWN and terminal.respawn_failures:
+            if len(cls.failures) >= CRASH_LOOP_FAILURES:
+                cls.counters['crash_loops'] += 1
+                policy = HOLD
+            elif terminal.respawn_failures >= MAX_FAILURES:
+                policy = HOLD
+            else:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (terminal.respawn_failures - 1))
+
+        cls.counters[policy] += 1
+        return policy, delay
+
+    @classmethod
+    def get_stats(cls):
+        return dict(cls.counters)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+from collections import deque
+
+from gi.repository import GLib
+
+from terra.ConfigManager import ConfigManager
+
+
+class RestoreScheduler(object):
+    """
+    Restores saved tabs in the background. Windows restore their active tab
+    right away and queue the other ones, which are then built in small idle
+    batches once the main loop runs, or as soon as they are viewed.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.source_id = None
+        self.total = 0
+        self.done = 0
+
+    def add(self, window, container):
+        self.queue.append((window, container))
+        self.total += 1
+        if self.source_id is None:
+            self.source_id = GLib.idle_add(self.run_batch, priority=GLib.PRIORITY_LOW)
+
+    def materialize(self, window, container):
+        """
+        Restore a pending tab now, e.g. when it is viewed for the first time.
+        """
+        if container.pending_spec is None:
+            return
+        window.restore_page(container)
+        self.done += 1
+        self.report()
+
+    def run_batch(self):
+        batch_size = max(1, ConfigManager.get_conf('general', 'restore_batch_size'))
+        while batch_size and self.queue:
+            window, container = self.queue.popleft()
+            # Skip tabs which were viewed or closed in the meantime.
+            if container.pending_spec is None or container.get_parent() is None:
+                continue
+            self.materialize(window, container)
+            batch_size -= 1
+
+        if self.queue:
+            return True
+        self.source_id = None
+        return False
+
+    def report(self):
+        print('[DEBUG] Restored {}/{} background tabs'.format(self.done, self.total))
+
+    def get_progress(self):
+        return self.done, self.total
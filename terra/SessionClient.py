@@ -0,0 +1,256 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import errno
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from gi.repository import GLib
+
+from terra.SessionDaemon import (HEADER, MSG_HELLO, MSG_SPAWN, MSG_ATTACH, MSG_INPUT, MSG_RESIZE, MSG_KILL,
+                                 MSG_PANES, MSG_ATTACHED, MSG_OUTPUT, MSG_EXITED, MSG_ERROR,
+                                 READ_SIZE, get_socket_path, is_private_directory, pack, unpack)
+
+CONNECT_TIMEOUT = 2.0
+
+
+class SessionError(Exception):
+    def __init__(self, message):
+        super(SessionError, self).__init__(message)
+        self.message = message
+
+
+class SessionClient(object):
+    """
+    Connection of terra to the session daemon, see SessionDaemon. Terminals
+    in daemon mode have no PTY of their own: their output is fed to the
+    widget and their input is sent to the daemon.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        # Maps daemon pane ids to terminals.
+        self.terminals = {}
+        # Maps spawn request tokens to terminals.
+        self.pending = {}
+        self.next_token = 1
+        # Daemon panes running when terra connected.
+        self.pane_ids = []
+        self.source_id = None
+        self.write_source = None
+        self.connected = True
+
+    @classmethod
+    def connect(cls, replay_size):
+        """
+        Connect to the session daemon, starting it if needed. Returns None if
+        the daemon can't be reached.
+
+        :rtype: SessionClient
+        """
+        path = get_socket_path()
+        sock = cls.open_socket(path)
+        if sock is None:
+            subprocess.call([sys.executable, '-m', 'terra.SessionDaemon', path, str(replay_size)],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            deadline = time.time() + CONNECT_TIMEOUT
+            while sock is None and time.time() < deadline:
+                time.sleep(0.05)
+                sock = cls.open_socket(path)
+        if sock is None:
+            print('[DEBUG] Could not connect to the session daemon: {}'.format(path))
+            return None
+        if not is_private_directory(os.path.dirname(path)):
+            # Another user could have put their own socket there.
+            print('[DEBUG] Not a private directory: {}'.format(os.path.dirname(path)))
+            sock.close()
+            return None
+
+        client = cls(sock)
+        try:
+            client.hello()
+        except socket.error as e:
+            # Also socket.timeout, e.g. for a daemon that stopped responding.
+            print('[DEBUG] No answer from the session daemon: {}'.format(e))
+            sock.close()
+            return None
+        sock.setblocking(False)
+        client.source_id = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, client.on_readable)
+        return client
+
+    @staticmethod
+    def open_socket(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            sock.close()
+            return None
+        return sock
+
+    def hello(self):
+        """
+        Read the panes of the daemon, synchronously. Raises socket.timeout
+        if the daemon doesn't answer within CONNECT_TIMEOUT.
+        """
+        self.sock.settimeout(CONNECT_TIMEOUT)
+        self.sock.sendall(pack(MSG_HELLO))
+        while True:
+            data = self.sock.recv(READ_SIZE)
+            if not data:
+                return
+            self.inbuf += data
+            for msg_type, pane_id, payload in unpack(self.inbuf):
+                if msg_type == MSG_PANES:
+                    self.pane_ids = [pane['id'] for pane in json.loads(payload)]
+                    return
+
+    def get_pane_ids(self):
+        return self.pane_ids
+
+    def send(self, msg_type, pane_id=0, payload=b''):
+        if not self.connected:
+            return
+        self.outbuf += pack(msg_type, pane_id, payload)
+        if self.write_source is None:
+            self.flush()
+
+    def flush(self, *args):
+        """
+        Send the buffered messages without blocking the main loop, the rest
+        is sent once the daemon reads again.
+        """
+        try:
+            sent = self.sock.send(self.outbuf)
+        except socket.error as e:
+            if e.args[0] not in (errno.EAGAIN, errno.EINTR):
+                print('[DEBUG] Lost the session daemon: {}'.format(e))
+                # Returning False removes the watch.
+                self.write_source = None
+                self.disconnect()
+                return False
+            sent = 0
+        del self.outbuf[:sent]
+
+        if not self.outbuf:
+            self.write_source = None
+            return False
+        if self.write_source is None:
+            self.write_source = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_OUT, self.flush)
+        return True
+
+    def spawn(self, terminal, argv, cwd, rows, columns):
+        token = self.next_token
+        self.next_token += 1
+        self.pending[token] = terminal
+        self.send(MSG_SPAWN, token, json.dumps({
+            'argv': argv,
+            'cwd': cwd,
+            'env': dict(os.environ),
+            'rows': rows,
+            'columns': columns,
+        }))
+
+    def attach(self, terminal, pane_id):
+        self.terminals[pane_id] = terminal
+        self.send(MSG_ATTACH, pane_id)
+
+    def send_input(self, pane_id, data):
+        self.send(MSG_INPUT, pane_id, data)
+
+    def resize(self, pane_id, rows, columns):
+        self.send(MSG_RESIZE, pane_id, json.dumps([rows, columns]))
+
+    def kill(self, pane_id):
+        self.terminals.pop(pane_id, None)
+        self.send(MSG_KILL, pane_id)
+
+    def kill_all(self):
+        for pane_id in self.terminals.keys():
+            self.kill(pane_id)
+
+    def on_readable(self, fd, condition):
+        try:
+            data = self.sock.recv(READ_SIZE)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EINTR):
+                return True
+            print('[DEBUG] Lost the session daemon: {}'.format(e))
+            data = b''
+        if not data:
+            # The watch is removed by returning False.
+            self.source_id = None
+            self.disconnect()
+            return False
+
+        self.inbuf += data
+        for msg_type, pane_id, payload in unpack(self.inbuf):
+            self.dispatch(msg_type, pane_id, payload)
+        return True
+
+    def dispatch(self, msg_type, pane_id, payload):
+        if msg_type == MSG_OUTPUT:
+            terminal = self.terminals.get(pane_id)
+            if terminal is not None:
+                terminal.on_output(payload)
+        elif msg_type == MSG_ATTACHED:
+            message = json.loads(payload)
+            if message['token'] is not None:
+                terminal = self.pending.pop(message['token'], None)
+                if terminal is None:
+                    return
+                self.terminals[pane_id] = terminal
+            else:
+                terminal = self.terminals.get(pane_id)
+            if terminal is not None:
+                terminal.on_daemon_attached(pane_id, message['pid'])
+        elif msg_type == MSG_EXITED:
+            terminal = self.terminals.pop(pane_id, None)
+            if terminal is not None:
+                terminal.on_daemon_exited(json.loads(payload)['status'])
+        elif msg_type == MSG_ERROR:
+            terminal = self.pending.pop(pane_id, None)
+            if terminal is not None:
+                terminal.on_spawned(terminal.vte, -1, SessionError(json.loads(payload)['message']))
+
+    def disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        for source_id in (self.source_id, self.write_source):
+            if source_id is not None:
+                GLib.source_remove(source_id)
+        self.source_id = self.write_source = None
+        del self.outbuf[:]
+        self.sock.close()
+
+        terminals, self.terminals = self.terminals.values(), {}
+        pending, self.pending = self.pending.values(), {}
+        for terminal in terminals:
+            terminal.on_daemon_exited(None)
+        for terminal in pending:
+            terminal.on_spawned(terminal.vte, -1, SessionError('lost the session daemon'))
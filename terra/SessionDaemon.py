@@ -0,0 +1,441 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import errno
+import fcntl
+import json
+import os
+import pty
+import select
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import termios
+
+from collections import deque
+
+# Frame header: message type, pane id and payload length.
+HEADER = struct.Struct('!BII')
+
+# Client to daemon.
+MSG_HELLO = 1
+MSG_SPAWN = 2
+MSG_ATTACH = 3
+MSG_INPUT = 4
+MSG_RESIZE = 5
+MSG_KILL = 6
+
+# Daemon to client.
+MSG_PANES = 10
+MSG_ATTACHED = 11
+MSG_OUTPUT = 12
+MSG_EXITED = 13
+MSG_ERROR = 14
+
+REPLAY_BUFFER_SIZE = 256 * 1024
+READ_SIZE = 65536
+# Clients which stopped reading are disconnected past this size, e.g. on
+# replays, as panes stop being read at CLIENT_HIGH_WATER.
+MAX_CLIENT_BUFFER = 8 * 1024 * 1024
+# Panes are not read while one of their clients has more output queued.
+CLIENT_HIGH_WATER = 1024 * 1024
+
+
+def get_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), 'terra-%d' % os.getuid())
+    return os.path.join(runtime_dir, 'terra-session.sock')
+
+
+def is_private_directory(directory):
+    """
+    Whether directory belongs to the user and no one else can use it, as
+    anyone able to replace the socket could read and type into the terminals.
+    """
+    try:
+        info = os.lstat(directory)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0077
+
+
+def set_cloexec(fd):
+    """
+    Keep fd from the programs of the panes, or they could read and type into
+    the other panes and hold the client sockets open.
+    """
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+
+def pack(msg_type, pane_id=0, payload=b''):
+    return HEADER.pack(msg_type, pane_id, len(payload)) + payload
+
+
+def unpack(buf):
+    """
+    Remove the complete frames from the start of buf, a bytearray, and
+    return them as (type, pane id, payload) tuples.
+
+    :type buf: bytearray
+    :rtype: list
+    """
+    frames = []
+    offset = 0
+    while len(buf) - offset >= HEADER.size:
+        msg_type, pane_id, length = HEADER.unpack_from(buf, offset)
+        end = offset + HEADER.size + length
+        if len(buf) < end:
+            break
+        frames.append((msg_type, pane_id, bytes(buf[offset + HEADER.size:end])))
+        offset = end
+    del buf[:offset]
+    return frames
+
+
+class ReplayBuffer(object):
+    """
+    The last output of a pane, at most size bytes.
+    """
+
+    def __init__(self, size=REPLAY_BUFFER_SIZE):
+        self.size = size
+        self.chunks = deque()
+        self.length = 0
+
+    def append(self, data):
+        self.chunks.append(data)
+        self.length += len(data)
+        while self.length > self.size:
+            extra = self.length - self.size
+            first = self.chunks[0]
+            if len(first) <= extra:
+                self.chunks.popleft()
+                self.length -= len(first)
+            else:
+                self.chunks[0] = first[extra:]
+                self.length -= extra
+
+    def get_value(self):
+        return b''.join(self.chunks)
+
+
+class DaemonPane(object):
+    __slots__ = ('id', 'pid', 'fd', 'argv', 'replay', 'clients')
+
+    def __init__(self, pane_id, pid, fd, argv, replay_size):
+        self.id = pane_id
+        self.pid = pid
+        self.fd = fd
+        self.argv = argv
+        self.replay = ReplayBuffer(replay_size)
+        self.clients = set()
+
+
+class DaemonClient(object):
+    __slots__ = ('sock', 'inbuf', 'outbuf')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class SessionDaemon(object):
+    """
+    Owns the PTYs and processes of the terminals, so they survive terra. Terra
+    attaches over a UNIX socket and gets the recent output of each terminal
+    replayed. The daemon exits once it has no terminals and no clients.
+    """
+
+    def __init__(self, path, replay_size=REPLAY_BUFFER_SIZE):
+        self.path = path
+        self.replay_size = replay_size
+        self.panes = {}
+        self.fds = {}
+        self.clients = []
+        self.next_id = 1
+        # Exited processes which were not reaped yet, and their pane ids.
+        self.zombies = {}
+        self.server = None
+        self.lock = None
+        self.accepted = False
+
+    def listen(self):
+        """
+        Returns False if another daemon owns the socket, or if its directory
+        is not private.
+        """
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        if not is_private_directory(directory):
+            print('[DEBUG] Not a private directory: {}'.format(directory))
+            return False
+
+        # Held until the daemon exits, so two terra starting at once don't
+        # both take over the socket.
+        self.lock = open(self.path + '.lock', 'a')
+        set_cloexec(self.lock.fileno())
+        try:
+            fcntl.flock(self.lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            return False
+
+        if os.path.exists(self.path):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                # Left behind by a daemon which did not exit cleanly.
+                os.unlink(self.path)
+            else:
+                return False
+            finally:
+                sock.close()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        set_cloexec(self.server.fileno())
+        self.server.bind(self.path)
+        os.chmod(self.path, 0600)
+        self.server.listen(16)
+        return True
+
+    def run(self):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+
+        while self.panes or self.clients or not self.accepted:
+            readers = [self.server] + self.clients
+            readers.extend(fd for fd, pane in self.fds.iteritems() if not self.is_throttled(pane))
+            writers = [client for client in self.clients if client.outbuf]
+            try:
+                readable, writable, _ = select.select(readers, writers, [], 1.0)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for obj in readable:
+                if obj is self.server:
+                    self.accept()
+                elif isinstance(obj, DaemonClient):
+                    self.read_client(obj)
+                elif obj in self.fds:
+                    self.read_pane(self.fds[obj])
+            for client in writable:
+                self.flush_client(client)
+            self.reap()
+
+        self.server.close()
+        os.unlink(self.path)
+        self.lock.close()
+
+    def accept(self):
+        sock, address = self.server.accept()
+        set_cloexec(sock.fileno())
+        sock.setblocking(False)
+        self.clients.append(DaemonClient(sock))
+        self.accepted = True
+
+    def drop_client(self, client):
+        if client in self.clients:
+            self.clients.remove(client)
+        for pane in self.panes.itervalues():
+            pane.clients.discard(client)
+        client.sock.close()
+
+    @staticmethod
+    def is_throttled(pane):
+        """
+        Whether a client of pane has too much output queued. The pane is then
+        not read, which blocks its program until the client catches up.
+        """
+        for client in pane.clients:
+            if len(client.outbuf) > CLIENT_HIGH_WATER:
+                return True
+        return False
+
+    def send(self, client, data):
+        client.outbuf += data
+        if len(client.outbuf) > MAX_CLIENT_BUFFER:
+            self.drop_client(client)
+
+    def flush_client(self, client):
+        try:
+            sent = client.sock.send(client.outbuf)
+        except socket.error as e:
+            if e.args[0] not in (errno.EAGAIN, errno.EINTR):
+                self.drop_client(client)
+            return
+        del client.outbuf[:sent]
+
+    def read_client(self, client):
+        try:
+            data = client.sock.recv(READ_SIZE)
+        except socket.error as e:
+            if e.args[0] not in (errno.EAGAIN, errno.EINTR):
+                self.drop_client(client)
+            return
+        if not data:
+            self.drop_client(client)
+            return
+
+        client.inbuf += data
+        for msg_type, pane_id, payload in unpack(client.inbuf):
+            self.handle(client, msg_type, pane_id, payload)
+
+    def handle(self, client, msg_type, pane_id, payload):
+        pane = self.panes.get(pane_id)
+        if msg_type == MSG_HELLO:
+            panes = [{'id': pane.id, 'pid': pane.pid, 'argv': pane.argv} for pane in self.panes.itervalues()]
+            self.send(client, pack(MSG_PANES, 0, json.dumps(panes)))
+        elif msg_type == MSG_SPAWN:
+            self.spawn(client, pane_id, json.loads(payload))
+        elif msg_type == MSG_ATTACH:
+            if pane is None:
+                self.send(client, pack(MSG_EXITED, pane_id, json.dumps({'status': None})))
+                return
+            pane.clients.add(client)
+            self.send(client, pack(MSG_ATTACHED, pane_id, json.dumps({'token': None, 'pid': pane.pid})))
+            self.send(client, pack(MSG_OUTPUT, pane_id, pane.replay.get_value()))
+        elif pane is None:
+            return
+        elif msg_type == MSG_INPUT:
+            try:
+                os.write(pane.fd, payload)
+            except OSError:
+                pass
+        elif msg_type == MSG_RESIZE:
+            rows, columns = json.loads(payload)
+            fcntl.ioctl(pane.fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+        elif msg_type == MSG_KILL:
+            pane.clients.clear()
+            try:
+                os.kill(pane.pid, signal.SIGHUP)
+            except OSError:
+                pass
+
+    def spawn(self, client, token, options):
+        argv = [str(arg) for arg in options['argv']]
+        env = dict((str(key), str(value)) for key, value in options.get('env', {}).iteritems())
+        env['TERM'] = 'xterm-256color'
+        # Check the directory here, the child can't report errors.
+        cwd = options.get('cwd')
+        if not cwd or not os.path.isdir(cwd):
+            cwd = env.get('HOME', '/')
+
+        try:
+            pid, fd = pty.fork()
+        except OSError as e:
+            self.send(client, pack(MSG_ERROR, token, json.dumps({'message': str(e)})))
+            return
+
+        if pid == 0:
+            try:
+                # Ignored signals would be inherited by the program.
+                signal.signal(signal.SIGHUP, signal.SIG_DFL)
+                signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+                os.chdir(cwd)
+                os.execvpe(argv[0], argv, env)
+            finally:
+                os._exit(127)
+
+        set_cloexec(fd)
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', options.get('rows', 24), options.get('columns', 80), 0, 0))
+
+        pane = DaemonPane(self.next_id, pid, fd, argv, self.replay_size)
+        self.next_id += 1
+        pane.clients.add(client)
+        self.panes[pane.id] = pane
+        self.fds[fd] = pane
+        self.send(client, pack(MSG_ATTACHED, pane.id, json.dumps({'token': token, 'pid': pid})))
+
+    def read_pane(self, pane):
+        try:
+            data = os.read(pane.fd, READ_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            # EIO once the last process using the terminal exited.
+            data = b''
+
+        if not data:
+            self.close_pane(pane)
+            return
+
+        pane.replay.append(data)
+        frame = pack(MSG_OUTPUT, pane.id, data)
+        for client in list(pane.clients):
+            self.send(client, frame)
+
+    def close_pane(self, pane):
+        del self.panes[pane.id]
+        del self.fds[pane.fd]
+        os.close(pane.fd)
+        self.zombies[pane.pid] = pane
+
+    def reap(self):
+        for pid, pane in self.zombies.items():
+            try:
+                reaped, status = os.waitpid(pid, os.WNOHANG)
+            except OSError:
+                reaped, status = pid, None
+            if not reaped:
+                continue
+            del self.zombies[pid]
+            frame = pack(MSG_EXITED, pane.id, json.dumps({'status': status}))
+            for client in list(pane.clients):
+                self.send(client, frame)
+
+
+def main(args):
+    path = args[0] if args else get_socket_path()
+    replay_size = int(args[1]) if len(args) > 1 else REPLAY_BUFFER_SIZE
+
+    daemon = SessionDaemon(path, replay_size)
+    if not daemon.listen():
+        return
+
+    # Detach from terra, its exit must not end the terminals.
+    if os.fork():
+        os._exit(0)
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    if devnull > 2:
+        os.close(devnull)
+
+    daemon.run()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import os
+import signal
+import time
+
+from collections import deque
+
+from gi.repository import GLib, Vte
+
+from terra.ConfigManager import ConfigManager
+from terra.handlers import TerraHandler
+from terra.OwnedPty import OwnedPty
+
+# Config keys which make the pooled shells stale.
+POOL_CONFIG_KEYS = (
+    'general.start_shell_program',
+    'general.start_directory',
+    'general.shell_pool_size',
+)
+# Seconds given to the pooled shells to exit on SIGHUP, before SIGKILL.
+CLEAR_TIMEOUT = 0.1
+
+
+class PooledShell(object):
+    __slots__ = ('pty', 'pid', 'key', 'watch_id', 'created')
+
+    def __init__(self, pty, pid, key):
+        self.pty = pty
+        self.pid = pid
+        self.key = key
+        self.watch_id = None
+        self.created = time.time()
+
+
+class ShellPool(object):
+    """
+    Keeps general.shell_pool_size shells started in the background, for the
+    default program and directory, so new terminals get a prompt at once.
+    The pool is refilled in idle callbacks after each use.
+    """
+
+    def __init__(self):
+        self.shells = deque()
+        self.source_id = None
+        self.hits = 0
+        self.misses = 0
+
+        TerraHandler.add_ui_event_handler(self.invalidate, *POOL_CONFIG_KEYS)
+        self.schedule_refill()
+
+    @staticmethod
+    def is_supported():
+        return hasattr(Vte, 'Pty') and hasattr(Vte.Pty, 'new_sync') and hasattr(Vte.Terminal, 'watch_child')
+
+    @staticmethod
+    def get_size():
+        if not ShellPool.is_supported():
+            return 0
+        return max(0, ConfigManager.get_conf('general', 'shell_pool_size') or 0)
+
+    @staticmethod
+    def get_default_key():
+        """
+        Return the (program, directory) pair of a terminal opened without a
+        parent terminal.
+        """
+        progname = ConfigManager.get_conf('general', 'start_shell_program')
+        start_directory = ConfigManager.get_conf('general', 'start_directory')
+        if start_directory == '$home$':
+            pwd = os.environ['HOME']
+        elif start_directory == '$pwd$':
+            pwd = os.getcwd()
+        else:
+            pwd = start_directory
+        return progname, pwd
+
+    def take(self, progname, pwd):
+        """
+        Return a pooled shell started as progname in pwd, or None.
+
+        :rtype: PooledShell
+        """
+        if not self.get_size():
+            return None
+
+        key = (progname, pwd)
+        shell = None
+        for pooled in self.shells:
+            if pooled.key == key:
+                shell = pooled
+                break
+
+        if shell is None:
+            # Only the default shell is pooled, other requests are no misses.
+            if key == self.get_default_key():
+                self.misses += 1
+            return None
+
+        self.shells.remove(shell)
+        # The terminal watches the process from now on.
+        GLib.source_remove(shell.watch_id)
+        shell.watch_id = None
+        self.hits += 1
+        self.schedule_refill()
+        return shell
+
+    def schedule_refill(self):
+        if self.source_id is None and len(self.shells) < self.get_size():
+            self.source_id = GLib.idle_add(self.refill, priority=GLib.PRIORITY_LOW)
+
+    def refill(self):
+        """
+        Start one shell per idle call, until the pool is full.
+        """
+        if len(self.shells) >= self.get_size():
+            self.source_id = None
+            return False
+
+        progname, pwd = key = self.get_default_key()
+        try:
+            pty = Vte.Pty.new_sync(Vte.PtyFlags.DEFAULT, None)
+            pid = GLib.spawn_async(
+                argv=progname.split(),
+                envp=OwnedPty.get_envp(),
+                working_directory=pwd,
+                flags=GLib.SpawnFlags.DO_NOT_REAP_CHILD | GLib.SpawnFlags.SEARCH_PATH,
+                child_setup=pty.child_setup,
+                user_data=None)[0]
+        except GLib.GError as e:
+            print('[DEBUG] Could not start a pooled shell: {}'.format(e.message))
+            self.source_id = None
+            return False
+
+        shell = PooledShell(pty, int(pid), key)
+        shell.watch_id = GLib.child_watch_add(GLib.PRIORITY_DEFAULT, shell.pid, self.on_shell_exited, shell)
+        self.shells.append(shell)
+        return True
+
+    def on_shell_exited(self, pid, status, shell):
+        # The child watch reaps the process.
+        shell.watch_id = None
+        if shell in self.shells:
+            self.shells.remove(shell)
+            self.schedule_refill()
+
+    def clear(self):
+        """
+        Stop the pooled shells. Shells which ignore SIGHUP are killed after
+        CLEAR_TIMEOUT, so terra doesn't wait on them.
+        """
+        pids = []
+        while self.shells:
+            shell = self.shells.popleft()
+            if shell.watch_id is not None:
+                GLib.source_remove(shell.watch_id)
+                shell.watch_id = None
+            try:
+                os.kill(shell.pid, signal.SIGHUP)
+            except OSError:
+                continue
+            pids.append(shell.pid)
+
+        deadline = time.time() + CLEAR_TIMEOUT
+        while pids:
+            for pid in list(pids):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        pids.remove(pid)
+                except OSError:
+                    pids.remove(pid)
+            if not pids or time.time() >= deadline:
+                break
+            time.sleep(0.005)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+
+    def invalidate(self):
+        self.clear()
+        self.schedule_refill()
+
+    def report(self):
+        requests = self.hits + self.misses
+        if not requests:
+            return
+        print('[DEBUG] Shell pool: {} hits, {} misses ({:.0%} hit rate)'.format(self.hits, self.misses, float(self.hits) / requests))
+
+    def get_stats(self):
+        return self.hits, self.misses
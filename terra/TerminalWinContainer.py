@@ -26,7 +26,15 @@ from gi.repository import Gtk
 import terra.globalhotkeys
 
 import terra.terra_utils as terra_utils
+from terra.CloseStash import CloseStash
 from terra.DbusService import DbusService
+from terra.InputGroups import InputGroups
+from terra.OutputFilters import FilterPipeline
+from terra.OutputLogger import OutputLogger
+from terra.OutputTriggers import OutputTriggers
+from terra.RestoreScheduler import RestoreScheduler
+from terra.SessionClient import SessionClient
+from terra.ShellPool import ShellPool
 from terra.interfaces.TerminalWin import TerminalWin
 from terra.handlers import t
 from terra.handlers import TerraHandler
@@ -52,6 +60,13 @@ class TerminalWinContainer:
             if not self.hotkey.bind(global_key_string, lambda w: self.show_hide()):
                 sys.exit(t("Can't bind global hotkey: Another Instance of Terra is probably running."))
 
+        self.restore_scheduler = RestoreScheduler()
+        self.shell_pool = ShellPool()
+        self.close_stash = CloseStash()
+        self.input_groups = InputGroups()
+        self.session_client = None
+        if TerraHandler.config['general']['use_session_daemon']:
+            self.session_client = SessionClient.connect(TerraHandler.config['general']['session_replay_size'])
         self.apps = []
         self.old_apps = []
         self.screen_id = 0
@@ -81,10 +96,38 @@ class TerminalWinContainer:
         for app in self.old_apps:
             app.save_conf(False)
         TerraHandler.config.save()
+        TerraHandler.session.save()
+
+    def recover_session_panes(self):
+        """
+        Open the session daemon terminals which are not in a saved tab, e.g.
+        after a crash, in tabs of the first window.
+        """
+        if self.session_client is None or not self.apps:
+            return
+        claimed = TerraHandler.session.get_daemon_ids()
+        for daemon_id in self.session_client.get_pane_ids():
+            if daemon_id not in claimed:
+                spec = {'name': t('Recovered'), 'layout': {'id': 0, 'daemon_id': daemon_id}}
+                self.apps[0].add_page(spec=spec, lazy=True)
+
+    def update_broadcast_marks(self):
+        for app in self.apps:
+            app.update_broadcast_marks()
 
     def app_quit(self):
         if TerraHandler.config['general']['remember_session']:
             self.save_conf()
+        elif self.session_client is not None:
+            # Nothing would reattach to the terminals.
+            self.session_client.kill_all()
+        self.shell_pool.report()
+        self.shell_pool.clear()
+        self.close_stash.clear()
+        OutputTriggers.report()
+        FilterPipeline.report()
+        OutputTriggers.stop()
+        OutputLogger.shutdown()
         sys.stdout.flush()
         sys.stderr.flush()
         if self.is_running:
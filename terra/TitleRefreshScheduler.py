@@ -0,0 +1,65 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+from gi.repository import GLib
+
+from terra.ConfigManager import ConfigManager
+
+
+class TitleRefreshScheduler(object):
+    """
+    Coalesces title refreshes of all the terminals of a window into a single
+    timeout, run at most 'title_refresh_rate' times per second.
+    """
+
+    def __init__(self):
+        self.dirty = set()
+        self.source_id = None
+
+    def get_interval(self):
+        rate = ConfigManager.get_conf('terminal', 'title_refresh_rate')
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            rate = 0
+        if rate <= 0:
+            rate = ConfigManager.defaults['terminal']['title_refresh_rate']
+        return int(1000 / rate)
+
+    def mark_dirty(self, terminal):
+        self.dirty.add(terminal)
+        if self.source_id is None:
+            self.source_id = GLib.timeout_add(self.get_interval(), self.flush)
+
+    def discard(self, terminal):
+        self.dirty.discard(terminal)
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, set()
+        self.source_id = None
+        for terminal in dirty:
+            terminal.refresh_title()
+        return False
+
+    def cancel(self):
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        self.dirty.clear()
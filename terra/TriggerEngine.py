@@ -0,0 +1,294 @@
+# -*- coding: utf-8; -*-
+"""
+Copyright (C) 2013 - Arnaud SOURIOUX <six.dsn@gmail.com>
+Copyright (C) 2012 - Ozcan ESEN <ozcanesen~gmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+"""
+
+
+import json
+import os
+import re
+import sys
+import time
+
+from terra.AnsiStripper import AnsiStripper
+from terra.SessionDaemon import READ_SIZE, pack, unpack
+
+ACTIONS = ('highlight', 'bell', 'notify', 'focus', 'command')
+
+# Lines longer than this are matched without waiting for their end.
+MAX_LINE_SIZE = 4096
+# Python 2 regexes have at most 100 groups, bigger sets use several regexes.
+MAX_GROUPS = 99
+# Backreferences and conditionals, which refer to groups by their number. May
+# also find an escaped backslash, such triggers are then only scanned alone.
+GROUP_REFERENCE = re.compile(br'\\[1-9]|\(\?P=|\(\?\(')
+# Each trigger is timed alone on one scanned chunk out of PROFILE_INTERVAL.
+PROFILE_INTERVAL = 64
+
+# Terra to the trigger worker.
+MSG_RULES = 1
+MSG_OUTPUT = 2
+MSG_CLOSE = 3
+MSG_STATS = 4
+
+# Trigger worker to terra.
+MSG_HITS = 10
+MSG_STATS_REPLY = 11
+
+
+class Trigger(object):
+    __slots__ = ('name', 'pattern', 'action', 'command', 'ignore_case', 'cooldown',
+                 'regex', 'hit_count', 'match_time')
+
+    def __init__(self, name, pattern, action='highlight', command=None, ignore_case=False, cooldown=1.0):
+        self.name = name
+        self.pattern = pattern
+        self.action = action
+        self.command = command
+        self.ignore_case = ignore_case
+        self.cooldown = cooldown
+        self.regex = None
+        self.hit_count = 0
+        # Estimated, see TriggerSet.profile().
+        self.match_time = 0.0
+
+    def compile(self):
+        if self.action not in ACTIONS:
+            raise ValueError('Unknown action: {}'.format(self.action))
+        pattern = self.pattern
+        if isinstance(pattern, unicode):
+            pattern = pattern.encode('utf-8')
+        self.regex = re.compile(pattern, self.get_flags())
+
+    def get_flags(self):
+        return re.MULTILINE | (re.IGNORECASE if self.ignore_case else 0)
+
+    def can_combine(self):
+        """
+        Whether the pattern keeps its meaning in an alternation with others:
+        group names and numbers would clash, and inline flags would apply to
+        the other triggers too.
+        """
+        return (not self.regex.groupindex and self.regex.flags == self.get_flags()
+                and GROUP_REFERENCE.search(self.regex.pattern) is None)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'pattern': self.pattern,
+            'action': self.action,
+            'command': self.command,
+            'ignore_case': self.ignore_case,
+            'cooldown': self.cooldown,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['pattern'], data.get('action', 'highlight'), data.get('command'),
+                   data.get('ignore_case', False), data.get('cooldown', 1.0))
+
+
+class TriggerSet(object):
+    """
+    Compiled triggers. The patterns are combined in one alternation, per set
+    of flags and 99 groups, so a chunk of output is scanned once whatever
+    the number of triggers. The scanned alternation has no extra groups, which
+    lets the regex engine skip to the possible first characters; a second one
+    with a group per trigger tells which one matched. Triggers which can't be
+    combined, see Trigger.can_combine(), are scanned alone.
+    """
+
+    def __init__(self, triggers):
+        """
+        :param triggers: Compiled Trigger instances.
+        """
+        self.triggers = triggers
+        self.regexes = []
+        self.scan_count = 0
+        self.scan_time = 0.0
+        self.scanned_bytes = 0
+
+        groups = {}
+        for index, trigger in enumerate(triggers):
+            if trigger.can_combine():
+                groups.setdefault(trigger.get_flags(), []).append(index)
+            else:
+                self.regexes.append((trigger.regex, None, index))
+        for flags, indexes in sorted(groups.iteritems()):
+            batch = []
+            group_count = 0
+            for index in indexes:
+                trigger_groups = self.triggers[index].regex.groups + 1
+                if batch and group_count + trigger_groups > MAX_GROUPS:
+                    self.combine(batch, flags)
+                    batch = []
+                    group_count = 0
+                batch.append(index)
+                group_count += trigger_groups
+            self.combine(batch, flags)
+
+    def combine(self, indexes, flags):
+        patterns = [self.triggers[index].regex.pattern for index in indexes]
+        try:
+            scan_regex = re.compile(b'|'.join(patterns), flags)
+            match_regex = re.compile(b'|'.join(b'(?P<t%d>%s)' % (index, pattern) for index, pattern in zip(indexes, patterns)), flags)
+        except re.error as e:
+            print('[DEBUG] Could not combine triggers, scanning them alone: {}'.format(e))
+            self.regexes.extend((self.triggers[index].regex, None, index) for index in indexes)
+            return
+        self.regexes.append((scan_regex, match_regex, None))
+
+    def __len__(self):
+        return len(self.triggers)
+
+    def scan(self, data):
+        """
+        :return: The (trigger index, matched text) of each match.
+        :rtype: list
+        """
+        start = time.time()
+        hits = []
+        for scan_regex, match_regex, index in self.regexes:
+            for match in scan_regex.finditer(data):
+                if match_regex is not None:
+                    match = match_regex.match(data, match.start())
+                    index = int(match.lastgroup[1:])
+                self.triggers[index].hit_count += 1
+                hits.append((index, match.group()))
+        self.scan_time += time.time() - start
+        self.scan_count += 1
+        self.scanned_bytes += len(data)
+        if self.scan_count % PROFILE_INTERVAL == 0:
+            self.profile(data)
+        return hits
+
+    def profile(self, data):
+        """
+        The combined regex can't tell the cost of each trigger: time them
+        alone on a sample of the scanned chunks.
+        """
+        for trigger in self.triggers:
+            start = time.time()
+            for match in trigger.regex.finditer(data):
+                pass
+            trigger.match_time += (time.time() - start) * PROFILE_INTERVAL
+
+    def get_stats(self):
+        return {
+            'scan_count': self.scan_count,
+            'scan_time': self.scan_time,
+            'scanned_bytes': self.scanned_bytes,
+            'triggers': [{
+                'name': trigger.name,
+                'hit_count': trigger.hit_count,
+                'match_time': trigger.match_time,
+            } for trigger in self.triggers],
+        }
+
+
+def compile_triggers(definitions):
+    """
+    Compile trigger definitions, skipping the invalid ones.
+
+    :type definitions: list
+    :rtype: list
+    """
+    triggers = []
+    for trigger in definitions:
+        try:
+            trigger.compile()
+        except (re.error, ValueError) as e:
+            print('[DEBUG] Invalid trigger {}: {}'.format(trigger.name, e))
+            continue
+        triggers.append(trigger)
+    return triggers
+
+
+class TriggerScanner(object):
+    """
+    Matches the output of one terminal against a TriggerSet. Only the new
+    output is scanned, once its lines are complete, without the escape
+    sequences.
+    """
+
+    def __init__(self, trigger_set):
+        self.trigger_set = trigger_set
+        self.stripper = AnsiStripper()
+        self.pending = b''
+
+    def feed(self, data):
+        data = self.stripper.strip(data)
+        end = data.rfind(b'\n')
+        if end == -1:
+            self.pending += data
+            if len(self.pending) < MAX_LINE_SIZE:
+                return []
+            data, self.pending = self.pending, b''
+        else:
+            data, pending = self.pending + data[:end + 1], data[end + 1:]
+            self.pending = pending[-MAX_LINE_SIZE:]
+        return self.trigger_set.scan(data)
+
+
+def serve(input_fd, output_fd):
+    """
+    Trigger worker loop: match the output frames received from terra and
+    reply with the hits, for rule sets too heavy for the main loop.
+    """
+    trigger_set = TriggerSet([])
+    scanners = {}
+    inbuf = bytearray()
+    while True:
+        data = os.read(input_fd, READ_SIZE)
+        if not data:
+            return
+        inbuf += data
+        for msg_type, pane_id, payload in unpack(inbuf):
+            if msg_type == MSG_RULES:
+                trigger_set = TriggerSet(compile_triggers([Trigger.from_dict(rule) for rule in json.loads(payload)]))
+                scanners.clear()
+            elif msg_type == MSG_OUTPUT:
+                scanner = scanners.get(pane_id)
+                if scanner is None:
+                    scanner = scanners[pane_id] = TriggerScanner(trigger_set)
+                hits = [(index, text.decode('utf-8', 'replace')) for index, text in scanner.feed(payload)]
+                if hits:
+                    write_all(output_fd, pack(MSG_HITS, pane_id, json.dumps(hits)))
+            elif msg_type == MSG_CLOSE:
+                scanners.pop(pane_id, None)
+            elif msg_type == MSG_STATS:
+                write_all(output_fd, pack(MSG_STATS_REPLY, 0, json.dumps(trigger_set.get_stats())))
+
+
+def write_all(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def main():
+    # Keep the replies apart from the debug output.
+    output_fd = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        serve(sys.stdin.fileno(), output_fd)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
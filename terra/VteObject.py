@@ -18,51 +18,111 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 """
 
+import functools
 import os
 import re
 import threading
+import time
 
 from gi.repository import Gtk, Vte, GLib, Gdk, GdkX11, GObject
 
 import terra.terra_utils as terra_utils
 from terra.interfaces.Preferences import Preferences
+from terra.CastPlayer import CastPlayer
+from terra.CastRecorder import CastRecorder
 from terra.ConfigManager import ConfigManager
 from terra.handlers import TerraHandler
 from terra.handlers import t
 from terra.interfaces.InputDialog import InputDialog
 from terra.interfaces.WinDialog import WinDialog
+from terra.FloodDetector import FloodDetector
+from terra.LinkMatchers import LinkMatchers
+from terra.OutputFilters import create_pipeline
+from terra.OutputLogger import OutputLogger
+from terra.OutputTriggers import OutputTriggers
+from terra.OwnedPty import OwnedPty
+from terra.PaneRectIndex import MOVE_UP
+from terra.RespawnPolicy import RespawnPolicy, RESPAWN, CLOSE, HOLD, format_exit_status
 from terra.VteObjectContainer import VteObjectContainer
 
-# this regex strings taken from pantheon-terminal
-# thanks munchor and voldyman
-USERCHARS = "-[:alnum:]"
-USERCHARS_CLASS = "[" + USERCHARS + "]"
-PASSCHARS_CLASS = "[-[:alnum:]\\Q,?;.:/!%$^*&~\"#'\\E]"
-HOSTCHARS_CLASS = "[-[:alnum:]]"
-HOST = HOSTCHARS_CLASS + "+(\\." + HOSTCHARS_CLASS + "+)*"
-PORT = "(?:\\:[[:digit:]]{1,5})?"
-PATHCHARS_CLASS = "[-[:alnum:]\\Q_$.+!*,;@&=?/~#%\\E]"
-PATHTERM_CLASS = "[^\\Q]'.}>) \t\r\n,\"\\E]"
-SCHEME = """(?:news:|telnet:|nntp:|file:\/|https?:|ftps?:|sftp:|webcal:|irc:|sftp:|ldaps?:|nfs:|smb:|rsync:|ssh:|rlogin:|telnet:|git:|git\+ssh:|bzr:|bzr\+ssh:|svn:|svn\+ssh:|hg:|mailto:|magnet:)"""
-USERPASS = USERCHARS_CLASS + "+(?:" + PASSCHARS_CLASS + "+)?"
-URLPATH =  "(?:(/" + PATHCHARS_CLASS + "+(?:[(]" + PATHCHARS_CLASS + "*[)])*" + PATHCHARS_CLASS + "*)*" + PATHTERM_CLASS + ")?"
-
-regex_strings =[SCHEME + "//(?:" + USERPASS + "\\@)?" + HOST + PORT + URLPATH,
-    "(?:www|ftp)" + HOSTCHARS_CLASS + "*\\." + HOST + PORT + URLPATH,
-    "(?:callto:|h323:|sip:)" + USERCHARS_CLASS + "[" + USERCHARS + ".]*(?:" + PORT + "/[a-z0-9]+)?\\@" + HOST,
-    "(?:mailto:)?" + USERCHARS_CLASS + "[" + USERCHARS+ ".]*\\@" + HOSTCHARS_CLASS + "+\\." + HOST,
-    "(?:news:|man:|info:)[[:alnum:]\\Q^_{|}~!\"#$%&'()*+,./;:=?`\\E]+"]
+# Milliseconds before the output held back by filters is shown anyway.
+FILTER_FLUSH_DELAY = 50
+# Milliseconds between two redraws of a flooding terminal.
+FLOOD_FEED_INTERVAL = 50
+
+# Config keys which require update_ui() to run.
+UI_CONFIG_KEYS = (
+    'terminal.scroll*',
+    'terminal.background_*',
+    'terminal.color_*',
+    'terminal.use_system_font',
+    'terminal.font_name',
+    'general.select_by_word',
+)
 
 class VteObject(Gtk.VBox):
+    # Number of widget setter calls made by update_ui(), for all terminals.
+    total_setter_calls = 0
+
+    # Number of processes spawned and their cumulated spawn latency.
+    total_spawns = 0
+    total_spawn_time = 0.0
+
     def __init__(self):
         super(Gtk.VBox, self).__init__()
         # Allow UI to be updated by other events.
-        TerraHandler.add_ui_event_handler(self.update_ui)
+        TerraHandler.add_ui_event_handler(self.update_ui, *UI_CONFIG_KEYS)
+        TerraHandler.add_ui_event_handler(self.update_scrollbar, 'terminal.show_scrollbar')
+        self.matcher_tags = {}
 
         self.parent = 0
+        self.container = None
         self.pwd = None
         self.pid = (0, 0)
         self.progname = ''
+        # 'starting', 'running' or 'failed'.
+        self.spawn_state = None
+        self.spawn_start_time = 0
+        # Seconds between the spawn request and the process start.
+        self.spawn_latency = None
+        self.spawn_source = None
+        # Respawn policy of this terminal, None for general.respawn_policy.
+        self.respawn_policy = None
+        self.respawn_failures = 0
+        self.respawn_source = None
+        # Pane of the session daemon running the process, if any.
+        self.daemon_id = None
+        self.pty_size = None
+        # Closed, but kept running in the close stash.
+        self.stashed = False
+        # PTY read by terra, when the output is tapped.
+        self.owned_pty = None
+        # Callables receiving the output before the widget.
+        self.output_taps = []
+        self.logger = None
+        self.recorder = None
+        self.player = None
+        self.triggers = None
+        # FilterPipeline, None for the direct libvte path.
+        self.filters = None
+        self.filter_flush_source = None
+        # Flood mode, see FloodDetector.
+        self.flood = None
+        threshold = ConfigManager.get_conf('general', 'flood_threshold')
+        if threshold:
+            self.flood = FloodDetector(threshold * 1024 * 1024)
+        self.flooding = False
+        self.flood_source = None
+        # Output batched while flooding.
+        self.flood_chunks = []
+        self.last_cursor_row = 0
+        # InputGroup of the terminal, and the callable writing to its program.
+        self.input_group = None
+        self.input_writer = None
+        self.title_key = None
+        # Settings pushed to the widget by update_ui(), keyed by setter name.
+        self.applied_settings = {}
+        self.setter_calls = 0
 
         self.title = Gtk.Label(terra_utils.get_running_cmd(self))
         self.title.set_line_wrap(True)
@@ -75,10 +135,10 @@ class VteObject(Gtk.VBox):
         self.hbox.pack_start(self.vscroll, False, False, 0)
         self.pack_start(self.hbox, True, True, 0)
 
-        for regex_string in regex_strings:
-            regex_obj = GLib.Regex.new(regex_string, 0, 0)
-            tag = self.vte.match_add_gregex(regex_obj, 0)
-            self.vte.match_set_cursor_type(tag, Gdk.CursorType.HAND2)
+        self.update_matchers()
+        TerraHandler.add_ui_event_handler(self.update_matchers, 'matchers.*')
+        TerraHandler.add_ui_event_handler(self.update_triggers, 'triggers.*')
+        TerraHandler.add_ui_event_handler(self.update_filters, 'filters.*')
 
         self.vte.connect('scroll-event', self.scroll_event)
         self.vte.connect('child-exited', self.on_child_exited)
@@ -86,12 +146,52 @@ class VteObject(Gtk.VBox):
         self.vte.connect('increase-font-size', self.change_font_size, 0.1)
         self.vte.connect('decrease-font-size', self.change_font_size, -0.1)
         self.vte.connect('contents-changed', self.update_content)
+        self.connect('size-allocate', self.on_size_allocate)
+        self.vte.connect('commit', self.on_commit)
+        self.vte.connect_after('size-allocate', self.on_vte_size_allocate)
 
-        self.prefs = Preferences()
         self.update_ui()
+        self.show_all()
+
+    def update_matchers(self):
+        self.matcher_tags = LinkMatchers.attach(self.vte)
+
+    def on_size_allocate(self, widget, allocation):
+        container = self.container
+        if container is None or self.id not in container.layout:
+            return
+        # Gtk.Paned children share the window of the tab, translate to it.
+        coords = self.translate_coordinates(container, 0, 0)
+        if not coords or not coords[0]:
+            return
+        container.pane_rects.update(self.id, coords[1], coords[2], allocation.width, allocation.height)
 
     def update_content(self, widget):
-        self.update_ui()
+        if self.flood is not None and self.owned_pty is None and self.daemon_id is None:
+            # Libvte does not tell how much it read, estimate it from the
+            # lines it wrote. In place redraws, e.g. of a progress bar or a
+            # full screen program, move no lines and go unnoticed: only
+            # terminals read through an OwnedPty or the daemon get exact rates.
+            row = self.vte.get_cursor_position()[1]
+            if self.flood.add(max(0, row - self.last_cursor_row) * self.vte.get_column_count()):
+                self.set_flooding(self.flood.flooding)
+            self.last_cursor_row = row
+        if self.flooding:
+            return
+        window = self.get_toplevel()
+        if hasattr(window, 'title_scheduler'):
+            window.title_scheduler.mark_dirty(self)
+
+    def refresh_title(self):
+        if self.pid == (0, 0):
+            return
+        # Skip the title lookup if neither the running job, the directory nor
+        # the second of its elapsed time changed.
+        title_key = (terra_utils.get_foreground_pid(self), terra_utils.get_pwd(self.pid[1]), int(time.time()))
+        if title_key == self.title_key:
+            return
+        self.title_key = title_key
+        self.title.set_label(terra_utils.get_running_cmd(self))
 
     def set_pwd(self, parent=None, pwd=None):
         if parent:
@@ -106,9 +206,12 @@ class VteObject(Gtk.VBox):
                 pid = None
                 if parent:
                     pid = parent.pid[1]
-                elif self.get_container():
-                    pid = terra_utils.get_paned_parent(self.get_container().vte_list, self.parent).pid[1]
+                elif self.container and self.container.layout.get_pane(self.parent):
+                    pid = self.container.layout.get_pane(self.parent).pid[1]
                 run_dir = terra_utils.get_pwd(pid)
+                if not run_dir and parent:
+                    # The parent may still be starting.
+                    run_dir = parent.pwd
                 if not run_dir:
                     run_dir = os.getcwd()
         else:
@@ -116,27 +219,331 @@ class VteObject(Gtk.VBox):
         self.pwd = run_dir
 
     def fork_process(self, progname):
+        """
+        Start progname in the terminal without blocking the main loop. The
+        terminal shows a starting title until on_spawned() is called.
+        """
         if not self.pwd:
             self.set_pwd()
         if not progname:
             progname = ConfigManager.get_conf('general', 'start_shell_program')
         self.progname = progname
 
+        # Restarting with a program still running, e.g. on a shell change.
+        if self.owned_pty is not None:
+            self.owned_pty.close(hangup=True)
+            self.owned_pty = None
+
+        self.pid = (0, 0)
+        self.title_key = None
+        self.spawn_state = 'starting'
+        self.spawn_start_time = time.time()
+        self.title.set_label(t('Starting {}...').format(self.progname))
+
+        self.update_output_taps()
+        if self.filters is None:
+            self.filters = create_pipeline()
+
+        client = self.get_session_client()
+        if client is not None and self.daemon_id is not None:
+            # The running daemon pane is replaced, not left behind.
+            client.kill(self.daemon_id)
+            self.daemon_id = None
+        if client is not None:
+            daemon_id = None
+            if self.container is not None:
+                daemon_id = self.container.attach_ids.pop(self.id, None)
+            if daemon_id is not None:
+                client.attach(self, daemon_id)
+            else:
+                client.spawn(self, self.progname.split(), self.pwd, self.vte.get_row_count(), self.vte.get_column_count())
+            return
+
+        if (self.output_taps or self.filters is not None) and OwnedPty.is_supported():
+            self.spawn_owned_pty()
+            return
+
+        shell = None
+        if TerraHandler.Wins is not None:
+            shell = TerraHandler.Wins.shell_pool.take(self.progname, self.pwd)
+        if shell is not None:
+            self.vte.set_pty(shell.pty)
+            self.vte.watch_child(shell.pid)
+            self.on_spawned(self.vte, shell.pid, None)
+            return
+
+        if hasattr(self.vte, 'spawn_async'):
+            self.vte.spawn_async(
+                Vte.PtyFlags.DEFAULT,
+                self.pwd,
+                self.progname.split(),
+                [],
+                GLib.SpawnFlags.DO_NOT_REAP_CHILD,
+                None,
+                None,
+                -1,
+                None,
+                self.on_spawned,
+                None)
+        elif hasattr(self.vte, 'fork_command_full') or hasattr(self.vte, 'spawn_sync'):
+            # Older libVte only spawns synchronously, let the terminal be drawn first.
+            self.spawn_source = GLib.idle_add(self.spawn_sync)
+        else:
+            raise Exception('no symbols in libVte to fork program')
+
+    def spawn_owned_pty(self):
+        # The exit is bound to its PTY, a replaced one may still report it.
+        pty = OwnedPty(self.on_output, lambda status: self.on_owned_pty_exited(pty, status))
+        self.owned_pty = pty
+        size = (self.vte.get_row_count(), self.vte.get_column_count())
+        try:
+            pid = pty.spawn(self.progname.split(), self.pwd, *size)
+        except GLib.GError as e:
+            self.owned_pty = None
+            self.on_spawned(self.vte, -1, e)
+            return
+        self.pty_size = size
+        self.on_spawned(self.vte, pid, None)
+
+    def on_owned_pty_exited(self, pty, status):
+        if pty is not self.owned_pty:
+            return
+        self.owned_pty = None
+        self.on_child_exited(self.vte, status)
+
+    def update_output_taps(self):
+        if self.logger is None and OutputLogger.is_enabled():
+            self.logger = OutputLogger()
+        if self.recorder is None and CastRecorder.is_enabled():
+            self.start_recording()
+        if self.triggers is None:
+            self.triggers = OutputTriggers.create(self)
+
+        taps = []
+        if self.logger is not None:
+            taps.append(self.logger.write)
+        if self.recorder is not None:
+            taps.append(self.recorder.write)
+        if self.triggers is not None and not self.flooding:
+            taps.append(self.triggers.write)
+        self.output_taps = taps
+
+    def set_flooding(self, flooding):
+        """
+        Flooding terminals skip title refreshes, link matching and triggers,
+        and are redrawn at most every FLOOD_FEED_INTERVAL, so the other
+        terminals stay responsive.
+        """
+        if flooding == self.flooding:
+            return
+        self.flooding = flooding
+        self.update_output_taps()
+        if flooding:
+            print('[DEBUG] Terminal {} is flooding: {:.1f} MB/s'.format(self.id, self.flood.rate / 1048576))
+            self.vte.match_remove_all()
+            self.matcher_tags = {}
+            if self.owned_pty is not None:
+                self.owned_pty.set_priority(GLib.PRIORITY_LOW)
+            self.flood_source = GLib.timeout_add(FLOOD_FEED_INTERVAL, self.on_flood_tick)
+            self.show_flood_rate()
+        else:
+            if self.flood_source is not None:
+                GLib.source_remove(self.flood_source)
+                self.flood_source = None
+            self.feed_flood_chunks()
+            self.update_matchers()
+            if self.owned_pty is not None:
+                self.owned_pty.set_priority(GLib.PRIORITY_DEFAULT)
+            self.title_key = None
+            self.refresh_title()
+
+    def on_flood_tick(self):
+        self.feed_flood_chunks()
+        if self.flood.tick():
+            # The source is removed by returning False.
+            self.flood_source = None
+            self.set_flooding(False)
+            return False
+        self.show_flood_rate()
+        return True
+
+    def show_flood_rate(self):
+        self.title.set_label(t('flooding: {:.1f} MB/s').format(self.flood.rate / 1048576))
+
+    def feed_flood_chunks(self):
+        if self.flood_chunks:
+            data = b''.join(self.flood_chunks)
+            self.flood_chunks = []
+            self.feed_widget(data)
+
+    def update_filters(self):
+        # Terminals with a libvte PTY get the new filters when respawned.
+        if not self.can_tap_output():
+            return
+        self.close_filters()
+        self.filters = create_pipeline()
+
+    def close_filters(self):
+        if self.filter_flush_source is not None:
+            GLib.source_remove(self.filter_flush_source)
+            self.filter_flush_source = None
+        if self.filters is not None:
+            self.feed_output(self.filters.flush())
+            self.filters.close()
+            self.filters = None
+
+    def flush_filters(self):
+        self.filter_flush_source = None
+        if self.filters is not None:
+            self.feed_output(self.filters.flush())
+        return False
+
+    def update_triggers(self):
+        # Terminals with a libvte PTY get the new triggers when respawned.
+        if self.triggers is not None:
+            self.triggers.close()
+            self.triggers = None
+        self.update_output_taps()
+
+    def on_trigger(self, trigger, text):
+        window = self.get_toplevel()
+        if trigger.action == 'highlight':
+            if hasattr(window, 'highlight_terminal'):
+                window.highlight_terminal(self)
+        elif trigger.action == 'bell':
+            Gdk.beep()
+        elif trigger.action == 'notify':
+            self.run_trigger_command(['notify-send', '--', trigger.name, text])
+        elif trigger.action == 'focus':
+            if hasattr(window, 'focus_terminal'):
+                window.focus_terminal(self)
+        elif trigger.action == 'command' and trigger.command:
+            env = dict(os.environ, TERRA_TRIGGER=trigger.name, TERRA_MATCH=text)
+            self.run_trigger_command(['/bin/sh', '-c', trigger.command], env)
+
+    @staticmethod
+    def run_trigger_command(argv, env=None):
+        envp = None
+        if env is not None:
+            envp = ['{}={}'.format(key, value) for key, value in env.iteritems()]
+        try:
+            # GLib reaps the child.
+            GLib.spawn_async(argv, envp=envp, flags=GLib.SpawnFlags.SEARCH_PATH)
+        except GLib.GError as e:
+            print('[DEBUG] Could not run {}: {}'.format(argv[0], e))
+
+    def can_tap_output(self):
+        return self.owned_pty is not None or self.daemon_id is not None
+
+    def toggle_logging(self, widget):
+        if self.logger is None:
+            self.logger = OutputLogger()
+        else:
+            self.logger.close()
+            self.logger = None
+        self.update_output_taps()
+
+    def start_recording(self):
+        self.recorder = CastRecorder(self.vte.get_row_count(), self.vte.get_column_count(), command=self.progname)
+
+    def toggle_recording(self, widget):
+        if self.recorder is None:
+            self.start_recording()
+            print('[DEBUG] Recording to {}'.format(self.recorder.path))
+        else:
+            self.recorder.close()
+            self.recorder = None
+        self.update_output_taps()
+
+    def replay(self, path, speed=1.0):
+        """
+        Feed an asciicast recording to the terminal, see CastPlayer.
+        """
+        if self.player is not None:
+            self.player.stop()
+        self.player = CastPlayer(self, path, speed, on_done=lambda stats: setattr(self, 'player', None))
+        self.player.start()
+
+    def choose_replay(self, widget):
+        dialog = Gtk.FileChooserDialog(
+            t('Replay Recording'), self.get_toplevel(), Gtk.FileChooserAction.OPEN,
+            (
+                Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                Gtk.STOCK_OPEN, Gtk.ResponseType.OK,
+            )
+        )
+        dialog.set_current_folder(os.path.expanduser(ConfigManager.get_conf('logging', 'directory')))
+        if dialog.run() == Gtk.ResponseType.OK:
+            try:
+                self.replay(dialog.get_filename())
+            except (IOError, ValueError) as e:
+                print('[DEBUG] Could not replay {}: {}'.format(dialog.get_filename(), e))
+        dialog.destroy()
+
+    def spawn_sync(self):
+        self.spawn_source = None
         if hasattr(self.vte, 'fork_command_full'):
             fork = self.vte.fork_command_full
-        elif hasattr(self.vte, 'spawn_sync'):
+        else:
             fork = self.vte.spawn_sync
+
+        try:
+            ok, pid = fork(
+                Vte.PtyFlags.DEFAULT,
+                self.pwd,
+                self.progname.split(),
+                [],
+                GLib.SpawnFlags.DO_NOT_REAP_CHILD,
+                None,
+                None)
+        except GLib.GError as e:
+            self.on_spawned(self.vte, -1, e)
         else:
-            raise Exception('no symbols in libVte to fork program')
+            self.on_spawned(self.vte, pid if ok else -1, None)
+        return False
+
+    def on_spawned(self, terminal, pid, error, user_data=None):
+        self.spawn_latency = time.time() - self.spawn_start_time
+        VteObject.total_spawns += 1
+        VteObject.total_spawn_time += self.spawn_latency
+
+        if error is not None or pid is None or pid <= 0:
+            self.spawn_state = 'failed'
+            message = error.message if error is not None else t('unknown error')
+            print('[DEBUG] Could not start {} in {}: {}'.format(self.progname, self.pwd, message))
+            self.title.set_label(t('Could not start {}: {}').format(self.progname, message))
+            return
 
-        self.pid = fork(
-            Vte.PtyFlags.DEFAULT,
-            self.pwd,
-            self.progname.split(),
-            [],
-            GLib.SpawnFlags.DO_NOT_REAP_CHILD,
-            None,
-            None)
+        self.spawn_state = 'running'
+        self.pid = (True, pid)
+        self.input_writer = self.get_input_writer()
+        self.refresh_title()
+
+    def get_input_writer(self):
+        if self.owned_pty is not None:
+            return self.owned_pty.write
+        if self.daemon_id is not None:
+            client = self.get_session_client()
+            if client is not None:
+                return functools.partial(client.send_input, self.daemon_id)
+        return self.feed_child
+
+    def feed_child(self, data):
+        try:
+            self.vte.feed_child(data, len(data))
+        except TypeError:
+            # Newer libVte computes the length.
+            self.vte.feed_child(data)
+
+    def set_input_group(self, widget, name):
+        if not widget.get_active():
+            return
+        groups = TerraHandler.Wins.input_groups
+        if name is None:
+            groups.leave(self)
+        else:
+            groups.join(self, name)
+        TerraHandler.Wins.update_broadcast_marks()
 
     def scroll_event(self, widget, event):
         if (Gdk.ModifierType.CONTROL_MASK & event.state) == Gdk.ModifierType.CONTROL_MASK:
@@ -160,61 +567,212 @@ class VteObject(Gtk.VBox):
 
         current_font.set_size(new_size)
         self.vte.set_font(current_font)
-
-    def on_child_exited(self, event, osef):
-        self.fork_process(ConfigManager.get_conf('general', 'start_shell_program'))
-
-    def update_ui(self):
-        if ConfigManager.get_conf('terminal', 'show_scrollbar'):
-            self.vscroll.set_no_show_all(False)
+        # Keep the cache in line with the widget, so the configured font is
+        # applied again on the next settings update.
+        self.applied_settings['set_font_from_string'] = current_font.to_string()
+
+    @staticmethod
+    def get_session_client():
+        if TerraHandler.Wins is None:
+            return None
+        client = TerraHandler.Wins.session_client
+        if client is None or not client.connected:
+            return None
+        return client
+
+    def on_daemon_attached(self, daemon_id, pid):
+        self.daemon_id = daemon_id
+        self.pty_size = None
+        self.on_spawned(self.vte, pid, None)
+        self.update_pty_size()
+
+    def on_daemon_exited(self, status):
+        attaching = self.daemon_id is None and self.spawn_state == 'starting'
+        self.daemon_id = None
+        if attaching:
+            # The process ended while terra was not running, start a new one.
+            self.fork_process(self.progname)
         else:
-            self.vscroll.set_no_show_all(True)
-            self.vscroll.hide()
+            self.on_child_exited(self.vte, status)
+
+    def on_output(self, data):
+        if self.flood is not None and self.flood.add(len(data)):
+            self.set_flooding(self.flood.flooding)
+        if self.filters is not None:
+            data = self.filters.feed(data)
+            if self.filter_flush_source is None and self.filters.has_pending():
+                self.filter_flush_source = GLib.timeout_add(FILTER_FLUSH_DELAY, self.flush_filters)
+        self.feed_output(data)
+
+    def feed_output(self, data):
+        """
+        Pass filtered output to the taps, then to the widget.
+        """
+        if not data:
+            return
+        for tap in self.output_taps:
+            tap(data)
+        if self.flooding:
+            self.flood_chunks.append(data)
+        else:
+            self.feed_widget(data)
 
-        if ConfigManager.get_conf('terminal', 'scrollback_unlimited'):
-            self.vte.set_scrollback_lines(-1)
+    def feed_widget(self, data):
+        try:
+            self.vte.feed(data)
+        except TypeError:
+            # Older libVte wants the length too.
+            self.vte.feed(data, len(data))
+
+    def on_commit(self, widget, text, size):
+        if self.daemon_id is None and self.owned_pty is None and self.input_group is None:
+            # Libvte writes to its own PTY.
+            return
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        if self.owned_pty is not None:
+            self.owned_pty.write(text)
+        elif self.daemon_id is not None:
+            client = self.get_session_client()
+            if client is not None:
+                client.send_input(self.daemon_id, text)
+        if self.input_group is not None:
+            TerraHandler.Wins.input_groups.broadcast(self, text)
+
+    def on_vte_size_allocate(self, widget, allocation):
+        self.update_pty_size()
+        if self.recorder is not None:
+            self.recorder.resize(self.vte.get_row_count(), self.vte.get_column_count())
+
+    def update_pty_size(self):
+        client = self.get_session_client()
+        if self.owned_pty is None and (self.daemon_id is None or client is None):
+            return
+        size = (self.vte.get_row_count(), self.vte.get_column_count())
+        if size == self.pty_size:
+            return
+        self.pty_size = size
+        if self.owned_pty is not None:
+            self.owned_pty.resize(*size)
         else:
-            self.vte.set_scrollback_lines(int(ConfigManager.get_conf('terminal', 'scrollback_lines')))
+            client.resize(self.daemon_id, *size)
 
-        self.vte.set_scroll_on_output(ConfigManager.get_conf('terminal', 'scroll_on_output'))
+    def on_child_exited(self, widget, status=None):
+        self.pid = (0, 0)
+        self.spawn_state = 'exited'
+        self.input_writer = None
+        self.set_flooding(False)
+        if self.stashed:
+            # Nothing to respawn or close, show the status if it is restored.
+            self.title.set_label('{} {}'.format(self.progname, format_exit_status(status)))
+            return
+        action, delay = RespawnPolicy.decide(self)
+
+        if action == CLOSE:
+            GLib.idle_add(self.close_exited)
+        elif action == HOLD:
+            self.title.set_label('{} {}'.format(self.progname, format_exit_status(status)))
+        elif delay:
+            self.title.set_label(t('{} {}, restarting in {:.1f}s').format(self.progname, format_exit_status(status), delay))
+            self.respawn_source = GLib.timeout_add(int(delay * 1000), self.respawn)
+        else:
+            self.respawn()
 
-        self.vte.set_scroll_on_keystroke(ConfigManager.get_conf('terminal', 'scroll_on_keystroke'))
+    def close_exited(self):
+        # close_node() returns the result of close_page(), which would keep
+        # the idle callback running.
+        self.close_node(None)
+        return False
 
-        if hasattr(self.vte, 'set_background_saturation'):
-            self.vte.set_background_saturation(ConfigManager.get_conf('terminal', 'background_transparency') / 100.0)
-        if hasattr(self.vte, 'set_background_transparent'):
-            self.vte.set_background_transparent(ConfigManager.use_fake_transparency)
-        if hasattr(self.vte, 'set_background_image_file'):
-            self.vte.set_background_image_file(
-                ConfigManager.get_conf('terminal', 'background_image'))
+    def respawn(self):
+        self.respawn_source = None
+        self.fork_process(ConfigManager.get_conf('general', 'start_shell_program'))
+        return False
+
+    def set_respawn_policy(self, widget, policy):
+        if widget.get_active():
+            self.respawn_policy = policy
+
+    def apply_setting(self, setter, value, apply_func=None):
+        """
+        Push a setting to the widget only if it differs from the value applied
+        last time. Returns True if the widget setter was called.
+        """
+        if setter in self.applied_settings and self.applied_settings[setter] == value:
+            return False
+        self.applied_settings[setter] = value
+        self.setter_calls += 1
+        VteObject.total_setter_calls += 1
+        if apply_func:
+            apply_func()
+        else:
+            getattr(self.vte, setter)(value)
+        return True
 
-        transparency_value = int(ConfigManager.get_conf('terminal', 'background_transparency'))
-        self.vte.set_opacity((100 - transparency_value) / 100.0 * 65535)
+    def update_scrollbar(self):
+        self.apply_setting('show_scrollbar', ConfigManager.get_snapshot().terminal.show_scrollbar, self.apply_scrollbar)
 
-        if hasattr(self.vte, 'set_word_chars'):
-            self.vte.set_word_chars(ConfigManager.get_conf('general', 'select_by_word'))
+    def apply_scrollbar(self):
+        if self.applied_settings['show_scrollbar']:
+            self.vscroll.set_no_show_all(False)
+            self.vscroll.show()
+        else:
+            self.vscroll.set_no_show_all(True)
+            self.vscroll.hide()
 
+    def apply_colors(self):
+        color_text, color_background, transparency_value = self.applied_settings['set_colors']
         try:
             self.vte.set_colors(
-                Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_text')),
-                Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_background')),
+                Gdk.color_parse(color_text),
+                Gdk.color_parse(color_background),
                 [])
         except:
             alpha = (100 - transparency_value)/100.0
-            bg = Gdk.RGBA.from_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_background')))
+            bg = Gdk.RGBA.from_color(Gdk.color_parse(color_background))
             m = re.match(r'rgb\((\d+),(\d+),(\d+)\)', Gdk.RGBA.to_string(bg))
             Gdk.RGBA.parse(bg, 'rgba(' + m.group(1) + ',' + m.group(2) + ',' + m.group(3) + ',' + str(alpha) + ')')
             self.vte.set_colors(
-                Gdk.RGBA.from_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_text'))),
+                Gdk.RGBA.from_color(Gdk.color_parse(color_text)),
                 bg,
                 [])
 
-        if not ConfigManager.get_conf('terminal', 'use_system_font'):
-            self.vte.set_font_from_string(ConfigManager.get_conf('terminal', 'font_name'))
-        if self.pid != 0:
-            self.title.set_label(terra_utils.get_running_cmd(self))
+    def update_ui(self):
+        self.update_scrollbar()
 
-        self.show_all()
+        terminal_conf = ConfigManager.get_snapshot().terminal
+        if terminal_conf.scrollback_unlimited:
+            self.apply_setting('set_scrollback_lines', -1)
+        else:
+            self.apply_setting('set_scrollback_lines', terminal_conf.scrollback_lines)
+
+        self.apply_setting('set_scroll_on_output', terminal_conf.scroll_on_output)
+
+        self.apply_setting('set_scroll_on_keystroke', terminal_conf.scroll_on_keystroke)
+
+        if hasattr(self.vte, 'set_background_saturation'):
+            self.apply_setting('set_background_saturation', terminal_conf.background_transparency / 100.0)
+        if hasattr(self.vte, 'set_background_transparent'):
+            self.apply_setting('set_background_transparent', ConfigManager.use_fake_transparency)
+        if hasattr(self.vte, 'set_background_image_file'):
+            self.apply_setting('set_background_image_file', terminal_conf.background_image)
+
+        transparency_value = terminal_conf.background_transparency
+        self.apply_setting('set_opacity', (100 - transparency_value) / 100.0 * 65535)
+
+        if hasattr(self.vte, 'set_word_chars'):
+            self.apply_setting('set_word_chars', ConfigManager.get_snapshot().general.select_by_word)
+
+        colors = (
+            terminal_conf.color_text,
+            terminal_conf.color_background,
+            transparency_value,
+        )
+        self.apply_setting('set_colors', colors, self.apply_colors)
+
+        if not terminal_conf.use_system_font:
+            self.apply_setting('set_font_from_string', terminal_conf.font_name)
+        self.refresh_title()
 
     def submenu_item_connect_hack(self, menu_item, callback, *args_for_callback):
         only_once = threading.Semaphore(1)
@@ -230,8 +788,10 @@ class VteObject(Gtk.VBox):
         self.get_container().active_terminal = self
 
         self.matched_value = ''
-        matched_string = self.vte.match_check(int(event.x / self.vte.get_char_width()), int(event.y / self.vte.get_char_height()))
-        value, tag = matched_string
+        value, matcher = LinkMatchers.check(
+            self.vte, self.matcher_tags,
+            int(event.x / self.vte.get_char_width()),
+            int(event.y / self.vte.get_char_height()))
 
         if event.button == 3:
             self.menu = Gtk.Menu()
@@ -290,6 +850,85 @@ class VteObject(Gtk.VBox):
             self.submenu_item_connect_hack(self.reset_shell_item, self.reset_progname, self.reset_shell_item)
             self.term_menu.append(self.reset_shell_item)
 
+            window = self.get_toplevel()
+            self.move_new_page_item = Gtk.MenuItem(t('Move to New Tab'))
+            self.submenu_item_connect_hack(self.move_new_page_item, lambda w: window.move_terminal_to_new_page(self), self.move_new_page_item)
+            self.term_menu.append(self.move_new_page_item)
+
+            self.move_next_page_item = Gtk.MenuItem(t('Move to Next Tab'))
+            self.submenu_item_connect_hack(self.move_next_page_item, lambda w: window.move_terminal_to_page(1, self), self.move_next_page_item)
+            self.term_menu.append(self.move_next_page_item)
+
+            if len(TerraHandler.Wins.get_apps()) > 1:
+                self.move_next_window_item = Gtk.MenuItem(t('Move to Next Window'))
+                self.submenu_item_connect_hack(self.move_next_window_item, lambda w: window.move_terminal_to_next_window(self), self.move_next_window_item)
+                self.term_menu.append(self.move_next_window_item)
+
+            if self.can_tap_output() or OwnedPty.is_supported():
+                # Libvte reads the output of its own PTY, programs started on
+                # it are only logged from the next start, on an OwnedPty.
+                if self.can_tap_output():
+                    log_label, record_label = t('Log Output'), t('Record Output')
+                else:
+                    log_label, record_label = t('Log Output (from Next Start)'), t('Record Output (from Next Start)')
+                self.log_item = Gtk.CheckMenuItem(log_label)
+                self.log_item.set_active(self.logger is not None)
+                self.log_item.connect('toggled', self.toggle_logging)
+                self.term_menu.append(self.log_item)
+
+                self.record_item = Gtk.CheckMenuItem(record_label)
+                self.record_item.set_active(self.recorder is not None)
+                self.record_item.connect('toggled', self.toggle_recording)
+                self.term_menu.append(self.record_item)
+
+            self.replay_item = Gtk.MenuItem(t('Replay Recording...'))
+            self.submenu_item_connect_hack(self.replay_item, self.choose_replay, self.replay_item)
+            self.term_menu.append(self.replay_item)
+
+            if len(TerraHandler.Wins.close_stash):
+                self.undo_close_item = Gtk.MenuItem(t('Undo Close'))
+                self.submenu_item_connect_hack(self.undo_close_item, lambda w: window.undo_close(), self.undo_close_item)
+                self.term_menu.append(self.undo_close_item)
+
+            if self.spawn_state in ('exited', 'failed'):
+                self.restart_item = Gtk.MenuItem(t('Restart'))
+                self.submenu_item_connect_hack(self.restart_item, self.restart, self.restart_item)
+                self.term_menu.append(self.restart_item)
+
+            self.broadcast_item = Gtk.CheckMenuItem(t('Broadcast Input'))
+            self.broadcast_item.set_active(self.input_group is not None and self.input_group.broadcasting)
+            self.broadcast_item.connect('toggled', lambda w: window.toggle_broadcast(self))
+            self.term_menu.append(self.broadcast_item)
+
+            # Create an "Input Group" sub-menu.
+            self.input_group_item = Gtk.MenuItem(t('Input Group'))
+            self.term_menu.append(self.input_group_item)
+            self.input_group_menu = Gtk.Menu()
+            self.input_group_item.set_submenu(self.input_group_menu)
+
+            current_group = self.input_group.name if self.input_group is not None else None
+            radio_group = None
+            for name, label in [(None, t('None'))] + [('group-%d' % i, t('Group {}').format(i)) for i in range(1, 5)]:
+                group_item = Gtk.RadioMenuItem.new_with_label_from_widget(radio_group, label)
+                radio_group = group_item
+                group_item.set_active(current_group == name)
+                group_item.connect('toggled', self.set_input_group, name)
+                self.input_group_menu.append(group_item)
+
+            # Create a "When the Program Exits" sub-menu.
+            self.respawn_item = Gtk.MenuItem(t('When the Program Exits'))
+            self.term_menu.append(self.respawn_item)
+            self.respawn_menu = Gtk.Menu()
+            self.respawn_item.set_submenu(self.respawn_menu)
+
+            policy_group = None
+            for policy, label in ((None, t('Use Default')), (RESPAWN, t('Restart It')), (CLOSE, t('Close the Terminal')), (HOLD, t('Keep the Terminal Open'))):
+                policy_item = Gtk.RadioMenuItem.new_with_label_from_widget(policy_group, label)
+                policy_group = policy_item
+                policy_item.set_active(self.respawn_policy == policy)
+                policy_item.connect('toggled', self.set_respawn_policy, policy)
+                self.respawn_menu.append(policy_item)
+
             self.win_props = Gtk.MenuItem(t('Window Properties'))
             self.win_props.connect('activate', self.win_prefs)
             self.menu.append(self.win_props)
@@ -345,6 +984,12 @@ class VteObject(Gtk.VBox):
         ConfigManager.disable_losefocus_temporary = True
         WinDialog(self, self)
 
+    def restart(self, widget):
+        if self.respawn_source is not None:
+            GLib.source_remove(self.respawn_source)
+        self.respawn_failures = 0
+        self.respawn()
+
     def reset_progname(self, widget):
         self.progname = ConfigManager.get_conf('general', 'start_shell_program')
         self.fork_process(self.progname)
@@ -357,30 +1002,41 @@ class VteObject(Gtk.VBox):
 
     def open_preferences(self, widget):
         ConfigManager.disable_losefocus_temporary = True
-        self.prefs.show()
+        Preferences.get_instance().show()
 
     def close_node(self, widget):
-        parent = self.get_parent()
+        container = self.get_container()
 
-        if self in self.get_container().vte_list:
-            self.get_container().vte_list.remove(self)
-        else:
+        if self.id not in container.layout:
             print('Issue Close Node')
+            return
 
-        if type(parent) == VteObjectContainer:
-            return self.get_container().close_page()
+        if type(self.get_parent()) == VteObjectContainer:
+            return container.close_page()
 
-        container = parent
+        if TerraHandler.Wins.close_stash.is_enabled():
+            # Keep the terminal running for a while, see undo_close().
+            window = self.get_toplevel()
+            self.detach()
+            TerraHandler.Wins.close_stash.add_terminal(self, window, container)
+            return
 
-        while type(container) != VteObjectContainer:
-            container = container.get_parent()
+        self.unregister()
+        self.remove_from_split(container)
 
+    def remove_from_split(self, container):
+        """
+        Remove the terminal from its split, its sibling takes the place of the
+        split.
+        """
+        parent = self.get_parent()
+        sibling_node = container.layout.remove(self.id)
         if parent.get_child1() == self:
             sibling = parent.get_child2()
         else:
             sibling = parent.get_child1()
 
-        TerraHandler.remove_ui_event_handler(self.update_ui)
+        parent.remove(self)
         parent.remove(sibling)
         top_level = parent.get_parent()
 
@@ -395,19 +1051,124 @@ class VteObject(Gtk.VBox):
                 top_level.remove(parent)
                 top_level.pack2(sibling, True, True)
 
-        while type(sibling) != VteObject:
-            sibling = sibling.get_child1()
-
+        sibling = container.layout.first_leaf(sibling_node).pane
         container.active_terminal = sibling
         sibling.grab_focus()
 
+    def detach(self):
+        """
+        Remove the terminal from its tab without ending its process, to move
+        it somewhere else. A tab left empty is closed.
+        """
+        container = self.get_container()
+        if container is None or self.id not in container.layout:
+            return False
+
+        container.pane_rects.discard(self.id)
+        window = self.get_toplevel()
+        if hasattr(window, 'title_scheduler'):
+            window.title_scheduler.discard(self)
+
+        self.container = None
+        if len(container.layout) == 1:
+            container.layout.remove(self.id)
+            container.remove(self)
+            window.close_container(container)
+        else:
+            self.remove_from_split(container)
+        return True
+
+    def move_to(self, container, axis='h'):
+        """
+        Move the terminal to another tab, possibly of another window, next to
+        its active terminal. The process and the scrollback are kept.
+        """
+        if container.active_terminal is self or not self.detach():
+            return
+        self.attach_to(container, axis)
+
+    def attach_to(self, container, axis='h'):
+        """
+        Add the detached terminal to the tab, next to its active terminal.
+        """
+        target = container.active_terminal
+        if target is None:
+            container.adopt_terminal(self)
+        else:
+            paned = target.insert_split(self, axis)
+            container.adopt_terminal(self, split_from=target, axis=axis, paned=paned)
+        container.show_all()
+        self.grab_focus()
+
+    def unregister(self):
+        TerraHandler.remove_ui_event_handler(self.update_ui)
+        TerraHandler.remove_ui_event_handler(self.update_scrollbar)
+        TerraHandler.remove_ui_event_handler(self.update_matchers)
+        TerraHandler.remove_ui_event_handler(self.update_triggers)
+        TerraHandler.remove_ui_event_handler(self.update_filters)
+        if self.spawn_source is not None:
+            GLib.source_remove(self.spawn_source)
+            self.spawn_source = None
+        if self.respawn_source is not None:
+            GLib.source_remove(self.respawn_source)
+            self.respawn_source = None
+        if self.daemon_id is not None:
+            client = self.get_session_client()
+            if client is not None:
+                client.kill(self.daemon_id)
+            self.daemon_id = None
+        if self.owned_pty is not None:
+            self.owned_pty.close(hangup=True)
+            self.owned_pty = None
+        # The held back output goes to the taps before they are closed.
+        self.close_filters()
+        if self.logger is not None:
+            self.logger.close()
+            self.logger = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.player is not None:
+            self.player.stop()
+            self.player = None
+        if self.triggers is not None:
+            self.triggers.close()
+            self.triggers = None
+        self.output_taps = []
+        if self.input_group is not None:
+            broadcasting = self.input_group.broadcasting
+            TerraHandler.Wins.input_groups.leave(self)
+            if broadcasting:
+                TerraHandler.Wins.update_broadcast_marks()
+        if self.flood_source is not None:
+            GLib.source_remove(self.flood_source)
+            self.flood_source = None
+        if self.container is not None:
+            self.container.pane_rects.discard(self.id)
+        window = self.get_toplevel()
+        if hasattr(window, 'title_scheduler'):
+            window.title_scheduler.discard(self)
+
     def get_container(self):
+        if self.container is not None:
+            return self.container
         container = self.get_parent()
         while type(container) != VteObjectContainer and container:
             container = container.get_parent()
         return container
 
     def split_axis(self, widget, axis='h', split=-1, progname=None, term_id=0, pwd=None):
+        new_terminal = VteObject()
+        paned = self.insert_split(new_terminal, axis, split)
+        self.get_container().append_terminal(new_terminal, progname, pwd, term_id, split_from=self, axis=axis, split=split, paned=paned)
+        paned.get_parent().show_all()
+        new_terminal.grab_focus()
+
+    def insert_split(self, terminal, axis='h', split=-1):
+        """
+        Replace the terminal by a split of itself and terminal, which takes
+        the right or bottom part. Returns the Gtk.Paned.
+        """
         parent = self.get_parent()
 
         if type(parent) != VteObjectContainer:
@@ -436,9 +1197,8 @@ class VteObject(Gtk.VBox):
         paned.set_position(split)
 
         parent.remove(self)
-        new_terminal = VteObject()
         paned.pack1(self, True, False)
-        paned.pack2(new_terminal, True, False)
+        paned.pack2(terminal, True, False)
         paned.show_all()
 
         if mode == 0:
@@ -447,138 +1207,22 @@ class VteObject(Gtk.VBox):
             parent.pack1(paned, True, False)
         else:
             parent.pack2(paned, True, False)
-
-        self.get_container().append_terminal(new_terminal, progname, pwd, term_id)
-        new_terminal.parent = self.id
-        parent.show_all()
-        new_terminal.grab_focus()
+        return paned
 
     # direction
     # 1 = up (default)
     # 2 = down
     # 3 = left
     # 4 = right
-    def move(self, direction=1):
-        child = self
-        parent = self.get_parent()
-        vpath, hpath = [], []
-        while True:
-            if type(parent) == VteObjectContainer:
-                break
-
-            if type(parent) == Gtk.VPaned:
-                if parent.get_child1() == child:
-                    vpath.append(1)
-                else:
-                    vpath.append(2)
-            elif type(parent) == Gtk.HPaned:
-                if parent.get_child1() == child:
-                    hpath.append(1)
-                else:
-                    hpath.append(2)
-
-            child = parent
-            parent = parent.get_parent()
-
-        if direction == 1:
-            changed = False
-            new_vpath = []
-            for i in vpath:
-                if i == 1 and changed:
-                    new_vpath.append(1)
-                elif i == 2:
-                    if not changed:
-                        new_vpath.append(1)
-                        changed = True
-                    else:
-                        new_vpath.append(2)
-
-            vpath = new_vpath[::-1]
-            hpath = hpath[::-1]
-        elif direction == 2:
-            changed = False
-            new_vpath = []
-            for i in vpath:
-                if i == 2 and changed:
-                    new_vpath.append(2)
-                elif i == 1:
-                    if not changed:
-                        new_vpath.append(2)
-                        changed = True
-                    else:
-                        new_vpath.append(1)
-
-            vpath = new_vpath[::-1]
-            hpath = hpath[::-1]
-        elif direction == 3:
-            changed = False
-            new_hpath = []
-            for i in hpath:
-                if i == 1 and changed:
-                    new_hpath.append(1)
-                elif i == 2:
-                    if not changed:
-                        new_hpath.append(1)
-                        changed = True
-                    else:
-                        new_hpath.append(2)
-            vpath = vpath[::-1]
-            hpath = new_hpath[::-1]
-        elif direction == 4:
-            changed = False
-            new_hpath = []
-            for i in hpath:
-                if i == 2 and changed:
-                    new_hpath.append(2)
-                elif i == 1:
-                    if not changed:
-                        new_hpath.append(2)
-                        changed = True
-                    else:
-                        new_hpath.append(1)
-
-            hpath = new_hpath[::-1]
-            vpath = vpath[::-1]
-
-        if direction < 3 and vpath == []:
-            return
-        elif direction > 2 and hpath == []:
+    def move(self, direction=MOVE_UP):
+        container = self.get_container()
+        neighbor_id = container.pane_rects.get_neighbor(self.id, direction)
+        if neighbor_id is None:
             return
 
-        obj = parent.get_children()[0]
-
-        while type(obj) != VteObject:
-            if type(obj) == Gtk.VPaned:
-                if len(vpath) == 0:
-                    if direction == 1:
-                        obj = obj.get_child2()
-                    else:
-                        obj = obj.get_child1()
-                else:
-                    pick = vpath[0]
-                    vpath = vpath[1:]
-
-                    if pick == 1:
-                        obj = obj.get_child1()
-                    else:
-                        obj = obj.get_child2()
-            elif type(obj) == Gtk.HPaned:
-                if len(hpath) == 0:
-                    if direction == 3:
-                        obj = obj.get_child2()
-                    else:
-                        obj = obj.get_child1()
-                else:
-                    pick = hpath[0]
-                    hpath = hpath[1:]
-
-                    if pick == 1:
-                        obj = obj.get_child1()
-                    else:
-                        obj = obj.get_child2()
-
-        obj.grab_focus()
-        self.get_container().active_terminal = obj
+        neighbor = container.layout.get_pane(neighbor_id)
+        neighbor.grab_focus()
+        container.active_terminal = neighbor
 
     def grab_focus(self):
         self.vte.grab_focus()
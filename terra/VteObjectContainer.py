@@ -21,6 +21,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 from gi.repository import Gtk
 
 from terra.ConfigManager import ConfigManager
+from terra.LayoutTree import LayoutTree
+from terra.PaneRectIndex import PaneRectIndex
 
 class VteObjectContainer(Gtk.HBox):
     counter = 0
@@ -28,18 +30,32 @@ class VteObjectContainer(Gtk.HBox):
     def __init__(self, parent, bare=False, progname=None, pwd=None):
         super(VteObjectContainer, self).__init__()
 
-        if bare:
-            return
-
         self.counter = 0
         self.parent = parent
-        self.vte_list = []
+        # Split layout of the terminals, mirrored by the Gtk.Paned widgets.
+        self.layout = LayoutTree()
+        # Allocations of the terminals, for directional focus moves.
+        self.pane_rects = PaneRectIndex()
         self.active_terminal = None
+        # Saved tab layout waiting to be restored, see RestoreScheduler.
+        self.pending_spec = None
+        # Maps terminal ids to the session daemon panes they reattach to.
+        self.attach_ids = {}
+
+        if bare:
+            return
 
+        self.materialize(progname, pwd)
+
+    @property
+    def vte_list(self):
+        return self.layout.panes()
+
+    def materialize(self, progname=None, pwd=None, term_id=0):
         if not progname:
             progname = ConfigManager.get_conf('general', 'start_shell_program')
         import terra.VteObject
-        self.append_terminal(terra.VteObject.VteObject(), progname, pwd=pwd)
+        self.append_terminal(terra.VteObject.VteObject(), progname, pwd=pwd, term_id=term_id)
 
         self.pack_start(self.active_terminal, True, True, 0)
         self.show_all()
@@ -50,12 +66,33 @@ class VteObjectContainer(Gtk.HBox):
             if button != terminalwin.radio_group_leader and button.get_active():
                 return terminalwin.page_close(None, button)
 
-    def append_terminal(self, term, progname, pwd=None, term_id=0):
+    def append_terminal(self, term, progname, pwd=None, term_id=0, split_from=None, axis='h', split=-1, paned=None):
         term.id = self.handle_id(term_id)
-        term.set_pwd(self.active_terminal, pwd)
+        term.container = self
+        if split_from is None:
+            term.set_pwd(self.active_terminal, pwd)
+            self.layout.add_root(term.id, term)
+        else:
+            term.set_pwd(split_from, pwd)
+            self.layout.split(split_from.id, term.id, axis, split, term, paned)
         term.fork_process(progname)
         self.active_terminal = term
-        self.vte_list.append(self.active_terminal)
+
+    def adopt_terminal(self, term, split_from=None, axis='h', paned=None):
+        """
+        Add a running terminal moved from another tab. The caller already put
+        it in the paned splitting split_from, if any.
+        """
+        term.id = self.handle_id()
+        term.container = self
+        if split_from is None:
+            term.parent = 0
+            self.layout.add_root(term.id, term)
+            self.pack_start(term, True, True, 0)
+        else:
+            term.parent = split_from.id
+            self.layout.split(split_from.id, term.id, axis, -1, term, paned)
+        self.active_terminal = term
 
     def handle_id(self, setter=0):
         if setter != 0:
@@ -43,6 +43,7 @@ def main(project_root=ROOT):
     # Load the TerminalWinContainer after TerraHandler has been initialized.
     # TODO: Cleanup these inter-dependencies.
     from terra.TerminalWinContainer import TerminalWinContainer
+    from terra.ConfigManager import ConfigManager
     TerraHandler.Wins = TerminalWinContainer()
 
     for section in TerraHandler.config.iterkeys():
@@ -50,7 +51,7 @@ def main(project_root=ROOT):
             continue
 
         # TODO: Cleanup window, tab and tab-child-layout related settings.
-        if not TerraHandler.config[section]['disabled']:
+        if not ConfigManager.get_conf(section, 'disabled'):
             TerraHandler.Wins.create_app(section)
 
     if len(TerraHandler.Wins.get_apps()) == 0:
@@ -59,4 +60,6 @@ def main(project_root=ROOT):
     if len(TerraHandler.Wins.get_apps()) == 0:
         sys.exit('Cannot initiate any screen')
 
+    TerraHandler.Wins.recover_session_panes()
+
     TerraHandler.Wins.start()
@@ -0,0 +1,302 @@
+"""
+Micro-benchmarks for terra internals which do not need a display, except
+css which is skipped without GTK and a screen.
+
+Usage: python -m terra.benchmarks [name ...]
+"""
+
+import os
+import sys
+import timeit
+
+from terra.ConfigDefaults import ConfigDefaults
+from terra.handlers import ConfigHandler
+from terra.handlers import TerraHandler
+
+
+def init_config():
+    """
+    Use the default configuration, instead of the user config file.
+    """
+    if TerraHandler.config is None:
+        TerraHandler.config = ConfigHandler(config_defaults=ConfigDefaults, config_file=os.devnull)
+
+
+def report(name, seconds, number):
+    print('{:<40} {:>10.3f} us/op'.format(name, seconds / number * 1000000))
+
+
+def bench_config(number=200000):
+    init_config()
+    from terra.ConfigManager import ConfigManager
+
+    config = TerraHandler.config
+
+    # The lookup ConfigManager.get_conf() used to do on every call.
+    def legacy_get_conf(section, option):
+        if section.find('layout-screen-') == 0 and section not in config:
+            config[section] = config['layout'].copy()
+            return config['layout'][option]
+        if section not in config:
+            return None
+        if option not in config[section]:
+            return None
+        return config[section][option]
+
+    def snapshot_attribute():
+        return ConfigManager.get_snapshot().terminal.show_scrollbar
+
+    def get_conf():
+        return ConfigManager.get_conf('terminal', 'show_scrollbar')
+
+    def legacy():
+        return legacy_get_conf('terminal', 'show_scrollbar')
+
+    ConfigManager.get_snapshot()
+    report('config: legacy get_conf', timeit.timeit(legacy, number=number), number)
+    report('config: get_conf', timeit.timeit(get_conf, number=number), number)
+    report('config: snapshot attribute', timeit.timeit(snapshot_attribute, number=number), number)
+
+    def rebuild():
+        config.set_option('terminal', 'scrollback_lines', config['terminal']['scrollback_lines'] + 1)
+        return ConfigManager.get_snapshot()
+
+    rebuild_number = max(1, number / 100)
+    report('config: snapshot rebuild', timeit.timeit(rebuild, number=rebuild_number), rebuild_number)
+
+
+def bench_layout(sizes=(16, 64, 256, 1024), number=20):
+    from terra.LayoutTree import LayoutTree
+
+    def build(size):
+        tree = LayoutTree()
+        tree.add_root(0)
+        for pane_id in range(1, size):
+            # Split the panes in a round robin, for a balanced tree.
+            tree.split(pane_id / 2, pane_id, 'hv'[pane_id % 2])
+        return tree
+
+    for size in sizes:
+        tree = build(size)
+        report('layout: build %d panes' % size, timeit.timeit(lambda: build(size), number=number), number)
+        report('layout: lookup in %d panes' % size, timeit.timeit(lambda: tree.get_pane(size - 1), number=number * 1000), number * 1000)
+        report('layout: serialize %d panes' % size, timeit.timeit(tree.serialize, number=number), number)
+
+        def split_and_close():
+            tree.split(size - 1, size, 'h')
+            tree.remove(size)
+        report('layout: split+close in %d panes' % size, timeit.timeit(split_and_close, number=number * 100), number * 100)
+
+
+def bench_panes(sizes=(4, 16, 64), number=20000):
+    from terra.PaneRectIndex import PaneRectIndex, MOVE_RIGHT, MOVE_DOWN
+
+    for size in sizes:
+        # A grid of 100x50 terminals.
+        columns = int(size ** 0.5)
+        index = PaneRectIndex()
+        for pane_id in range(size):
+            index.update(pane_id, pane_id % columns * 100, pane_id / columns * 50, 100, 50)
+
+        def move():
+            index.get_neighbor(0, MOVE_RIGHT)
+            index.get_neighbor(0, MOVE_DOWN)
+        report('panes: 2 moves in %d panes' % size, timeit.timeit(move, number=number), number)
+
+
+def bench_logging(megabytes=256):
+    import shutil
+    import tempfile
+    init_config()
+    from terra.OutputLogger import OutputLogger
+
+    # Colored compiler-like output, in the chunks a PTY read returns.
+    line = b'\x1b[1;32mbuilding\x1b[0m src/module_%04d.c -o build/module.o \x1b[33m[warning]\x1b[0m unused variable\r\n'
+    chunk = b''.join(line % i for i in range(1024))[:65536]
+    number = megabytes * 1024 * 1024 / len(chunk)
+
+    directory = tempfile.mkdtemp()
+    try:
+        for strip_ansi in (False, True):
+            logger = OutputLogger(path=os.path.join(directory, 'bench-%d.log' % strip_ansi), strip_ansi=strip_ansi,
+                                  rotate_size=64 * 1024 * 1024, rotate_interval=0, compress=False)
+            start = timeit.default_timer()
+            for i in xrange(number):
+                logger.write(chunk)
+            queued = timeit.default_timer() - start
+            logger.close()
+            OutputLogger.shutdown(timeout=None)
+            total = timeit.default_timer() - start
+
+            name = 'logging: strip ansi' if strip_ansi else 'logging: raw'
+            report(name + ' (main loop, per chunk)', queued, number)
+            print('{:<40} {:>10.1f} MB/s'.format(name + ' (written)', megabytes / total))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_broadcast(sizes=(1, 8, 64), number=20000):
+    import functools
+    from terra.InputGroups import InputGroups
+
+    class Member(object):
+        def __init__(self, fd):
+            self.input_group = None
+            self.input_writer = functools.partial(os.write, fd)
+            self.stashed = False
+
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        for size in sizes:
+            groups = InputGroups()
+            members = [Member(fd) for i in range(size + 1)]
+            for member in members:
+                groups.join(member, 'bench')
+            groups.get('bench').broadcasting = True
+            seconds = timeit.timeit(lambda: groups.broadcast(members[0], b'x'), number=number)
+            report('broadcast: key to %d terminals' % size, seconds, number)
+    finally:
+        os.close(fd)
+
+
+def bench_cast(megabytes=64):
+    import shutil
+    import tempfile
+    init_config()
+    from terra.CastRecorder import CastRecorder, read_cast
+    from terra.OutputLogger import OutputLogger
+
+    line = b'\x1b[1;32mbuilding\x1b[0m src/module_%04d.c -o build/module.o \xe2\x9c\x93\r\n'
+    chunk = b''.join(line % i for i in range(1024))[:65536]
+    number = megabytes * 1024 * 1024 / len(chunk)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'bench.cast')
+        recorder = CastRecorder(24, 80, path=path)
+        start = timeit.default_timer()
+        for i in xrange(number):
+            recorder.write(chunk)
+        queued = timeit.default_timer() - start
+        recorder.close()
+        OutputLogger.shutdown(timeout=None)
+        total = timeit.default_timer() - start
+        report('cast: record (main loop, per chunk)', queued, number)
+        print('{:<40} {:>10.1f} MB/s'.format('cast: record (written)', megabytes / total))
+
+        start = timeit.default_timer()
+        header, events = read_cast(path)
+        total = timeit.default_timer() - start
+        print('{:<40} {:>10.1f} MB/s'.format('cast: read', megabytes / total))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_css(cycles=100):
+    """
+    Shows and hides a real window, reloading the theme every other cycle,
+    and checks that no CSS provider is added to the screen after the first,
+    see TerminalWin.override_gtk_theme(). Run it from the repository root.
+    """
+    init_config()
+    try:
+        from gi.repository import Gdk, Gtk
+    except (ImportError, RuntimeError) as e:
+        print('css: skipped, {}'.format(e))
+        return
+    if Gdk.Screen.get_default() is None:
+        print('css: skipped, no screen')
+        return
+    import terra.terra_utils as terra_utils
+    from terra.handlers import SessionHandler
+    from terra.interfaces.TerminalWin import TerminalWin
+    from terra.TerminalWinContainer import TerminalWinContainer
+
+    config = TerraHandler.config
+    # Another terra may hold the global hotkey.
+    config.set_option('shortcuts', 'global_key', '')
+    config.set_option('general', 'hide_on_start', True)
+    config.set_option('window', 'use_animation', False)
+    TerraHandler.session = SessionHandler(session_file=os.devnull)
+    TerraHandler.Wins = TerminalWinContainer()
+    window = TerminalWin(TerraHandler.Wins.get_screen_name(), terra_utils.get_screen('layout'))
+    window.hotkey = TerraHandler.Wins.hotkey
+    TerraHandler.Wins.apps.append(window)
+    expected = TerminalWin.css_provider_count
+    state = {'cycle': 0}
+
+    def cycle():
+        state['cycle'] += 1
+        if state['cycle'] % 2:
+            config.set_option('general', 'separator_size', int(config['general']['separator_size']) % 8 + 1)
+            TerraHandler.execute_ui_event_handlers()
+        for i in range(2):
+            # A focus loss right before would make show_hide() a no-op.
+            window.losefocus_time = 0
+            window.show_hide()
+            while Gtk.events_pending():
+                Gtk.main_iteration()
+
+    report('css: show and hide', timeit.timeit(cycle, number=cycles), cycles)
+    if TerminalWin.css_provider_count != expected:
+        sys.exit('css: {} providers added to the screen after {} show/hide cycles, expected {}'.format(
+            TerminalWin.css_provider_count, cycles, expected))
+
+
+def bench_filters(megabytes=32):
+    init_config()
+    from terra.OutputFilters import FilterPipeline, TimestampFilter, RedactFilter, ColorizeFilter
+
+    line = b'\x1b[1;32mbuilding\x1b[0m src/module_%04d.c token=ghp_%08d \x1b[33m[warning]\x1b[0m unused variable\r\n'
+    chunk = b''.join(line % (i, i) for i in range(1024))[:65536]
+    number = megabytes * 1024 * 1024 / len(chunk)
+
+    pipeline = FilterPipeline([
+        TimestampFilter('[%H:%M:%S] '),
+        RedactFilter([br'ghp_[0-9]{8}']),
+        ColorizeFilter([(br'warning', b'1;33'), (br'ERROR|FATAL', b'1;31')]),
+    ])
+    seconds = timeit.timeit(lambda: pipeline.feed(chunk), number=number)
+    report('filters: pipeline, per 64 KB chunk', seconds, number)
+    for stats in pipeline.get_stats():
+        print('{:<40} {:>10.1f} MB/s'.format('filters: ' + stats['name'], stats['bytes'] / 1048576.0 / stats['time']))
+
+
+def bench_triggers(sizes=(1, 8, 32, 128), megabytes=32):
+    from terra.TriggerEngine import Trigger, TriggerScanner, TriggerSet, compile_triggers
+
+    line = b'\x1b[1;32mbuilding\x1b[0m src/module_%04d.c -o build/module.o \x1b[33m[warning]\x1b[0m unused variable\r\n'
+    chunk = b''.join(line % i for i in range(1024))[:65536]
+    number = megabytes * 1024 * 1024 / len(chunk)
+
+    for size in sizes:
+        trigger_set = TriggerSet(compile_triggers(
+            [Trigger('rule%d' % i, r'ERROR %d\b|panic: .*%d' % (i, i)) for i in range(size)]))
+        scanner = TriggerScanner(trigger_set)
+        seconds = timeit.timeit(lambda: scanner.feed(chunk), number=number)
+        report('triggers: feed 64 KB, %d triggers' % size, seconds, number)
+        print('{:<40} {:>10.1f} MB/s'.format('triggers: %d triggers' % size, megabytes / seconds))
+
+
+BENCHMARKS = {
+    'broadcast': bench_broadcast,
+    'cast': bench_cast,
+    'config': bench_config,
+    'css': bench_css,
+    'filters': bench_filters,
+    'layout': bench_layout,
+    'logging': bench_logging,
+    'panes': bench_panes,
+    'triggers': bench_triggers,
+}
+
+
+def main(names=None):
+    for name in names or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            sys.exit('Unknown benchmark: {}'.format(name))
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -26,6 +26,15 @@ class ConfigHandler(dict):
         """
         super(ConfigHandler, self).__init__(*args, **kw)
 
+        # Keys changed since the last call to pop_changes().
+        self.changes = set()
+
+        # Incremented on every change, to invalidate config snapshots.
+        self.revision = 0
+        # Revision of the last change of each section, so snapshots only
+        # rebuild the changed sections.
+        self.section_revisions = {}
+
         # Set the default configuration.
         if config_defaults:
             # Store defaults for later usage.
@@ -67,6 +76,24 @@ class ConfigHandler(dict):
             msg = t('Malformed config file: {}')
             sys.exit(msg.format(self.file))
 
+    def __setitem__(self, section_name, options):
+        super(ConfigHandler, self).__setitem__(section_name, options)
+        self.touch(section_name)
+
+    def __delitem__(self, section_name):
+        super(ConfigHandler, self).__delitem__(section_name)
+        self.touch(section_name)
+
+    def touch(self, section_name):
+        """
+        Invalidate the snapshots of a section. Options changed in place, e.g.
+        config['general']['option'] = value, need this or set_option().
+
+        :type section_name: str
+        """
+        self.revision += 1
+        self.section_revisions[section_name] = self.revision
+
     def __parse_config_data(self, config_data):
         """
         Parse the config data loaded from the provided config file.
@@ -86,6 +113,52 @@ class ConfigHandler(dict):
 
                 # Set the option.
                 self[section_name][option] = value
+                self.touch(section_name)
+
+    def set_option(self, section_name, option, value, notify=True):
+        """
+        Set an option and record the change, if the value actually changed.
+
+        :type section_name: str
+        :type option: str
+        :param notify: False for values which only mirror the UI state, e.g.
+            the window geometry, so they don't call the UI event handlers.
+        :type notify: bool
+        :rtype: bool
+        """
+        if section_name not in self:
+            self[section_name] = {}
+        elif option in self[section_name] and self[section_name][option] == value:
+            return False
+
+        self[section_name][option] = value
+        if notify:
+            self.changes.add((section_name, option))
+        self.touch(section_name)
+        return True
+
+    def del_section(self, section_name):
+        """
+        Delete a section and record the removal of each of its options.
+
+        :type section_name: str
+        """
+        if section_name not in self:
+            return
+
+        for option in self[section_name]:
+            self.changes.add((section_name, option))
+        del self[section_name]
+
+    def pop_changes(self):
+        """
+        Return the (section, option) keys changed since the last call, each
+        key once.
+
+        :rtype: list
+        """
+        changes, self.changes = self.changes, set()
+        return sorted(changes)
 
     def save(self):
         """
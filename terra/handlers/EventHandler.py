@@ -0,0 +1,120 @@
+"""
+Contains a key scoped event handler for config changes.
+"""
+
+import weakref
+from fnmatch import fnmatchcase
+
+
+class WeakHandler(object):
+    """
+    Reference to a callable which does not keep a bound method's instance
+    alive. Plain functions are referenced strongly.
+    """
+    __slots__ = ('obj_ref', 'func', 'key')
+
+    def __init__(self, callable_handler):
+        obj = getattr(callable_handler, '__self__', None)
+        if obj is not None:
+            self.obj_ref = weakref.ref(obj)
+            self.func = callable_handler.__func__
+            self.key = (id(obj), self.func)
+        else:
+            self.obj_ref = None
+            self.func = callable_handler
+            self.key = (None, callable_handler)
+
+    def get(self):
+        """
+        Return the callable, or None if its instance has been collected.
+        """
+        if self.obj_ref is None:
+            return self.func
+        obj = self.obj_ref()
+        if obj is None:
+            return None
+        return self.func.__get__(obj, type(obj))
+
+
+class EventHandler(object):
+    def __init__(self):
+        # Maps a section name, or '*' for any section, to a list of
+        # (option pattern, WeakHandler) tuples.
+        self.subscriptions = {}
+        """:type: dict"""
+
+    def subscribe(self, callable_handler, *keys):
+        """
+        Call callable_handler when one of the given keys changes. A key is
+        'section.option', where option may be a shell style pattern, such
+        as 'terminal.color_*' or 'shortcuts.*'. No keys means any change.
+
+        :type callable_handler: callable
+        :type keys: str
+        """
+        handler = WeakHandler(callable_handler)
+        for key in keys or ('*.*',):
+            section, _, option = key.partition('.')
+            entries = self.subscriptions.setdefault(section, [])
+            option = option or '*'
+            for entry_option, entry_handler in entries:
+                if entry_option == option and entry_handler.key == handler.key:
+                    break
+            else:
+                entries.append((option, handler))
+
+    def unsubscribe(self, callable_handler):
+        key = WeakHandler(callable_handler).key
+        for section in self.subscriptions.keys():
+            entries = [entry for entry in self.subscriptions[section] if entry[1].key != key]
+            if entries:
+                self.subscriptions[section] = entries
+            else:
+                del self.subscriptions[section]
+
+    def get_handlers(self, changes):
+        """
+        Return the live handlers subscribed to any of the changed keys, each
+        handler once, in subscription order.
+
+        :type changes: list
+        :rtype: list
+        """
+        handlers = []
+        seen = set()
+        dead = False
+        for section, option in changes:
+            for bucket in (section, '*'):
+                for pattern, handler in self.subscriptions.get(bucket, ()):
+                    if handler.key in seen:
+                        continue
+                    if pattern != '*' and pattern != option and not fnmatchcase(option, pattern):
+                        continue
+                    seen.add(handler.key)
+                    callable_handler = handler.get()
+                    if callable_handler is None:
+                        dead = True
+                        continue
+                    handlers.append(callable_handler)
+        if dead:
+            self.prune()
+        return handlers
+
+    def prune(self):
+        for section in self.subscriptions.keys():
+            entries = [entry for entry in self.subscriptions[section] if entry[1].get() is not None]
+            if entries:
+                self.subscriptions[section] = entries
+            else:
+                del self.subscriptions[section]
+
+    def emit(self, changes):
+        """
+        Call the handlers subscribed to the changed (section, option) keys.
+
+        :type changes: list
+        """
+        if not changes:
+            return
+        for callable_handler in self.get_handlers(changes):
+            callable_handler()
@@ -0,0 +1,211 @@
+"""
+Contains a session handler for terra, which stores the windows, tabs and
+terminal layouts to restore.
+"""
+
+import yaml
+import os
+import re
+import sys
+
+from terra.handlers import t
+from terra.LayoutTree import LayoutTree
+
+SESSION_VERSION = 1
+
+LEGACY_TABS_REGEX = re.compile(r'^layout-Tabs-(\d+)-(\d+)$')
+LEGACY_CHILD_REGEX = re.compile(r'^layout-Child-(\d+)-(\d+)-(\d+)$')
+LEGACY_CHILD_OPTIONS = ('prog', 'pwd')
+
+
+class SessionHandler(dict):
+    """
+    Session document:
+
+        version: 1
+        windows:
+          layout-screen-0:
+            tabs:
+            - name: Terminal 1
+              layout: {axis: h, pos: 5000, first: {id: 0, prog: ..., pwd: ...}, second: {...}}
+    """
+
+    file = None
+    """:type: str"""
+
+    def __init__(self, session_file='', *args, **kw):
+        """
+        Read the session file, if it exists.
+
+        :type session_file: str
+        """
+        super(SessionHandler, self).__init__(*args, **kw)
+        self['version'] = SESSION_VERSION
+        self['windows'] = {}
+
+        if session_file == '':
+            session_file = os.path.expanduser('~/.config/terra/session.yaml')
+        self.file = session_file
+
+        try:
+            if os.path.exists(self.file):
+                print('[DEBUG] Reading session file: {}'.format(self.file))
+
+                with open(self.file, 'r') as session_file:
+                    session_data = yaml.safe_load(session_file)
+                    """:type: dict"""
+
+                    if session_data:
+                        self.__parse_session_data(session_data)
+        except IOError:
+            msg = t('Could not read session file: {}')
+            sys.exit(msg.format(self.file))
+        except yaml.YAMLError:
+            msg = t('Malformed session file: {}')
+            sys.exit(msg.format(self.file))
+
+    def __parse_session_data(self, session_data):
+        """
+        :type session_data: dict
+        """
+        version = session_data.get('version', SESSION_VERSION)
+        if version > SESSION_VERSION:
+            print('[DEBUG] Ignoring session file of newer version {}: {}'.format(version, self.file))
+            return
+
+        windows = session_data.get('windows') or {}
+        for window_name, window in windows.iteritems():
+            self['windows'][window_name] = {'tabs': list(window.get('tabs') or [])}
+
+    def migrate(self, config):
+        """
+        Move the legacy layout-Tabs-S-T and layout-Child-S-T-C config sections
+        to the session, in a single pass over the config sections.
+
+        :type config: terra.handlers.ConfigHandler
+        :return: True if legacy sections were found.
+        :rtype: bool
+        """
+        tabs = {}
+        children = {}
+        for section_name in config.keys():
+            match = LEGACY_TABS_REGEX.match(section_name)
+            if match:
+                tabs[(int(match.group(1)), int(match.group(2)))] = section_name
+                continue
+            match = LEGACY_CHILD_REGEX.match(section_name)
+            if match:
+                key = (int(match.group(1)), int(match.group(2)))
+                children.setdefault(key, []).append((int(match.group(3)), section_name))
+
+        if not tabs and not children:
+            return False
+
+        windows = {}
+        for key in sorted(set(tabs) | set(children)):
+            screen_id, tab_id = key
+            tab = {}
+            if key in tabs:
+                options = config[tabs[key]]
+                tab['name'] = options.get('name')
+                if options.get('disabled'):
+                    tab['disabled'] = True
+
+            entries = []
+            for child_id, section_name in sorted(children.get(key, [])):
+                options = config[section_name]
+                entry = {
+                    'id': int(options.get('id') or 0),
+                    'parent': int(options.get('parent') or 0),
+                    'axis': options.get('axis') or 'v',
+                    'pos': options.get('pos', -1),
+                    'pane': dict((option, options.get(option)) for option in LEGACY_CHILD_OPTIONS),
+                }
+                entries.append(entry)
+
+            if entries:
+                try:
+                    tree = LayoutTree.from_entries(entries)
+                    for entry in entries:
+                        tree.get(entry['id']).pane = entry['pane']
+                    tab['layout'] = tree.to_dict()
+                except (KeyError, ValueError) as e:
+                    print('[DEBUG] Could not migrate the layout of tab {}-{}: {}'.format(screen_id, tab_id, e))
+
+            windows.setdefault('layout-screen-%d' % screen_id, []).append(tab)
+
+        for window_name, window_tabs in windows.iteritems():
+            if window_name not in self['windows']:
+                self.set_tabs(window_name, window_tabs)
+
+        for section_name in tabs.values():
+            config.del_section(section_name)
+        for sections in children.values():
+            for child_id, section_name in sections:
+                config.del_section(section_name)
+
+        print('[DEBUG] Migrated {} saved tabs to the session file.'.format(len(set(tabs) | set(children))))
+        return True
+
+    def get_tabs(self, window_name):
+        """
+        :type window_name: str
+        :rtype: list
+        """
+        window = self['windows'].get(window_name)
+        if not window:
+            return []
+        return window['tabs']
+
+    def set_tabs(self, window_name, tabs):
+        """
+        :type window_name: str
+        :type tabs: list
+        """
+        self['windows'][window_name] = {'tabs': tabs}
+
+    def get_daemon_ids(self, tabs=None):
+        """
+        Return the session daemon panes used by the tabs, all the saved tabs
+        by default.
+
+        :type tabs: list
+        :rtype: set
+        """
+        if tabs is None:
+            tabs = [tab for window in self['windows'].itervalues() for tab in window['tabs']]
+
+        daemon_ids = set()
+        for tab in tabs:
+            if not tab.get('layout'):
+                continue
+            try:
+                panes = LayoutTree.from_dict(tab['layout']).panes()
+            except (KeyError, ValueError):
+                continue
+            daemon_ids.update(pane['daemon_id'] for pane in panes if pane.get('daemon_id'))
+        return daemon_ids
+
+    def remove_window(self, window_name):
+        self['windows'].pop(window_name, None)
+
+    def save(self):
+        """
+        Save the session to the session file.
+        """
+
+        # Make sure the config directory exists.
+        directory = os.path.dirname(self.file)
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+
+        try:
+            with open(self.file, 'wb') as session_file:
+                session_data = {
+                    'version': SESSION_VERSION,
+                    'windows': self['windows'],
+                }
+                yaml.safe_dump(session_data, session_file, default_flow_style=False, indent=2)
+        except IOError:
+            msg = t('Could not save the session file: {}')
+            sys.exit(msg.format(self.file))
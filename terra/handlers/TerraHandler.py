@@ -9,6 +9,8 @@ from pkg_resources import DistributionNotFound, Requirement, resource_filename,
 from terra import (__version__)
 from terra.ConfigDefaults import ConfigDefaults
 from terra.handlers import ConfigHandler
+from terra.handlers import EventHandler
+from terra.handlers import SessionHandler
 
 
 class TerraHandler:
@@ -18,15 +20,17 @@ class TerraHandler:
     config = None
     """:type: terra.handlers.ConfigHandler"""
 
+    session = None
+    """:type: terra.handlers.SessionHandler"""
+
     Wins = None
     """:type: terra.TerminalWinContainer.TerminalWinContainer"""
 
     __root_path = ''
     """:type: str"""
 
-    # @TODO: Remove this list and cleanup TerminalWin.update_ui().
-    __ui_event_handlers = []
-    """:type: list"""
+    events = EventHandler()
+    """:type: terra.handlers.EventHandler"""
 
     @classmethod
     def __init__(cls, root_path=None):
@@ -39,6 +43,13 @@ class TerraHandler:
         # Set the user config path.
         cls.config = ConfigHandler(config_defaults=ConfigDefaults)
 
+        # The saved windows and tabs, moved out of the config file by older
+        # versions on first start.
+        cls.session = SessionHandler()
+        if cls.session.migrate(cls.config):
+            cls.session.save()
+            cls.config.save()
+
     @classmethod
     def get_root_path(cls):
         return cls.__root_path
@@ -66,19 +77,17 @@ class TerraHandler:
         return full_path
 
     @classmethod
-    def add_ui_event_handler(cls, callable_handler):
-        if callable_handler not in cls.__ui_event_handlers:
-            cls.__ui_event_handlers.append(callable_handler)
+    def add_ui_event_handler(cls, callable_handler, *keys):
+        """
+        Call callable_handler when one of the config keys changes, e.g.
+        'terminal.color_*'. No keys means any config change.
+        """
+        cls.events.subscribe(callable_handler, *keys)
 
     @classmethod
     def remove_ui_event_handler(cls, callable_handler):
-        if callable_handler in cls.__ui_event_handlers:
-            for i in xrange(len(cls.__ui_event_handlers)):
-                if cls.__ui_event_handlers[i] == callable_handler:
-                    del cls.__ui_event_handlers[i]
-                    return
+        cls.events.unsubscribe(callable_handler)
 
     @classmethod
     def execute_ui_event_handlers(cls):
-        for callable_handler in cls.__ui_event_handlers:
-            callable_handler()
+        cls.events.emit(cls.config.pop_changes())
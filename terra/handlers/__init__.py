@@ -5,4 +5,6 @@ This sub-module contains various handlers for terra.
 
 from terra.handlers.i18n_handler import t
 from terra.handlers.ConfigHandler import ConfigHandler
+from terra.handlers.EventHandler import EventHandler
+from terra.handlers.SessionHandler import SessionHandler
 from terra.handlers.TerraHandler import TerraHandler
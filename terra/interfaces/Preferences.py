@@ -39,9 +39,73 @@ class Preferences:
         'hide_on_start',
     ]
 
+    _boolean_window_options = [
+        'use_border',
+        'always_on_top',
+        'hide_on_losefocus',
+        'use_animation',
+    ]
+
+    _boolean_terminal_options = [
+        'use_system_font',
+        'show_scrollbar',
+        'scrollback_unlimited',
+        'scroll_on_output',
+        'scroll_on_keystroke',
+    ]
+
+    # Store all keyboard shortcut entry boxes in array for connecting signals together.
+    _key_entries = [
+        # General
+        'global_key',
+        'fullscreen_key',
+        'toggle_scrollbars_key',
+        'quit_key',
+        'select_all_key',
+        'copy_key',
+        'paste_key',
+
+        # Tabs
+        'new_page_key',
+        'rename_page_key',
+        'close_page_key',
+        'prev_page_key',
+        'next_page_key',
+        'move_page_left_key',
+        'move_page_right_key',
+
+        # Shortcuts - Terminal
+        'split_h_key',
+        'split_v_key',
+        'close_node_key',
+        'move_up_key',
+        'move_down_key',
+        'move_left_key',
+        'move_right_key',
+        'move_left_screen_key',
+        'move_right_screen_key',
+        'move_terminal_new_page_key',
+        'move_terminal_next_page_key',
+        'move_terminal_prev_page_key',
+        'move_terminal_next_window_key',
+        'undo_close_key',
+        'toggle_broadcast_key',
+    ]
+
+    # The preferences window shared by all terminals.
+    instance = None
+    """:type: Preferences"""
+
     def __init__(self):
-        # TODO: Only initialize the UI once. Find a way to hide the window.
-        self.init_ui()
+        # The UI is built on the first call to show().
+        self.window = None
+        self.is_running = False
+
+    @classmethod
+    def get_instance(cls):
+        if cls.instance is None:
+            cls.instance = cls()
+        return cls.instance
 
     def init_ui(self):
         preferences_ui_file = os.path.join(TerraHandler.get_resources_path(), 'preferences.ui')
@@ -49,13 +113,12 @@ class Preferences:
             msg = t('UI data file is missing: {}')
             sys.exit(msg.format(preferences_ui_file))
 
-        self.is_running = True
         builder = Gtk.Builder()
         builder.set_translation_domain('terra')
         builder.add_from_file(preferences_ui_file)
 
         self.window = builder.get_object('preferences_window')
-        self.window.connect('destroy', self.on_cancel_clicked)
+        self.window.connect('delete-event', self.on_delete_event)
         self.window.set_keep_above(True)
 
         self.btn_cancel = builder.get_object('btn_cancel')
@@ -67,21 +130,14 @@ class Preferences:
         self.btn_ok = builder.get_object('btn_ok')
         self.btn_ok.connect('clicked', self.on_ok_clicked)
 
+        # TAB: General
         for option in Preferences._boolean_general_options:
             setattr(self, option, builder.get_object(option))
-            getattr(self, option).set_active(ConfigManager.get_conf('general', option))
 
         self.run_on_startup = builder.get_object('run_on_startup')
-        self.run_on_startup.set_active(os.path.exists(os.environ['HOME'] + '/.config/autostart/terra.desktop'))
-
         self.separator_size = builder.get_object('separator_size')
-        self.separator_size.set_value(int(ConfigManager.get_conf('general', 'separator_size')) * 1.0)
-
         self.select_by_word = builder.get_object('select_by_word')
-        self.select_by_word.set_text(ConfigManager.get_conf('general', 'select_by_word'))
-
         self.start_shell_program = builder.get_object('start_shell_program')
-        self.start_shell_program.set_text(ConfigManager.get_conf('general', 'start_shell_program'))
 
         self.dir_custom = builder.get_object('dir_custom')
         self.radio_home = builder.get_object('radio_home')
@@ -89,108 +145,35 @@ class Preferences:
         self.radio_dir_custom = builder.get_object('radio_dir_custom')
         self.radio_dir_custom.connect('toggled', lambda w: self.toggle_sensitive(self.radio_dir_custom, [self.dir_custom]))
 
-        start_directory = ConfigManager.get_conf('general', 'start_directory')
-        if start_directory == '$home$':
-            self.radio_home.set_active(True)
-        elif start_directory == '$pwd$':
-            self.radio_pwd.set_active(True)
-        else:
-            self.radio_dir_custom.set_active(True)
-            self.dir_custom.set_text(start_directory)
-            self.dir_custom.set_sensitive(True)
-
         # TAB: Window
-        boolean_window_options = [
-            'use_border',
-            'always_on_top',
-            'hide_on_losefocus',
-            'use_animation',
-        ]
-        for option in boolean_window_options:
+        for option in Preferences._boolean_window_options:
             setattr(self, option, builder.get_object(option))
-            getattr(self, option).set_active(ConfigManager.get_conf('window', option))
 
         self.animation_step_count = builder.get_object('animation_step_count')
-        self.animation_step_count.set_text(str(ConfigManager.get_conf('window', 'animation_step_count')))
-
         self.animation_step_time = builder.get_object('animation_step_time')
-        self.animation_step_time.set_text(str(ConfigManager.get_conf('window', 'animation_step_time')))
 
         # TAB: Terminal
-        boolean_terminal_options = [
-            'use_system_font',
-            'show_scrollbar',
-            'scrollback_unlimited',
-            'scroll_on_output',
-            'scroll_on_keystroke',
-        ]
-
-        for option in boolean_terminal_options:
+        for option in Preferences._boolean_terminal_options:
             setattr(self, option, builder.get_object(option))
-            getattr(self, option).set_active(ConfigManager.get_conf('terminal', option))
 
         self.font_name = builder.get_object('font_name')
-        self.font_name.set_font_name(ConfigManager.get_conf('terminal', 'font_name'))
-        self.font_name.set_sensitive(not ConfigManager.get_conf('terminal', 'use_system_font'))
-
         self.use_system_font.connect('toggled', lambda w: self.toggle_sensitive(self.use_system_font, [self.font_name]))
 
         self.color_text = builder.get_object('color_text')
-        self.color_text.set_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_text')))
-
         self.color_background = builder.get_object('color_background')
-        self.color_background.set_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_background')))
-
         self.background_image = builder.get_object('background_image')
-        self.background_image.set_filename(ConfigManager.get_conf('terminal', 'background_image'))
 
         self.clear_background_image = builder.get_object('clear_background_image')
         self.clear_background_image.connect('clicked', lambda w: self.background_image.unselect_all())
 
         self.background_transparency = builder.get_object('background_transparency')
-        self.background_transparency.set_value(int(ConfigManager.get_conf('terminal', 'background_transparency')) * 1.0)
-
         self.scrollback_lines = builder.get_object('scrollback_lines')
-        self.scrollback_lines.set_text(str(ConfigManager.get_conf('terminal', 'scrollback_lines')))
-
         self.scrollback_unlimited.connect('toggled', lambda w: self.toggle_sensitive(self.scrollback_unlimited, [self.scrollback_lines]))
 
         # TAB: Keyboard Shortcuts
-        # Store all keyboard shortcut entry boxes in array for connecting signals together.
-        key_entries = [
-            # General
-            'global_key',
-            'fullscreen_key',
-            'toggle_scrollbars_key',
-            'quit_key',
-            'select_all_key',
-            'copy_key',
-            'paste_key',
-
-            # Tabs
-            'new_page_key',
-            'rename_page_key',
-            'close_page_key',
-            'prev_page_key',
-            'next_page_key',
-            'move_page_left_key',
-            'move_page_right_key',
-
-            # Shortcuts - Terminal
-            'split_h_key',
-            'split_v_key',
-            'close_node_key',
-            'move_up_key',
-            'move_down_key',
-            'move_left_key',
-            'move_right_key',
-            'move_left_screen_key',
-            'move_right_screen_key',
-        ]
-        for key in key_entries:
+        for key in Preferences._key_entries:
             setattr(self, key, builder.get_object(key))
             widget = getattr(self, key)
-            widget.set_text(ConfigManager.get_conf('shortcuts', key))
             widget.connect('button-press-event', self.clear_key_entry)
             widget.connect('key-press-event', self.generate_key_string)
 
@@ -215,6 +198,53 @@ class Preferences:
         self.report_bug = builder.get_object('report_bug')
         self.report_bug.connect('clicked', lambda w: Gtk.show_uri(self.window.get_screen(), 'https://github.com/Sixdsn/terra-terminal/issues', GdkX11.x11_get_server_time(self.window.get_window())))
 
+    def load_config(self):
+        """
+        Set the widget values from the current config.
+        """
+        # TAB: General
+        for option in Preferences._boolean_general_options:
+            getattr(self, option).set_active(ConfigManager.get_conf('general', option))
+
+        self.run_on_startup.set_active(os.path.exists(os.environ['HOME'] + '/.config/autostart/terra.desktop'))
+        self.separator_size.set_value(int(ConfigManager.get_conf('general', 'separator_size')) * 1.0)
+        self.select_by_word.set_text(ConfigManager.get_conf('general', 'select_by_word'))
+        self.start_shell_program.set_text(ConfigManager.get_conf('general', 'start_shell_program'))
+
+        start_directory = ConfigManager.get_conf('general', 'start_directory')
+        if start_directory == '$home$':
+            self.radio_home.set_active(True)
+        elif start_directory == '$pwd$':
+            self.radio_pwd.set_active(True)
+        else:
+            self.radio_dir_custom.set_active(True)
+            self.dir_custom.set_text(start_directory)
+        self.dir_custom.set_sensitive(self.radio_dir_custom.get_active())
+
+        # TAB: Window
+        for option in Preferences._boolean_window_options:
+            getattr(self, option).set_active(ConfigManager.get_conf('window', option))
+
+        self.animation_step_count.set_text(str(ConfigManager.get_conf('window', 'animation_step_count')))
+        self.animation_step_time.set_text(str(ConfigManager.get_conf('window', 'animation_step_time')))
+
+        # TAB: Terminal
+        for option in Preferences._boolean_terminal_options:
+            getattr(self, option).set_active(ConfigManager.get_conf('terminal', option))
+
+        self.font_name.set_font_name(ConfigManager.get_conf('terminal', 'font_name'))
+        self.font_name.set_sensitive(not ConfigManager.get_conf('terminal', 'use_system_font'))
+
+        self.color_text.set_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_text')))
+        self.color_background.set_color(Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_background')))
+        self.background_image.set_filename(ConfigManager.get_conf('terminal', 'background_image'))
+        self.background_transparency.set_value(int(ConfigManager.get_conf('terminal', 'background_transparency')) * 1.0)
+        self.scrollback_lines.set_text(str(ConfigManager.get_conf('terminal', 'scrollback_lines')))
+
+        # TAB: Keyboard Shortcuts
+        for key in Preferences._key_entries:
+            getattr(self, key).set_text(ConfigManager.get_conf('shortcuts', key))
+
     def clear_key_entry(self, widget, event):
         if event.type == Gdk.EventType._2BUTTON_PRESS:
             widget.set_text("")
@@ -224,7 +254,7 @@ class Preferences:
             target_object.set_sensitive(not source_object.get_active())
 
     def restore_defaults_cb(self):
-        for key in TerraHandler.config['shortcuts']:
+        for key in Preferences._key_entries:
             widget = getattr(self, key)
             widget.set_text(TerraHandler.config['shortcuts'][key])
 
@@ -248,9 +278,13 @@ class Preferences:
         widget.set_text(key_str)
 
     def show(self):
-        if not self.is_running:
+        if self.window is None:
             self.init_ui()
+        if not self.is_running:
+            self.load_config()
+            self.is_running = True
         self.window.show_all()
+        self.window.present()
 
     def on_apply_clicked(self, widget):
         for option in Preferences._boolean_general_options:
@@ -351,9 +385,9 @@ class Preferences:
         ConfigManager.set_conf('terminal', 'scrollback_lines', str(scrollback_line))
 
         # TAB: Shortcuts
-        for key in TerraHandler.config['shortcuts']:
+        for key in Preferences._key_entries:
             widget = getattr(self, key)
-            TerraHandler.config['shortcuts'][key] = widget.get_text()
+            ConfigManager.set_conf('shortcuts', key, widget.get_text())
 
         ConfigManager.save_config()
         TerraHandler.execute_ui_event_handlers()
@@ -365,6 +399,11 @@ class Preferences:
         self.window.hide()
         ConfigManager.disable_losefocus_temporary = False
 
+    def on_delete_event(self, widget, event):
+        # Keep the window around for the next time it is opened.
+        self.on_cancel_clicked(widget)
+        return True
+
     def on_cancel_clicked(self, widget):
         self.is_running = False
         self.window.hide()
@@ -8,12 +8,26 @@ import terra.terra_utils as terra_utils
 from terra.ConfigManager import ConfigManager
 from terra.handlers import TerraHandler
 from terra.handlers import t
+from terra.AcceleratorTable import AcceleratorTable
 from terra.interfaces.InputDialog import InputDialog
+from terra.LayoutTree import LayoutTree
+from terra.PaneRectIndex import MOVE_UP, MOVE_DOWN, MOVE_LEFT, MOVE_RIGHT
+from terra.TitleRefreshScheduler import TitleRefreshScheduler
 from terra.VteObjectContainer import VteObjectContainer
 from terra.VteObject import VteObject
 
+# Style class of the tabs highlighted by a trigger, from the GTK theme.
+HIGHLIGHT_CLASS = 'suggested-action'
+# Style class of the tabs with terminals broadcasting their input.
+BROADCAST_CLASS = 'destructive-action'
+
 
 class TerminalWin(Gtk.Window):
+    # Maps each Gdk.Screen to its (Gtk.CssProvider, theme values) pair.
+    css_providers = {}
+    # Number of CSS providers ever added to a screen.
+    css_provider_count = 0
+
     def __init__(self, name, monitor):
         main_ui_file = os.path.join(TerraHandler.get_resources_path(), 'main.ui')
         if not os.path.exists(main_ui_file):
@@ -31,11 +45,21 @@ class TerminalWin(Gtk.Window):
         self.name = name
         self.screen_id = int(name.split('-')[2])
         # Allow UI to be updated by other events.
-        TerraHandler.add_ui_event_handler(self.update_ui)
+        TerraHandler.add_ui_event_handler(
+            self.update_ui,
+            'window.*',
+            # The options of this screen, e.g. from WinDialog.
+            self.name + '.*',
+            'general.hide_from_taskbar',
+            'general.separator_size',
+            'terminal.color_background',
+        )
 
         self.screen = self.get_screen()
         self.screen.connect('monitors-changed', lambda w: self.check_visible())
         self.monitor = monitor
+        self.title_scheduler = TitleRefreshScheduler()
+        self.init_key_actions()
 
         self.init_transparency()
         self.init_ui()
@@ -95,10 +119,10 @@ class TerminalWin(Gtk.Window):
         self.set_default_size(self.monitor.width, self.monitor.height)
 
         added = False
-        for section in ConfigManager.get_sections():
-            tabs = str('layout-Tabs-%d'% self.screen_id)
-            if section.find(tabs) == 0 and not ConfigManager.get_conf(section, 'disabled'):
-                self.add_page(page_name=str(section), update=False)
+        for tab in TerraHandler.session.get_tabs(self.name):
+            if not tab.get('disabled'):
+                # Only the first tab is restored right away, it is the active one.
+                self.add_page(spec=tab, update=False, lazy=added)
                 added = True
         if not added:
             self.add_page(update=False)
@@ -120,12 +144,13 @@ class TerminalWin(Gtk.Window):
             return
         if ConfigManager.disable_losefocus_temporary:
             return
-        if not ConfigManager.get_conf('window', 'hide_on_losefocus'):
+        window_conf = ConfigManager.get_snapshot().window
+        if not window_conf.hide_on_losefocus:
             return
 
         if self.get_property('visible'):
             self.losefocus_time = GdkX11.x11_get_server_time(self.get_window())
-            if ConfigManager.get_conf('window', 'use_animation'):
+            if window_conf.use_animation:
                 self.slide_up()
             self.unrealize()
             self.hide()
@@ -157,64 +182,52 @@ class TerminalWin(Gtk.Window):
         TerraHandler.Wins.app_quit()
 
     def save_conf(self, keep=True):
-        tabs = str('layout-Tabs-%d' % self.screen_id)
         if not keep:
-            # NOTE: Don't change the list while iterating over it.
-            config_sections = ConfigManager.get_sections()
-            for section in iter(config_sections):
-                if section.find(tabs) == 0:
-                    ConfigManager.del_conf(section)
+            TerraHandler.session.remove_window(self.name)
             ConfigManager.del_conf(self.name)
-        else:
-            # We delete all tabs first to avoid unused.
-            # We delete all layouts first to avoid unused.
-            # NOTE: Don't change the list while iterating over it.
-            config_sections = ConfigManager.get_sections()
-            for section in iter(config_sections):
-                if section.find('layout-Tabs-%d' % self.screen_id) == 0:
-                    # We won't delete those who are set as disabled.
-                    if not ConfigManager.get_conf(section, 'disabled'):
-                        ConfigManager.del_conf(section)
-                if section.find('layout-Child-%d' % self.screen_id) == 0:
-                    ConfigManager.del_conf(section)
-
-            ConfigManager.set_conf(self.name, 'width', self.monitor.width)
-            ConfigManager.set_conf(self.name, 'height', self.monitor.height)
-            ConfigManager.set_conf(self.name, 'posx', self.monitor.x)
-            ConfigManager.set_conf(self.name, 'posy', self.monitor.y)
-            ConfigManager.set_conf(self.name, 'fullscreen', self.is_fullscreen)
-
-            # We add them all.
-            tab_id = 0
-            for button in self.buttonbox:
-                if button != self.radio_group_leader:
-                    section = str('layout-Tabs-%d-%d' % (self.screen_id, tab_id))
-                    ConfigManager.set_conf(section, 'name', button.get_label())
-                    tab_id += 1
-
-            tab_id = 0
-            for container in self.notebook.get_children():
-                child_id = 0
-                self.set_paned_parents(container)
-                for child in terra_utils.my_sorted(container.vte_list):
-                    section = str('layout-Child-%d-%d-%d' % (self.screen_id, tab_id, child_id))
-                    print('Id: %d ParId: %d Pos: %d' % (child.id, child.parent, child.pos))
-                    ConfigManager.set_conf(section, 'id', child.id)
-                    ConfigManager.set_conf(section, 'parent', child.parent)
-                    ConfigManager.set_conf(section, 'axis', child.axis)
-                    ConfigManager.set_conf(section, 'pos', child.pos)
-                    ConfigManager.set_conf(section, 'prog', child.progname)
-                    ConfigManager.set_conf(section, 'pwd', child.pwd)
-                    child_id += 1
-                tab_id += 1
-
-    def use_child(self, child, parent, axis, pos):
-        child.pos = -1
-        child.axis = axis
-        child.pwd = terra_utils.get_pwd(child.pid[1])
-        if parent:
-            child.pos = pos
-            child.parent = parent.id
+            return
+
+        # The window is already where these say.
+        ConfigManager.set_conf(self.name, 'width', self.monitor.width, notify=False)
+        ConfigManager.set_conf(self.name, 'height', self.monitor.height, notify=False)
+        ConfigManager.set_conf(self.name, 'posx', self.monitor.x, notify=False)
+        ConfigManager.set_conf(self.name, 'posy', self.monitor.y, notify=False)
+        ConfigManager.set_conf(self.name, 'fullscreen', self.is_fullscreen, notify=False)
+
+        open_tabs = []
+        buttons = [button for button in self.buttonbox if button != self.radio_group_leader]
+        for button, container in zip(buttons, self.notebook.get_children()):
+            if container.pending_spec is not None:
+                # Not restored yet, save the layout it was loaded from.
+                tab = dict(container.pending_spec)
+            else:
+                tab = {'layout': container.layout.to_dict(self.get_split_pos, self.get_pane_data)}
+            tab['name'] = button.get_label()
+            open_tabs.append(tab)
+
+        # Disabled tabs are kept as they are, at their index among the open ones.
+        tabs = []
+        open_tabs.reverse()
+        for tab in TerraHandler.session.get_tabs(self.name):
+            if tab.get('disabled'):
+                tabs.append(tab)
+            elif open_tabs:
+                tabs.append(open_tabs.pop())
+        open_tabs.reverse()
+        tabs.extend(open_tabs)
+        TerraHandler.session.set_tabs(self.name, tabs)
+
+    @staticmethod
+    def get_pane_data(terminal):
+        data = {
+            'prog': terminal.progname,
+            'pwd': terra_utils.get_pwd(terminal.pid[1]) or terminal.pwd,
+        }
+        if terminal.daemon_id is not None:
+            data['daemon_id'] = terminal.daemon_id
+        if terminal.respawn_policy:
+            data['respawn'] = terminal.respawn_policy
+        return data
 
     # There is a very small issue if the tabbar is visible.
     def get_paned_pos(self, tree):
@@ -223,128 +236,116 @@ class TerminalWin(Gtk.Window):
             size = tree.get_allocation().width
         else:
             size = tree.get_allocation().height
+        if size <= 1:
+            return -1
         percentage = int(float(pos) / float(size) * float(10000))
         return percentage
 
-    def rec_parents(self, tree, container):
-        if not tree:
-            TerminalWin.rec_parents.im_func._parent = None
-            TerminalWin.rec_parents.im_func._first_child = None
-            TerminalWin.rec_parents.im_func._axis = 'v'
-            TerminalWin.rec_parents.im_func._pos = -1
-            return None
-
-        if isinstance(tree, Gtk.Paned):
-            child1 = tree.get_child1()
-            child2 = tree.get_child2()
-            if child1:
-                if isinstance(child1, Gtk.Paned):
-                    TerminalWin.rec_parents.im_func._pos = self.get_paned_pos(tree)
-                    self.rec_parents(child1, container)
-                if isinstance(child1, VteObject):
-                    if not terra_utils.get_paned_parent(container.vte_list, child1.parent):
-                        self.use_child(child1, TerminalWin.rec_parents.im_func._parent, TerminalWin.rec_parents.im_func._axis, TerminalWin.rec_parents.im_func._pos)
-                    else:
-                        self.use_child(child1, terra_utils.get_paned_parent(container.vte_list, child1.parent), TerminalWin.rec_parents.im_func._axis, TerminalWin.rec_parents.im_func._pos)
-                    if not TerminalWin.rec_parents.im_func._first_child:
-                        if child1 in container.vte_list:
-                            container.vte_list.remove(child1)
-                        if len(container.vte_list) and container.vte_list[0].id == 0:
-                            container.vte_list.pop(0)
-                        for item in container.vte_list:
-                            if item.parent == child1.id:
-                                item.parent = 0
-                        child1.id = 0
-                        child1.parent = 0
-                        container.vte_list.append(child1)
-                        TerminalWin.rec_parents.im_func._first_child = child1
-                    TerminalWin.rec_parents.im_func._parent = child1
-            if child2:
-                if isinstance(tree, Gtk.HPaned):
-                    TerminalWin.rec_parents.im_func._axis = 'h'
-                else:
-                    TerminalWin.rec_parents.im_func._axis = 'v'
-                if isinstance(child2, Gtk.Paned):
-                    TerminalWin.rec_parents.im_func._pos = self.get_paned_pos(tree)
-                    self.rec_parents(child2, container)
-                if isinstance(child2, VteObject):
-                    if not terra_utils.get_paned_parent(container.vte_list, child2.parent):
-                        self.use_child(child2, TerminalWin.rec_parents.im_func._parent, TerminalWin.rec_parents.im_func._axis, self.get_paned_pos(tree))
-                    else:
-                        self.use_child(child2, terra_utils.get_paned_parent(container.vte_list, child2.parent), TerminalWin.rec_parents.im_func._axis, self.get_paned_pos(tree))
-
-        elif not TerminalWin.rec_parents.im_func._first_child and isinstance(tree, VteObject):
-            if tree in container.vte_list:
-                container.vte_list.remove(tree)
-            if len(container.vte_list) and container.vte_list[0].id == 0:
-                container.vte_list.pop(0)
-            tree.id = 0
-            tree.parent = 0
-            tree.pos = -1
-            tree.axis = 'v'
-            container.vte_list.append(tree)
-            TerminalWin.rec_parents.im_func._first_child = tree
-
-    def set_paned_parents(self, container):
-        self.rec_parents(None, None)
-        for tree in container.get_children():
-            self.rec_parents(tree, container)
+    def get_split_pos(self, split_node):
+        if split_node.widget is not None:
+            pos = self.get_paned_pos(split_node.widget)
+            if pos != -1:
+                return pos
+        return split_node.position
 
     def quit(self):
         TerraHandler.remove_ui_event_handler(self.update_ui)
+        TerraHandler.remove_ui_event_handler(self.accelerators.rebuild)
+        self.title_scheduler.cancel()
+        if TerraHandler.Wins.session_client is not None and len(TerraHandler.Wins.get_apps()) > 1:
+            # Terra keeps running, the terminals of this window end with it.
+            for container in self.notebook.get_children():
+                if container.pending_spec is not None:
+                    for daemon_id in TerraHandler.session.get_daemon_ids([container.pending_spec]):
+                        TerraHandler.Wins.session_client.kill(daemon_id)
+                for terminal in container.vte_list:
+                    terminal.unregister()
         TerraHandler.Wins.remove_app(self)
         self.destroy()
 
-    def add_page(self, page_name=None, update=True):
-        container = None
-        if page_name:
-            section = str('layout-Child-%s-0' % (page_name[len('layout-Tabs-'):]))
-            progname = ConfigManager.get_conf(section, 'prog')
-            pwd = ConfigManager.get_conf(section, 'pwd')
-            container = VteObjectContainer(self, progname=progname, pwd=pwd)
-        if not container:
-            container = VteObjectContainer(self)
+    def add_page(self, spec=None, update=True, lazy=False, terminal=None, container=None):
+        if container is None:
+            container = VteObjectContainer(self, bare=True)
+            container.pending_spec = spec
+        else:
+            # A closed tab, restored from the close stash.
+            container.parent = self
+        # The notebook refuses to switch to hidden pages.
+        container.show()
 
         self.notebook.append_page(container, None)
-        self.notebook.set_current_page(-1)
-        self.get_active_terminal().grab_focus()
+        if terminal is not None:
+            # A running terminal moved from another tab.
+            container.adopt_terminal(terminal)
+            container.show_all()
+        elif not lazy and not len(container.layout):
+            self.restore_page(container)
+        if not lazy:
+            self.notebook.set_current_page(-1)
+            self.get_active_terminal().grab_focus()
 
         page_count = 0
         for button in self.buttonbox:
             if button != self.radio_group_leader:
                 page_count += 1
 
-        if page_name is not None:
-            tab_name = ConfigManager.get_conf(page_name, 'name')
-        if page_name is None or tab_name is None:
+        tab_name = None
+        if spec is not None:
+            tab_name = spec.get('name')
+        if tab_name is None:
             tab_name = t("Terminal ") + str(page_count + 1)
 
         new_button = Gtk.RadioButton.new_with_label_from_widget(self.radio_group_leader, tab_name)
         new_button.set_property('draw-indicator', False)
-        new_button.set_active(True)
+        if not lazy:
+            new_button.set_active(True)
         new_button.show()
         new_button.connect('toggled', self.change_page)
         new_button.connect('button-release-event', self.page_button_mouse_event)
 
         self.buttonbox.pack_start(new_button, False, True, 0)
 
-        if page_name:
-            for section in ConfigManager.get_sections():
-                child = str('layout-Child-%s'%(page_name[len('layout-Tabs-'):]))
-                if section.find(child) == 0 and section[-1:] != '0':
-                    axis = ConfigManager.get_conf(section, "axis")[0]
-                    prog = ConfigManager.get_conf(section, "prog")
-                    pos = ConfigManager.get_conf(section, "pos")
-                    pwd = ConfigManager.get_conf(section, "pwd")
-                    term_id = int(ConfigManager.get_conf(section, "id"))
-                    parent_vte = terra_utils.get_paned_parent(container.vte_list, int(ConfigManager.get_conf(section, "parent")))
-                    if parent_vte:
-                        parent_vte.split_axis(parent_vte, axis=axis, split=pos, progname=prog, term_id=term_id, pwd=pwd)
-                    else:
-                        print("DEBUG: no parent(%d) found for section: %s"% (int(ConfigManager.get_conf(section, "parent")), section))
+        if lazy:
+            TerraHandler.Wins.restore_scheduler.add(self, container)
         if update:
             self.update_ui()
 
+    def restore_page(self, container):
+        """
+        Spawn the terminals of a tab, following its saved layout if any.
+        """
+        spec = container.pending_spec
+        container.pending_spec = None
+        children = []
+        if spec and spec.get('layout'):
+            try:
+                children = LayoutTree.from_dict(spec['layout']).serialize()
+            except (KeyError, ValueError) as e:
+                print('[DEBUG] Invalid layout for tab {}: {}'.format(spec.get('name'), e))
+        if not children:
+            container.materialize()
+            return
+
+        for child in children:
+            if child['pane'].get('daemon_id'):
+                container.attach_ids[child['id']] = child['pane']['daemon_id']
+
+        # Replay the splits, each terminal is split from an existing one.
+        root = children[0]
+        container.materialize(root['pane'].get('prog'), root['pane'].get('pwd'), root['id'])
+        for child in children[1:]:
+            parent_vte = container.layout.get_pane(child['parent'])
+            if parent_vte:
+                parent_vte.split_axis(parent_vte, axis=child['axis'], split=child['pos'], progname=child['pane'].get('prog'), term_id=child['id'], pwd=child['pane'].get('pwd'))
+            else:
+                print("DEBUG: no parent(%d) found for terminal: %d"% (child['parent'], child['id']))
+
+        for child in children:
+            terminal = container.layout.get_pane(child['id'])
+            if terminal and child['pane'].get('respawn'):
+                terminal.respawn_policy = child['pane']['respawn']
+        container.show_all()
+
     def get_active_terminal(self):
         return self.notebook.get_nth_page(self.notebook.get_current_page()).active_terminal
 
@@ -352,10 +353,14 @@ class TerminalWin(Gtk.Window):
         if not button.get_active():
             return
 
+        button.get_style_context().remove_class(HIGHLIGHT_CLASS)
         page_no = 0
         for i in self.buttonbox:
             if i != self.radio_group_leader:
                 if i == button:
+                    container = self.notebook.get_nth_page(page_no)
+                    # Restore a background tab on first view.
+                    TerraHandler.Wins.restore_scheduler.materialize(self, container)
                     self.notebook.set_current_page(page_no)
                     self.get_active_terminal().grab_focus()
                     return
@@ -420,6 +425,13 @@ class TerminalWin(Gtk.Window):
         for i in self.buttonbox:
             if i != self.radio_group_leader:
                 if i == sender:
+                    container = self.notebook.get_nth_page(page_no)
+                    if TerraHandler.Wins.close_stash.is_enabled():
+                        # Keep the tab running for a while, see undo_close().
+                        TerraHandler.Wins.close_stash.add_page(container, self, i.get_label())
+                    else:
+                        for terminal in container.vte_list:
+                            terminal.unregister()
                     self.notebook.remove_page(page_no)
                     self.buttonbox.remove(i)
 
@@ -428,6 +440,128 @@ class TerminalWin(Gtk.Window):
                     return True
                 page_no += 1
 
+    def get_page_buttons(self):
+        return [button for button in self.buttonbox if button != self.radio_group_leader]
+
+    def highlight_terminal(self, terminal):
+        """
+        Mark the tab of a terminal in the background until it is viewed.
+        """
+        page_no = self.notebook.page_num(terminal.get_container())
+        if page_no == -1 or page_no == self.notebook.get_current_page():
+            return
+        self.get_page_buttons()[page_no].get_style_context().add_class(HIGHLIGHT_CLASS)
+
+    def toggle_broadcast(self, terminal=None):
+        """
+        Toggle the broadcast of the input group of the terminal. A terminal
+        without group broadcasts to the terminals of its tab.
+        """
+        if terminal is None:
+            terminal = self.get_active_terminal()
+        groups = TerraHandler.Wins.input_groups
+        group = terminal.input_group
+        if group is None:
+            container = terminal.get_container()
+            for member in container.vte_list:
+                if member.input_group is None:
+                    group = groups.join(member, 'tab-%d' % id(container))
+            group.broadcasting = True
+        else:
+            group.broadcasting = not group.broadcasting
+            if not group.broadcasting and group.name.startswith('tab-'):
+                for member in list(group.members):
+                    groups.leave(member)
+        TerraHandler.Wins.update_broadcast_marks()
+
+    def update_broadcast_marks(self):
+        for page_no, button in enumerate(self.get_page_buttons()):
+            container = self.notebook.get_nth_page(page_no)
+            style = button.get_style_context()
+            for terminal in container.vte_list:
+                if terminal.input_group is not None and terminal.input_group.broadcasting:
+                    style.add_class(BROADCAST_CLASS)
+                    break
+            else:
+                style.remove_class(BROADCAST_CLASS)
+
+    def focus_terminal(self, terminal):
+        page_no = self.notebook.page_num(terminal.get_container())
+        if page_no == -1:
+            return
+        if not self.get_visible():
+            self.update_ui()
+            self.show()
+        self.present()
+        self.get_page_buttons()[page_no].set_active(True)
+        terminal.grab_focus()
+
+    def close_container(self, container):
+        page_no = self.notebook.page_num(container)
+        if page_no != -1:
+            self.page_close(None, self.get_page_buttons()[page_no])
+
+    def undo_close(self):
+        """
+        Restore the last closed terminal or tab from the close stash.
+        """
+        entry = TerraHandler.Wins.close_stash.pop()
+        if entry is None:
+            return
+
+        window = entry.window
+        if window not in TerraHandler.Wins.get_apps():
+            window = self
+
+        if entry.is_page():
+            window.add_page(spec={'name': entry.name}, container=entry.container)
+            return
+
+        terminal = entry.terminals[0]
+        container = entry.container
+        if window.notebook.page_num(container) == -1 or not len(container.layout):
+            # The tab was closed too, open a new one.
+            window.add_page(terminal=terminal)
+            return
+        terminal.attach_to(container)
+        window.get_page_buttons()[window.notebook.page_num(container)].set_active(True)
+
+    def move_terminal_to_new_page(self, terminal=None):
+        if terminal is None:
+            terminal = self.get_active_terminal()
+        if len(terminal.get_container().layout) < 2:
+            # Already alone in its tab.
+            return
+        terminal.detach()
+        self.add_page(terminal=terminal)
+
+    def move_terminal_to_page(self, offset, terminal=None):
+        if terminal is None:
+            terminal = self.get_active_terminal()
+        page_count = self.notebook.get_n_pages()
+        page_no = (self.notebook.page_num(terminal.get_container()) + offset) % page_count
+        container = self.notebook.get_nth_page(page_no)
+        if container is terminal.get_container():
+            return
+
+        TerraHandler.Wins.restore_scheduler.materialize(self, container)
+        terminal.move_to(container)
+        # The source tab may have been closed, look the page up again.
+        self.get_page_buttons()[self.notebook.page_num(container)].set_active(True)
+
+    def move_terminal_to_next_window(self, terminal=None):
+        if terminal is None:
+            terminal = self.get_active_terminal()
+        apps = TerraHandler.Wins.get_apps()
+        if len(apps) < 2 or self not in apps:
+            return
+        window = apps[(apps.index(self) + 1) % len(apps)]
+        container = window.notebook.get_nth_page(window.notebook.get_current_page())
+
+        TerraHandler.Wins.restore_scheduler.materialize(window, container)
+        terminal.move_to(container)
+        window.present()
+
     def get_screen_rectangle(self):
         display = self.screen.get_display()
         return self.screen.get_monitor_workarea(self.screen.get_monitor_at_point(self.monitor.x, self.monitor.y))
@@ -497,16 +631,27 @@ class TerminalWin(Gtk.Window):
             self.move(horizontal_position, vertical_position)
 
     def override_gtk_theme(self):
-        css_provider = Gtk.CssProvider()
+        color_background = ConfigManager.get_conf('terminal', 'color_background')
+        separator_size = ConfigManager.get_conf('general', 'separator_size')
+        theme_key = (separator_size, color_background)
+
+        # One provider per screen, reloaded only when the theme values change.
+        css_provider, current_key = TerminalWin.css_providers.get(self.screen, (None, None))
+        if css_provider is None:
+            css_provider = Gtk.CssProvider()
+            Gtk.StyleContext.add_provider_for_screen(self.screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_USER)
+            TerminalWin.css_provider_count += 1
+        elif current_key == theme_key:
+            return
+        TerminalWin.css_providers[self.screen] = (css_provider, theme_key)
 
-        bg = Gdk.color_parse(ConfigManager.get_conf('terminal', 'color_background'))
+        bg = Gdk.color_parse(color_background)
         bg_hex = '#%02X%02X%02X' % (
             int((bg.red / 65536.0) * 256),
             int((bg.green / 65536.0) * 256),
             int((bg.blue / 65536.0) * 256)
         )
 
-        separator_size = ConfigManager.get_conf('general', 'separator_size')
         css_provider.load_from_data('''
             #notebook GtkPaned {
                 -GtkPaned-handle-size: %i;
@@ -529,159 +674,121 @@ class TerminalWin(Gtk.Window):
             }
             ''' % (int(separator_size), bg_hex))
 
-        style_context = Gtk.StyleContext()
-        style_context.add_provider_for_screen(self.screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_USER)
+    def init_key_actions(self):
+        # Shortcut handlers, by decreasing priority.
+        self.key_actions = [
+            ('toggle_scrollbars_key', self.toggle_scrollbars),
+            ('move_up_key', lambda: self.get_active_terminal().move(direction=MOVE_UP)),
+            ('move_down_key', lambda: self.get_active_terminal().move(direction=MOVE_DOWN)),
+            ('move_left_key', lambda: self.get_active_terminal().move(direction=MOVE_LEFT)),
+            ('move_right_key', lambda: self.get_active_terminal().move(direction=MOVE_RIGHT)),
+            ('move_left_screen_key', lambda: terra_utils.move_left_screen(self)),
+            ('move_right_screen_key', lambda: terra_utils.move_right_screen(self)),
+            ('quit_key', self.quit),
+            ('select_all_key', lambda: self.get_active_terminal().select_all()),
+            ('copy_key', lambda: self.get_active_terminal().copy_clipboard()),
+            ('paste_key', lambda: self.get_active_terminal().paste_clipboard()),
+            ('split_v_key', lambda: self.get_active_terminal().split_axis(None, 'h')),
+            ('split_h_key', lambda: self.get_active_terminal().split_axis(None, 'v')),
+            ('close_node_key', lambda: self.get_active_terminal().close_node(None)),
+            ('fullscreen_key', self.toggle_fullscreen),
+            ('new_page_key', self.add_page),
+            ('rename_page_key', self.rename_active_page),
+            ('close_page_key', self.close_active_page),
+            ('next_page_key', self.next_page),
+            ('prev_page_key', self.prev_page),
+            ('move_page_left_key', self.move_page_left),
+            ('move_page_right_key', self.move_page_right),
+            ('move_terminal_new_page_key', self.move_terminal_to_new_page),
+            ('move_terminal_next_page_key', lambda: self.move_terminal_to_page(1)),
+            ('move_terminal_prev_page_key', lambda: self.move_terminal_to_page(-1)),
+            ('move_terminal_next_window_key', self.move_terminal_to_next_window),
+            ('undo_close_key', self.undo_close),
+            ('toggle_broadcast_key', self.toggle_broadcast),
+        ]
+        self.key_handlers = dict(self.key_actions)
+        self.accelerators = AcceleratorTable([name for name, handler in self.key_actions])
+        TerraHandler.add_ui_event_handler(self.accelerators.rebuild, 'shortcuts.*')
 
     def on_keypress(self, widget, event):
-        if self.key_event_compare('toggle_scrollbars_key', event):
-            # Toggle value
-            ConfigManager.set_conf('terminal', 'show_scrollbar', not ConfigManager.get_conf('terminal', 'show_scrollbar'))
-            TerraHandler.execute_ui_event_handlers()
-            return True
-
-        if self.key_event_compare('move_up_key', event):
-            self.get_active_terminal().move(direction=1)
-            return True
-
-        if self.key_event_compare('move_down_key', event):
-            self.get_active_terminal().move(direction=2)
-            return True
-
-        if self.key_event_compare('move_left_key', event):
-            self.get_active_terminal().move(direction=3)
-            return True
-
-        if self.key_event_compare('move_right_key', event):
-            self.get_active_terminal().move(direction=4)
-            return True
-
-        if self.key_event_compare('move_left_screen_key', event):
-            terra_utils.move_left_screen(self)
-            return True
-
-        if self.key_event_compare('move_right_screen_key', event):
-            terra_utils.move_right_screen(self)
-            return True
-
-        if self.key_event_compare('quit_key', event):
-            self.quit()
-            return True
-
-        if self.key_event_compare('select_all_key', event):
-            self.get_active_terminal().select_all()
-            return True
-
-        if self.key_event_compare('copy_key', event):
-            self.get_active_terminal().copy_clipboard()
-            return True
-
-        if self.key_event_compare('paste_key', event):
-            self.get_active_terminal().paste_clipboard()
-            return True
-
-        if self.key_event_compare('split_v_key', event):
-            self.get_active_terminal().split_axis(None, 'h')
-            return True
+        name = self.accelerators.lookup(event)
+        if name is None:
+            # Not a shortcut, let the terminal handle the key.
+            return False
 
-        if self.key_event_compare('split_h_key', event):
-            self.get_active_terminal().split_axis(None, 'v')
+        handled = self.key_handlers[name]()
+        if handled is None:
             return True
+        return handled
 
-        if self.key_event_compare('close_node_key', event):
-            self.get_active_terminal().close_node(None)
-            return True
+    def toggle_scrollbars(self):
+        # Toggle value
+        ConfigManager.set_conf('terminal', 'show_scrollbar', not ConfigManager.get_conf('terminal', 'show_scrollbar'))
+        TerraHandler.execute_ui_event_handlers()
 
-        if self.key_event_compare('fullscreen_key', event):
-            self.toggle_fullscreen()
-            return True
+    def rename_active_page(self):
+        for button in self.buttonbox:
+            if button != self.radio_group_leader and button.get_active():
+                self.page_rename(None, button)
+                return True
+        return False
 
-        if self.key_event_compare('new_page_key', event):
-            self.add_page()
-            return True
+    def close_active_page(self):
+        for button in self.buttonbox:
+            if button != self.radio_group_leader and button.get_active():
+                self.page_close(None, button)
+                return True
+        return False
+
+    def next_page(self):
+        page_button_list = self.buttonbox.get_children()[1:]
+
+        for i in range(len(page_button_list)):
+            if page_button_list[i].get_active():
+                if (i + 1) < len(page_button_list):
+                    page_button_list[i+1].set_active(True)
+                else:
+                    page_button_list[0].set_active(True)
+                return True
+        return False
 
-        if self.key_event_compare('rename_page_key', event):
-            for button in self.buttonbox:
-                if button != self.radio_group_leader and button.get_active():
-                    self.page_rename(None, button)
-                    return True
+    def prev_page(self):
+        page_button_list = self.buttonbox.get_children()[1:]
 
-        if self.key_event_compare('close_page_key', event):
-            for button in self.buttonbox:
-                if button != self.radio_group_leader and button.get_active():
-                    self.page_close(None, button)
-                    return True
-
-        if self.key_event_compare('next_page_key', event):
-            page_button_list = self.buttonbox.get_children()[1:]
+        for i in range(len(page_button_list)):
+            if page_button_list[i].get_active():
+                if i > 0:
+                    page_button_list[i-1].set_active(True)
+                else:
+                    page_button_list[-1].set_active(True)
+                return True
+        return False
 
-            for i in range(len(page_button_list)):
-                if page_button_list[i].get_active():
-                    if (i + 1) < len(page_button_list):
-                        page_button_list[i+1].set_active(True)
-                    else:
-                        page_button_list[0].set_active(True)
+    def move_page_left(self):
+        i = 0
+        for button in self.buttonbox:
+            if button != self.radio_group_leader and button.get_active():
+                if (i - 1) > 0:
+                    self.notebook.reorder_child(self.notebook.get_nth_page(i - 1), i - 2)
+                    self.buttonbox.reorder_child(button, i - 1)
                     return True
+                else:
+                    return False
+            i += 1
+        return False
 
-        if self.key_event_compare('prev_page_key', event):
-            page_button_list = self.buttonbox.get_children()[1:]
-
-            for i in range(len(page_button_list)):
-                if page_button_list[i].get_active():
-                    if i > 0:
-                        page_button_list[i-1].set_active(True)
-                    else:
-                        page_button_list[-1].set_active(True)
+    def move_page_right(self):
+        i = 0
+        for button in self.buttonbox:
+            if button != self.radio_group_leader and button.get_active():
+                if (i + 1) < len(self.buttonbox):
+                    self.notebook.reorder_child(self.notebook.get_nth_page(i - 1), i)
+                    self.buttonbox.reorder_child(button, i + 1)
                     return True
-
-        if self.key_event_compare('move_page_left_key', event):
-            i = 0
-            for button in self.buttonbox:
-                if button != self.radio_group_leader and button.get_active():
-                    if (i - 1) > 0:
-                        self.notebook.reorder_child(self.notebook.get_nth_page(i - 1), i - 2)
-                        self.buttonbox.reorder_child(button, i - 1)
-                        return True
-                    else:
-                        return False
-                i += 1
-
-        if self.key_event_compare('move_page_right_key', event):
-            i = 0
-            for button in self.buttonbox:
-                if button != self.radio_group_leader and button.get_active():
-                    if (i + 1) < len(self.buttonbox):
-                        self.notebook.reorder_child(self.notebook.get_nth_page(i - 1), i)
-                        self.buttonbox.reorder_child(button, i + 1)
-                        return True
-                    else:
-                        return False
-                i += 1
-
-    @staticmethod
-    def key_event_compare(conf_name, event):
-        key_string = ConfigManager.get_conf('shortcuts', conf_name)
-
-        if ((Gdk.ModifierType.CONTROL_MASK & event.state) == Gdk.ModifierType.CONTROL_MASK) != ('<Control>' in key_string):
-            return False
-
-        if ((Gdk.ModifierType.MOD1_MASK & event.state) == Gdk.ModifierType.MOD1_MASK) != ('<Alt>' in key_string):
-            return False
-
-        if ((Gdk.ModifierType.SHIFT_MASK & event.state) == Gdk.ModifierType.SHIFT_MASK) != ('<Shift>' in key_string):
-            return False
-
-        if ((Gdk.ModifierType.SUPER_MASK & event.state) == Gdk.ModifierType.SUPER_MASK) != ('<Super>' in key_string):
-            return False
-
-        key_string = key_string.replace('<Control>', '')
-        key_string = key_string.replace('<Alt>', '')
-        key_string = key_string.replace('<Shift>', '')
-        key_string = key_string.replace('<Super>', '')
-
-        if key_string.lower() != Gdk.keyval_name(event.keyval).lower():
-            return False
-
-        return True
+                else:
+                    return False
+            i += 1
+        return False
 
     def toggle_fullscreen(self):
         self.is_fullscreen = not self.is_fullscreen
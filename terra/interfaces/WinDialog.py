@@ -83,6 +83,6 @@ class WinDialog:
         ConfigManager.set_conf(self.window.name, 'horizontal-position', self.dialog.h_align.get_active() * 50)
         ConfigManager.set_conf(self.window.name, 'hide-tab-bar', self.chk_hide_tab_bar.get_active())
         ConfigManager.set_conf(self.window.name, 'hide-tab-bar-fullscreen', self.chk_hide_tab_bar_fullscreen.get_active())
-        self.window.update_ui()
+        TerraHandler.execute_ui_event_handlers()
         ConfigManager.disable_losefocus_temporary = False
         self.close()
@@ -18,47 +18,13 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>
 
 """
 
-import commands
 import os
-from operator import attrgetter
 
 from gi.repository import Gtk, Gdk
 
 from terra.handlers import t
 from terra.ConfigManager import ConfigManager
-
-def get_paned_parent(vte_list, ParId):
-    parent = [item for item in vte_list if item.id == ParId]
-    if len(parent):
-        return parent[0]
-    return None
-
-def my_sorted(elems):
-    def check_heritage(val, elems, _elems, liste):
-        parent = get_paned_parent(_elems, val.parent)
-        if parent and parent in _elems:
-            _elems.append(val)
-            if val in liste:
-                liste.remove(val)
-            for vale in liste:
-                if vale.parent == val.parent and vale.id <= min(liste, key=lambda a: attrgetter('id')(a)).id:
-                    return check_heritage(vale, elems, _elems, liste)
-            return 1
-        return 0
-
-    _elems = []
-    liste = list(elems)
-    while len(liste):
-        liste.sort(key=lambda a: attrgetter('id')(a))
-        for val in liste:
-            if val.id == 0:
-                _elems.append(val)
-                if val in liste:
-                    liste.remove(val)
-                break
-            if check_heritage(val, elems, _elems, liste):
-                break
-    return _elems
+from terra.ProcessInfo import ProcessInfo, format_elapsed_time
 
 def get_screen(name):
     if ConfigManager.get_conf(name, 'disabled'):
@@ -94,29 +60,40 @@ def cannot_bind(app):
     msgbox.destroy()
 
 def get_pwd(pid):
-    try:
-        pwd = os.popen2("pwdx " + str(pid))[1].read().split(' ')[1].split()[0]
-        return pwd
-    except:
+    return ProcessInfo.get_cwd(pid)
+
+def get_pty_fd(vte):
+    pty = vte.get_pty()
+    if pty is None:
         return None
+    # Older libVte returns the file descriptor itself.
+    if isinstance(pty, int):
+        return pty
+    return pty.get_fd()
 
 def get_prog_values(pid, pwd):
-    value = " ".join(commands.getstatusoutput("ps -p " + str(pid) + " o user=,cmd=,etime=")[1].split()).split(' ')
-    return str("%s@%s $>%s %s"% (value[0], pwd, str(" ".join(value[1:-1])), value[-1]))
+    info = ProcessInfo.get(pid)
+    if info is None:
+        return None
+    return str("%s@%s $>%s %s"% (info.user, pwd, info.cmdline, format_elapsed_time(info.get_elapsed_time())))
+
+def get_foreground_pid(terminal):
+    shell_pid = terminal.pid[1]
+    if not hasattr(terminal, 'vte'):
+        return shell_pid
+    if getattr(terminal, 'owned_pty', None) is not None:
+        return ProcessInfo.get_foreground_pid(terminal.owned_pty.fd, shell_pid)
+    return ProcessInfo.get_foreground_pid(get_pty_fd(terminal.vte), shell_pid)
 
 def get_running_cmd(terminal):
     pwd = get_pwd(terminal.pid[1])
     if not pwd:
         pwd = os.uname()[1]
-    ret = str("%s@%s $>%s"% (os.environ['USER'], pwd, "POUET"))
-    try:
-        pid = int(commands.getstatusoutput("ps -o pid= --ppid " + str(terminal.pid[1]))[1])
-        ret = get_prog_values(pid, pwd)
-    except:
-        try:
-            ret = get_prog_values(terminal.pid[1], pwd)
-        except:
-            pass
+    ret = get_prog_values(get_foreground_pid(terminal), pwd)
+    if not ret:
+        ret = get_prog_values(terminal.pid[1], pwd)
+    if not ret:
+        ret = str("%s@%s $>%s"% (os.environ['USER'], pwd, "POUET"))
     return (ret)
 
 def set_new_size(terminal, minus, win_rect):